@@ -0,0 +1,65 @@
+"""
+Cost of the daily upcoming-birthdays snapshot job.
+
+Seeds a database with synthetic contacts (skipped with --no-seed) and times
+rebuild_snapshot. The target is 10M contacts on Postgres:
+
+    python -m benchmarks.birthday_snapshot --url postgresql+psycopg2://... --contacts 10000000
+
+Defaults to 1M contacts in a temporary SQLite file.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+from src.database.models import Base, Contact, User
+from src.repository.birthdays import rebuild_snapshot
+
+
+def seed(engine, contacts: int, users: int, batch: int = 50000) -> None:
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(User), [{"id": i, "username": f"user{i}", "email": f"user{i}@example.com",
+                                           "password": "x"} for i in range(1, users + 1)])
+    start = date(1950, 1, 1)
+    for offset in range(0, contacts, batch):
+        rows = [{"first_name": "First", "last_name": "Last", "email": f"c{i}@example.com", "phone": str(i),
+                 "birthday": start + timedelta(days=random.randrange(25000)), "user_id": i % users + 1}
+                for i in range(offset, min(offset + batch, contacts))]
+        with engine.begin() as connection:
+            connection.execute(insert(Contact), rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None)
+    parser.add_argument("--contacts", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-seed", action="store_true")
+    args = parser.parse_args()
+
+    url = args.url or f"sqlite:///{os.path.join(tempfile.gettempdir(), 'birthday_snapshot_bench.db')}"
+    engine = create_engine(url)
+    if not args.no_seed:
+        started = time.perf_counter()
+        seed(engine, args.contacts, args.users)
+        print(f"seeded {args.contacts} contacts in {time.perf_counter() - started:.1f}s")
+
+    for _ in range(args.repeat):
+        with Session(engine) as db:
+            started, cpu = time.perf_counter(), time.process_time()
+            count = rebuild_snapshot(db)
+            print(f"rebuild: {count} upcoming birthdays, {time.perf_counter() - started:.2f}s wall, "
+                  f"{time.process_time() - cpu:.2f}s client cpu")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+CPU time vs. bytes on the wire for contact list payloads.
+
+Usage: python -m benchmarks.compression [--contacts 10000] [--repeat 5]
+"""
+import argparse
+import json
+import time
+from datetime import date, timedelta
+
+from src.middleware.compression import Encoder, available_encodings
+
+LEVELS = {"gzip": [1, 6, 9], "br": [1, 4, 11], "zstd": [1, 3, 10]}
+
+
+def contacts_payload(count: int) -> bytes:
+    start = date(1970, 1, 1)
+    contacts = [{"id": i, "first_name": f"First{i % 997}", "last_name": f"Last{i % 1231}",
+                 "email": f"user{i}@example.com", "phone": f"+380{930000000 + i}",
+                 "birthday": (start + timedelta(days=i % 15000)).isoformat()} for i in range(count)]
+    return json.dumps(contacts).encode()
+
+
+def measure(encoding: str, level: int, body: bytes, repeat: int, chunk_size: int | None = None):
+    best = float("inf")
+    size = 0
+    for _ in range(repeat):
+        encoder = Encoder(encoding, level)
+        started = time.process_time()
+        if chunk_size:
+            out = [encoder.chunk(body[i:i + chunk_size]) for i in range(0, len(body), chunk_size)]
+            out.append(encoder.finish())
+            compressed = b"".join(out)
+        else:
+            compressed = encoder.finish(body)
+        best = min(best, time.process_time() - started)
+        size = len(compressed)
+    return best, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--contacts", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--chunk-size", type=int, default=64 * 1024, help="chunk size for the streaming rows")
+    args = parser.parse_args()
+
+    body = contacts_payload(args.contacts)
+    print(f"payload: {args.contacts} contacts, {len(body)} bytes")
+    print(f"{'encoding':<8} {'level':>5} {'mode':<6} {'cpu ms':>8} {'bytes':>10} {'ratio':>6} {'MB/s':>8}")
+    for encoding in available_encodings():
+        for level in LEVELS[encoding]:
+            for mode, chunk_size in (("whole", None), ("stream", args.chunk_size)):
+                cpu, size = measure(encoding, level, body, args.repeat, chunk_size)
+                print(f"{encoding:<8} {level:>5} {mode:<6} {cpu * 1000:>8.2f} {size:>10} "
+                      f"{len(body) / size:>6.1f} {len(body) / cpu / 1e6 if cpu else float('inf'):>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Per-user query latency on the plain and the hash partitioned contacts table (Postgres).
+
+Run it once before and once after the swap, on the same data:
+
+    python -m src.cli.seed --url $URL --users 500000 --contacts-per-user 100    # 50M contacts
+    python -m benchmarks.partitioning --url $URL
+    alembic upgrade head
+    python -m src.cli.partition prepare
+    python -m src.cli.partition backfill && python -m src.cli.partition swap
+    python -m benchmarks.partitioning --url $URL
+
+Every repository read is timed for random users; the report shows latency percentiles
+and how many partitions the plan of each query touches (1 when pruning works).
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from sqlalchemy import create_engine, event, func, select, text
+from sqlalchemy.orm import sessionmaker
+
+from src.database.models import User
+from src.repository import contacts as repository_contacts
+
+QUERIES = {
+    "get_contacts": lambda user, db: repository_contacts.get_contacts(0, 50, user, db),
+    "get_contact": lambda user, db: repository_contacts.get_contact(user.id * 100 - 50, user, db),
+    "get_contacts_by_ids": lambda user, db: repository_contacts.get_contacts_by_ids(
+        [user.id * 100 - offset for offset in range(1, 20)], user, db),
+    "query_search": lambda user, db: repository_contacts.query_search("last_name", "Koval", user, db),
+    "birthdays": lambda user, db: repository_contacts.birthdays(user, db),
+    "get_changes": lambda user, db: repository_contacts.get_changes(50, 100, user, db),
+    "lookup_by_phone.suffix": lambda user, db: repository_contacts.lookup_by_phone("1234", user, db, suffix=True),
+}
+
+
+def partitions_touched(engine, call, user) -> int:
+    """
+    Explains the statements a repository call sends and counts the partitions they scan.
+    """
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "contacts" in statement:
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    with sessionmaker(bind=engine)() as db:
+        asyncio.run(call(user, db))
+    event.remove(engine, "before_cursor_execute", record)
+    touched = 0
+    with engine.connect() as connection:
+        cursor = connection.connection.driver_connection.cursor()
+        for statement, parameters in statements:
+            cursor.execute(f"EXPLAIN {statement}", parameters)
+            touched = max(touched, sum("contacts_partitioned_" in row[0] for row in cursor.fetchall()))
+    return touched
+
+
+async def measure(Session, users, call, repeat: int):
+    timings = []
+    for user in random.sample(users, min(repeat, len(users))):
+        with Session() as db:
+            started = time.perf_counter()
+            await call(user, db)
+            timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", required=True, help="Postgres URL of a seeded database")
+    parser.add_argument("--repeat", type=int, default=500, help="random users per query")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    engine = create_engine(args.url, pool_size=1)
+    Session = sessionmaker(bind=engine, expire_on_commit=False)
+    with engine.connect() as connection:
+        partitioned = connection.execute(text("SELECT count(*) FROM pg_partitioned_table "
+                                              "WHERE partrelid = 'contacts'::regclass")).scalar() > 0
+        max_id = connection.execute(select(func.max(User.id))).scalar()
+        rows = connection.execute(text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'contacts'::regclass")
+                                  ).scalar()
+    with Session() as db:
+        ids = random.sample(range(1, max_id + 1), min(args.repeat * 2, max_id))
+        users = db.scalars(select(User).where(User.id.in_(ids))).all()
+
+    print(f"contacts: {'hash partitioned' if partitioned else 'plain'}, ~{rows} rows, {len(users)} sampled users")
+    print(f"{'query':<24} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'partitions':>10}")
+    for name, call in QUERIES.items():
+        asyncio.run(measure(Session, users, call, 20))  # warm up
+        timings = sorted(asyncio.run(measure(Session, users, call, args.repeat)))
+        quantiles = statistics.quantiles(timings, n=100)
+        touched = partitions_touched(engine, call, users[0]) if partitioned else "-"
+        print(f"{name:<24} {quantiles[49]:>8.2f} {quantiles[94]:>8.2f} {quantiles[98]:>8.2f} {touched:>10}")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
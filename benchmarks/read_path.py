@@ -0,0 +1,87 @@
+"""
+Memory and CPU per row of the ORM and the ORM-free read paths for large contact pages.
+
+Usage: python -m benchmarks.read_path [--contacts 10000] [--repeat 5]
+
+Loads one page of --contacts rows from an in-memory SQLite database and serializes it,
+the way the list endpoint did before (ORM objects validated into ContactResponse) and
+does now (Core rows straight to JSON). Reports CPU time per row and the peak of memory
+allocated by the request, measured with tracemalloc.
+"""
+import argparse
+import asyncio
+import gc
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.database.models import Base, Contact, User
+from src.repository import contact_rows as repository_contact_rows
+from src.repository import contacts as repository_contacts
+from src.schemas import ContactResponse
+
+
+async def orm_path(user, db) -> bytes:
+    contacts = await repository_contacts.get_contacts(0, 10 ** 9, user, db)
+    # what FastAPI does with response_model=List[ContactResponse]
+    content = jsonable_encoder([ContactResponse.from_orm(contact) for contact in contacts])
+    return JSONResponse(content).body
+
+
+async def core_path(user, db) -> bytes:
+    rows = await repository_contact_rows.get_contacts(0, 10 ** 9, user, db)
+    return repository_contact_rows.contacts_json(rows)
+
+
+def measure(Session, user, path, repeat: int):
+    best_cpu, peak, size = float("inf"), 0, 0
+    for _ in range(repeat):
+        gc.collect()
+        with Session() as db:
+            started = time.process_time()
+            body = asyncio.run(path(user, db))
+            best_cpu = min(best_cpu, time.process_time() - started)
+        size = len(body)
+    with Session() as db:
+        gc.collect()
+        tracemalloc.start()
+        asyncio.run(path(user, db))
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return best_cpu, peak, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--contacts", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    start = date(1950, 1, 1)
+    with engine.begin() as connection:
+        connection.execute(insert(User), [{"id": 1, "username": "bench", "email": "bench@example.com",
+                                           "password": "x"}])
+        connection.execute(insert(Contact), [
+            {"first_name": f"First{i % 997}", "last_name": f"Last{i % 1231}", "email": f"c{i}@example.com",
+             "phone": f"+380{930000000 + i}", "birthday": start + timedelta(days=i % 25000), "user_id": 1}
+            for i in range(args.contacts)])
+    Session = sessionmaker(bind=engine, expire_on_commit=False)
+    user = User(id=1)
+
+    print(f"{args.contacts} contacts per response")
+    print(f"{'path':<6} {'cpu ms':>8} {'us/row':>8} {'peak MiB':>9} {'bytes':>9}")
+    for name, path in (("orm", orm_path), ("core", core_path)):
+        cpu, peak, size = measure(Session, user, path, args.repeat)
+        print(f"{name:<6} {cpu * 1000:>8.1f} {cpu * 1e6 / args.contacts:>8.2f} {peak / 2 ** 20:>9.2f} {size:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,25 @@
+import asyncio
+import logging
+
 import uvicorn
-import redis.asyncio as redis
 from fastapi import FastAPI
+from fastapi.responses import Response
 from fastapi_limiter import FastAPILimiter
 from fastapi.middleware.cors import CORSMiddleware
+from redis.exceptions import RedisError
 
 from src.routes import contacts, auth, users
 from src.conf.config import settings
+from src.middleware.compression import CompressionMiddleware
+from src.middleware.load_shedding import AdaptiveLimiter, LoadSheddingMiddleware
+from src.middleware.profiling import ProfilingMiddleware
+from src.services import birthday_snapshot
+from src.services.events import event_bus
+from src.services.loop_monitor import LoopMonitor
+from src.services.metrics import CONTENT_TYPE, registry
+from src.services.tracing import FileExporter, OTLPExporter, TracedAsyncRedis, TracingMiddleware, tracer
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI()
 
@@ -19,6 +33,23 @@ origins = [
     ]
 
 
+if settings.load_shedding_enabled:
+    # added first, so that rejected requests still get the CORS headers
+    app.add_middleware(
+        LoadSheddingMiddleware,
+        limiters={
+            group: AdaptiveLimiter(
+                group,
+                limit,
+                latency_target=settings.load_shedding_latency_targets_ms[group] / 1000,
+                queue_size=settings.load_shedding_queue_size,
+                queue_timeout=settings.load_shedding_queue_timeout_ms / 1000,
+            )
+            for group, limit in settings.load_shedding_limits.items()
+        },
+        retry_after=settings.load_shedding_retry_after,
+    )
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -27,12 +58,65 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if settings.compression_enabled:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.compression_minimum_size,
+        level=settings.compression_level,
+        offload_size=settings.compression_offload_size,
+        encodings=settings.compression_encodings,
+    )
+
+if settings.profiling_enabled:
+    app.add_middleware(
+        ProfilingMiddleware,
+        directory=settings.profiling_directory,
+        token=settings.profiling_token,
+        sample_rate=settings.profiling_sample_rate,
+        interval=settings.profiling_interval_ms / 1000,
+    )
+
+if settings.tracing_enabled:
+    # added last, so the root span covers the other middlewares too
+    app.add_middleware(TracingMiddleware)
+
+loop_monitor = LoopMonitor(
+    interval=settings.loop_monitor_interval,
+    threshold=settings.loop_monitor_threshold_ms / 1000,
+    debug=settings.loop_monitor_debug,
+)
+
 
 @app.on_event("startup")
 async def startup():
-    r = await redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0, encoding="utf-8",
-                          decode_responses=True)
-    await FastAPILimiter.init(r)
+    if settings.loop_monitor_enabled:
+        loop_monitor.start()
+    if settings.tracing_enabled:
+        exporter = (OTLPExporter(settings.tracing_otlp_endpoint) if settings.tracing_exporter == 'otlp'
+                    else FileExporter(settings.tracing_file))
+        tracer.configure(exporter, settings.tracing_service_name, settings.tracing_sample_rate)
+    r = await TracedAsyncRedis(host=settings.redis_host, port=settings.redis_port, db=0, encoding="utf-8",
+                               decode_responses=True, socket_timeout=settings.redis_timeout,
+                               socket_connect_timeout=settings.redis_timeout)
+    try:
+        await FastAPILimiter.init(r)
+    except RedisError as err:
+        # ResilientRateLimiter loads the script once Redis is back and counts locally until then
+        logger.warning("rate limiter: %s", err)
+    # the feed listener waits for messages indefinitely, so it must not have a read timeout
+    events_redis = await TracedAsyncRedis(host=settings.redis_host, port=settings.redis_port, db=0,
+                                          encoding="utf-8", decode_responses=True,
+                                          socket_connect_timeout=settings.redis_timeout)
+    await event_bus.start(events_redis)
+    if settings.birthday_snapshot_schedule:
+        app.state.birthday_snapshot = asyncio.create_task(birthday_snapshot.run_daily())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await loop_monitor.stop()
+    await event_bus.stop()
+    tracer.shutdown()
 
 
 @app.get("/")
@@ -40,5 +124,10 @@ def read_root():
     return {"message": "It's work!!!"}
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
+
 if __name__ == '__main__':
     uvicorn.run('main:app', port=8000, reload=True)
@@ -0,0 +1,46 @@
+"""Contacts per-user indexes
+
+Revision ID: 5f3a9c1e7b20
+Revises: 22e080f764fc
+Create Date: 2026-10-19 10:12:31.402118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f3a9c1e7b20'
+down_revision = '22e080f764fc'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_contacts_user_id_id', 'contacts', ['user_id', 'id'], unique=False)
+    op.create_index('ix_contacts_user_id_last_name_first_name', 'contacts', ['user_id', 'last_name', 'first_name'],
+                    unique=False)
+    op.create_index('ix_contacts_user_id_email', 'contacts', ['user_id', 'email'], unique=True)
+    op.create_index('ix_contacts_user_id_phone', 'contacts', ['user_id', 'phone'], unique=True)
+    op.create_index('ix_contacts_user_id_birthday', 'contacts', ['user_id', 'birthday'], unique=False)
+    # superseded by the composite indexes above; email and phone are now unique per user only
+    op.drop_index('ix_contacts_birthday', table_name='contacts')
+    op.drop_index('ix_contacts_email', table_name='contacts')
+    op.drop_index('ix_contacts_first_name', table_name='contacts')
+    op.drop_index('ix_contacts_id', table_name='contacts')
+    op.drop_index('ix_contacts_last_name', table_name='contacts')
+    op.drop_index('ix_contacts_phone', table_name='contacts')
+
+
+def downgrade() -> None:
+    op.create_index('ix_contacts_phone', 'contacts', ['phone'], unique=True)
+    op.create_index('ix_contacts_last_name', 'contacts', ['last_name'], unique=False)
+    op.create_index('ix_contacts_id', 'contacts', ['id'], unique=False)
+    op.create_index('ix_contacts_first_name', 'contacts', ['first_name'], unique=False)
+    op.create_index('ix_contacts_email', 'contacts', ['email'], unique=True)
+    op.create_index('ix_contacts_birthday', 'contacts', ['birthday'], unique=False)
+    op.drop_index('ix_contacts_user_id_birthday', table_name='contacts')
+    op.drop_index('ix_contacts_user_id_phone', table_name='contacts')
+    op.drop_index('ix_contacts_user_id_email', table_name='contacts')
+    op.drop_index('ix_contacts_user_id_last_name_first_name', table_name='contacts')
+    op.drop_index('ix_contacts_user_id_id', table_name='contacts')
@@ -0,0 +1,46 @@
+"""Contacts change tracking
+
+Revision ID: 9b1d4e6f2a53
+Revises: 5f3a9c1e7b20
+Create Date: 2026-10-19 11:03:54.771290
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b1d4e6f2a53'
+down_revision = '5f3a9c1e7b20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('contacts_version', sa.BigInteger(), server_default='0', nullable=False))
+    op.add_column('contacts', sa.Column('version', sa.BigInteger(), server_default='0', nullable=False))
+    op.add_column('contacts', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_contacts_user_id_version', 'contacts', ['user_id', 'version'], unique=False)
+    op.create_table('contact_tombstones',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('contact_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_contact_tombstones_user_id_version', 'contact_tombstones', ['user_id', 'version'],
+                    unique=False)
+    # existing rows become version 1, so a client syncing from token 0 receives all of them
+    op.execute("UPDATE contacts SET version = 1, updated_at = CURRENT_TIMESTAMP")
+    op.execute("UPDATE users SET contacts_version = 1 WHERE id IN (SELECT user_id FROM contacts)")
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contact_tombstones_user_id_version', table_name='contact_tombstones')
+    op.drop_table('contact_tombstones')
+    op.drop_index('ix_contacts_user_id_version', table_name='contacts')
+    op.drop_column('contacts', 'updated_at')
+    op.drop_column('contacts', 'version')
+    op.drop_column('users', 'contacts_version')
@@ -0,0 +1,55 @@
+"""Hash partitioned shadow of contacts
+
+Revision ID: a3d7f1c9e254
+Revises: f6c31b7e8a92
+Create Date: 2026-10-19 15:02:18.550731
+
+Postgres only. Partitioning is optional: this revision only creates contacts_mirror(), the
+trigger function src.cli.partition uses to keep a copy of contacts current. The hash
+partitioned contacts_partitioned and the trigger are created where partitioning is wanted,
+with ``python -m src.cli.partition prepare --partitions 16``; until then contacts writes
+cost what they did.
+
+"""
+from alembic import context, op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3d7f1c9e254'
+down_revision = 'f6c31b7e8a92'
+branch_labels = None
+depends_on = None
+
+# copies every row change to the table named by the trigger argument; the swap reuses it
+# in the other direction, to keep the old table current in case the swap is reverted
+MIRROR_FUNCTION = """
+CREATE OR REPLACE FUNCTION contacts_mirror() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        EXECUTE format('DELETE FROM %I WHERE user_id = $1 AND id = $2', TG_ARGV[0]) USING OLD.user_id, OLD.id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.user_id IS NOT NULL THEN
+        EXECUTE format('INSERT INTO %I SELECT ($1).*', TG_ARGV[0]) USING NEW;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+def upgrade() -> None:
+    if op.get_context().dialect.name != 'postgresql':
+        return
+    op.execute(MIRROR_FUNCTION)
+
+
+def downgrade() -> None:
+    if op.get_context().dialect.name != 'postgresql':
+        return
+    if not context.is_offline_mode() and op.get_bind().exec_driver_sql(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'contacts'::regclass").scalar():
+        raise RuntimeError("contacts is already partitioned; swap back with "
+                           "`python -m src.cli.partition unswap` first")
+    op.execute("DROP TRIGGER IF EXISTS contacts_mirror ON contacts")
+    op.execute("DROP TABLE IF EXISTS contacts_partitioned")
+    op.execute("DROP FUNCTION IF EXISTS contacts_mirror()")
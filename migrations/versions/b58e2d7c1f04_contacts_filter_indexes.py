@@ -0,0 +1,101 @@
+"""Contacts filter indexes
+
+Revision ID: b58e2d7c1f04
+Revises: a3d7f1c9e254
+Create Date: 2026-10-19 17:24:51.306148
+
+Month and day of birth for month range filters and sorting in calendar order, the indexes
+of GET /api/contacts/filter/ and, on Postgres, trigram indexes for the "contains" filters
+and indexes in the "C" collation for the prefix filters and their sorts (byte order, see
+src.services.contact_filters). The trigram indexes lead with user_id like the others, so a
+search only reads the matches of its own user; btree_gin provides the GIN operator class
+for the integer column.
+The partitioned copy of contacts and the plain table it replaced (src.cli.partition) get
+the same columns, in the same order, and indexes.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b58e2d7c1f04'
+down_revision = 'a3d7f1c9e254'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 10000
+INDEXES = {
+    'ix_contacts_user_id_first_name_last_name': ['user_id', 'first_name', 'last_name'],
+    'ix_contacts_user_id_birth_month_birth_day': ['user_id', 'birth_month', 'birth_day'],
+}
+TRIGRAM_INDEXES = {
+    'ix_contacts_user_id_first_name_trgm': 'USING gin (user_id, first_name gin_trgm_ops)',
+    'ix_contacts_user_id_last_name_trgm': 'USING gin (user_id, last_name gin_trgm_ops)',
+    'ix_contacts_user_id_email_trgm': 'USING gin (user_id, email gin_trgm_ops)',
+}
+PREFIX_INDEXES = {
+    'ix_contacts_user_id_email_c': '(user_id, email COLLATE "C")',
+    'ix_contacts_user_id_last_name_first_name_c': '(user_id, last_name COLLATE "C", first_name COLLATE "C")',
+    'ix_contacts_user_id_first_name_last_name_c': '(user_id, first_name COLLATE "C", last_name COLLATE "C")',
+}
+# the other tables of src.cli.partition and the prefix of their index names
+COPIES = {'contacts_partitioned': 'p_', 'contacts_unpartitioned': 'unpartitioned_'}
+
+
+def _copies():
+    connection = op.get_bind()
+    return {table: prefix for table, prefix in COPIES.items()
+            if connection.exec_driver_sql(f"SELECT to_regclass('{table}') IS NOT NULL").scalar()}
+
+
+def upgrade() -> None:
+    postgres = op.get_context().dialect.name == 'postgresql'
+    copies = _copies() if postgres else {}
+    for table in ['contacts', *copies]:
+        op.add_column(table, sa.Column('birth_month', sa.SmallInteger(), nullable=True))
+        op.add_column(table, sa.Column('birth_day', sa.SmallInteger(), nullable=True))
+
+    # backfill in keyset-paginated batches, before the indexes exist to keep the updates cheap;
+    # the mirror trigger of src.cli.partition carries the updates over to the other table
+    contacts = sa.table('contacts', sa.column('id'), sa.column('birthday'), sa.column('birth_month'),
+                        sa.column('birth_day'))
+    connection = op.get_bind()
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(contacts.c.id, contacts.c.birthday)
+            .where(contacts.c.id > last_id, contacts.c.birthday.isnot(None))
+            .order_by(contacts.c.id).limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        connection.execute(
+            contacts.update().where(contacts.c.id == sa.bindparam('contact_id'))
+            .values(birth_month=sa.bindparam('month'), birth_day=sa.bindparam('day')),
+            [{'contact_id': contact_id, 'month': birthday.month, 'day': birthday.day}
+             for contact_id, birthday in rows],
+        )
+        last_id = rows[-1][0]
+
+    for table, prefix in [('contacts', ''), *copies.items()]:
+        for name, columns in INDEXES.items():
+            op.create_index(f'{prefix}{name}', table, columns, unique=False)
+    if postgres:
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute("CREATE EXTENSION IF NOT EXISTS btree_gin")
+        for table, prefix in [('contacts', ''), *copies.items()]:
+            for name, definition in TRIGRAM_INDEXES.items():
+                op.execute(f"CREATE INDEX {prefix}{name} ON {table} {definition}")
+            for name, columns in PREFIX_INDEXES.items():
+                op.execute(f"CREATE INDEX {prefix}{name} ON {table} {columns}")
+
+
+def downgrade() -> None:
+    postgres = op.get_context().dialect.name == 'postgresql'
+    copies = _copies() if postgres else {}
+    for table, prefix in [('contacts', ''), *copies.items()]:
+        for name in [*INDEXES, *(TRIGRAM_INDEXES if postgres else []), *(PREFIX_INDEXES if postgres else [])]:
+            op.drop_index(f'{prefix}{name}', table_name=table)
+        op.drop_column(table, 'birth_day')
+        op.drop_column(table, 'birth_month')
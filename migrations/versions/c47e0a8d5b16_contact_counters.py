@@ -0,0 +1,47 @@
+"""Contact counters
+
+Revision ID: c47e0a8d5b16
+Revises: 9b1d4e6f2a53
+Create Date: 2026-10-19 11:48:20.114532
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c47e0a8d5b16'
+down_revision = '9b1d4e6f2a53'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('contact_counters',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=20), nullable=False),
+    sa.Column('value', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'name')
+    )
+
+    # backfill every user's counters in one set-based pass per counter
+    users = sa.table('users', sa.column('id'))
+    contacts = sa.table('contacts', sa.column('id'), sa.column('user_id'), sa.column('phone'),
+                        sa.column('birthday'))
+    counters = sa.table('contact_counters', sa.column('user_id'), sa.column('name'), sa.column('value'))
+    joined = users.outerjoin(contacts, contacts.c.user_id == users.c.id)
+    month = sa.extract('month', contacts.c.birthday)
+    definitions = {
+        'total': sa.func.count(contacts.c.id),
+        'with_phone': sa.func.count(sa.case((contacts.c.phone != '', 1))),
+        'with_birthday': sa.func.count(contacts.c.birthday),
+    }
+    definitions.update({f'birth_month_{m}': sa.func.count(sa.case((month == m, 1))) for m in range(1, 13)})
+    for name, value in definitions.items():
+        select = sa.select(users.c.id, sa.literal(name), value).select_from(joined).group_by(users.c.id)
+        op.execute(counters.insert().from_select(['user_id', 'name', 'value'], select))
+
+
+def downgrade() -> None:
+    op.drop_table('contact_counters')
@@ -0,0 +1,61 @@
+"""Contacts normalized phone
+
+Revision ID: e2a86f3c9d41
+Revises: c47e0a8d5b16
+Create Date: 2026-10-19 12:31:07.528849
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from src.services.phones import normalize_phone, reversed_digits
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2a86f3c9d41'
+down_revision = 'c47e0a8d5b16'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 10000
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('phone_normalized', sa.String(length=20), nullable=True))
+    op.add_column('contacts', sa.Column('phone_reversed', sa.String(length=20), nullable=True))
+
+    # backfill in keyset-paginated batches, before the indexes exist to keep the updates cheap
+    contacts = sa.table('contacts', sa.column('id'), sa.column('phone'), sa.column('phone_normalized'),
+                        sa.column('phone_reversed'))
+    connection = op.get_bind()
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(contacts.c.id, contacts.c.phone)
+            .where(contacts.c.id > last_id, contacts.c.phone.isnot(None))
+            .order_by(contacts.c.id).limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        params = []
+        for contact_id, phone in rows:
+            normalized = normalize_phone(phone)
+            params.append({'contact_id': contact_id, 'normalized': normalized,
+                           'reversed': reversed_digits(normalized)})
+        connection.execute(
+            contacts.update().where(contacts.c.id == sa.bindparam('contact_id'))
+            .values(phone_normalized=sa.bindparam('normalized'), phone_reversed=sa.bindparam('reversed')),
+            params,
+        )
+        last_id = rows[-1][0]
+
+    op.create_index('ix_contacts_user_id_phone_normalized', 'contacts', ['user_id', 'phone_normalized'],
+                    unique=False)
+    op.create_index('ix_contacts_user_id_phone_reversed', 'contacts', ['user_id', 'phone_reversed'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_user_id_phone_reversed', table_name='contacts')
+    op.drop_index('ix_contacts_user_id_phone_normalized', table_name='contacts')
+    op.drop_column('contacts', 'phone_reversed')
+    op.drop_column('contacts', 'phone_normalized')
@@ -0,0 +1,36 @@
+"""Upcoming birthdays snapshot
+
+Revision ID: f6c31b7e8a92
+Revises: e2a86f3c9d41
+Create Date: 2026-10-19 13:10:42.093417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f6c31b7e8a92'
+down_revision = 'e2a86f3c9d41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('upcoming_birthdays',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('contact_id', sa.Integer(), nullable=False),
+    sa.Column('birthday_on', sa.Date(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'contact_id')
+    )
+    op.create_table('job_runs',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('ran_on', sa.Date(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('job_runs')
+    op.drop_table('upcoming_birthdays')
@@ -0,0 +1,232 @@
+"""
+Moves contacts into a hash partitioned table (Postgres), for the databases that want it.
+
+    python -m src.cli.partition prepare --partitions 16
+    python -m src.cli.partition status
+    python -m src.cli.partition backfill --batch-size 20000
+    python -m src.cli.partition verify
+    python -m src.cli.partition swap
+    python -m src.cli.partition unswap      # back to the plain table, if needed
+    python -m src.cli.partition drop-old    # once the partitioned table has proven itself
+    python -m src.cli.partition abort       # drop the partitioned copy before the swap
+
+``prepare`` creates contacts_partitioned with the columns and indexes contacts has at that
+moment, and a trigger (the contacts_mirror() function of migration a3d7f1c9e254) that
+mirrors every write to contacts into it; from then on every write is done twice, so run it
+right before the backfill. While the application keeps running ``backfill`` copies the
+existing rows in small keyset batches. Each batch share-locks its rows, so a concurrent
+update or delete either happens before the copy or is mirrored after it. ``swap`` renames
+the tables (and their indexes and constraints) in one short transaction and mirrors writes
+back into the old table, so ``unswap`` stays possible until ``drop-old``.
+
+The primary key of the partitioned table is (user_id, id): contacts without a user cannot
+be moved, and ``verify`` and ``swap`` fail until they are deleted or given an owner.
+"""
+import argparse
+import sys
+import time
+from typing import Dict
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Connection
+
+SHADOW = "contacts_partitioned"
+OLD = "contacts_unpartitioned"
+
+
+def table_exists(connection: Connection, name: str) -> bool:
+    return connection.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}).scalar()
+
+
+def is_partitioned(connection: Connection, name: str) -> bool:
+    return bool(connection.execute(text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:name)"),
+                                   {"name": name}).scalar())
+
+
+def index_definitions(connection: Connection, table: str, prefix: str = "") -> Dict[str, str]:
+    """
+    Returns the CREATE INDEX statements of the table's indexes, keyed by their names without ``prefix``.
+    """
+    rows = connection.execute(text("SELECT indexname, indexdef FROM pg_indexes "
+                                   "WHERE schemaname = current_schema() AND tablename = :table"), {"table": table})
+    return {name[len(prefix):]: definition for name, definition in rows if name.startswith(f"{prefix}ix_")}
+
+
+def prepare(connection: Connection, partitions: int) -> None:
+    """
+    Creates the partitioned copy of contacts, with the same indexes, and the trigger mirroring writes into it.
+    """
+    if is_partitioned(connection, "contacts"):
+        sys.exit("contacts is already partitioned")
+    if table_exists(connection, SHADOW):
+        sys.exit(f"{SHADOW} already exists")
+    connection.execute(text(f"CREATE TABLE {SHADOW} (LIKE contacts INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+                            f"PARTITION BY HASH (user_id)"))
+    for remainder in range(partitions):
+        connection.execute(text(f"CREATE TABLE {SHADOW}_{remainder} PARTITION OF {SHADOW} "
+                                f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"))
+    # the primary key of a partitioned table has to contain the partition key
+    connection.execute(text(f"ALTER TABLE {SHADOW} ADD CONSTRAINT p_contacts_pkey PRIMARY KEY (user_id, id)"))
+    connection.execute(text(f"ALTER TABLE {SHADOW} ADD CONSTRAINT p_contacts_user_id_fkey "
+                            f"FOREIGN KEY (user_id) REFERENCES users (id)"))
+    for name, definition in index_definitions(connection, "contacts").items():
+        # "CREATE [UNIQUE] INDEX name ON [schema.]contacts USING ..."
+        head, _, rest = definition.partition(f" INDEX {name} ON ")
+        rest = rest.split(" USING ", 1)[1]
+        connection.execute(text(f"{head} INDEX p_{name} ON {SHADOW} USING {rest}"))
+    connection.execute(text(f"CREATE TRIGGER contacts_mirror AFTER INSERT OR UPDATE OR DELETE ON contacts "
+                            f"FOR EACH ROW EXECUTE FUNCTION contacts_mirror('{SHADOW}')"))
+    connection.commit()
+    print(f"created {SHADOW} with {partitions} partitions; writes to contacts are mirrored into it")
+
+
+def abort(connection: Connection) -> None:
+    """
+    Drops the partitioned copy and its trigger, before the swap.
+    """
+    if is_partitioned(connection, "contacts"):
+        sys.exit("contacts is already partitioned: unswap first")
+    connection.execute(text("DROP TRIGGER IF EXISTS contacts_mirror ON contacts"))
+    connection.execute(text(f"DROP TABLE IF EXISTS {SHADOW}"))
+    connection.commit()
+    print("dropped", SHADOW)
+
+
+def status(connection: Connection) -> None:
+    for name in ("contacts", SHADOW, OLD):
+        if table_exists(connection, name):
+            rows = connection.execute(text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:name)"),
+                                      {"name": name}).scalar()
+            kind = "partitioned" if is_partitioned(connection, name) else "plain"
+            print(f"{name:<24} {kind:<12} ~{max(rows, 0)} rows")
+
+
+def backfill(connection: Connection, batch_size: int, pause: float) -> None:
+    """
+    Copies the rows of contacts that the trigger has not mirrored yet, one ID range per transaction.
+    """
+    if not table_exists(connection, SHADOW):
+        sys.exit(f"{SHADOW} does not exist: run prepare first")
+    low, high = connection.execute(text("SELECT COALESCE(MIN(id), 1) - 1, COALESCE(MAX(id), 0) FROM contacts")).one()
+    connection.commit()
+    copied, started = 0, time.perf_counter()
+    while low < high:
+        upper = min(low + batch_size, high)
+        result = connection.execute(text(
+            f"INSERT INTO {SHADOW} SELECT batch.* FROM ("
+            f"  SELECT * FROM contacts WHERE id > :low AND id <= :upper AND user_id IS NOT NULL FOR SHARE"
+            f") AS batch ON CONFLICT DO NOTHING"), {"low": low, "upper": upper})
+        connection.commit()
+        copied += result.rowcount
+        low = upper
+        print(f"\rcopied {copied} rows, up to id {low} of {high} "
+              f"({copied / (time.perf_counter() - started):.0f} rows/s)", end="", flush=True)
+        if pause:
+            time.sleep(pause)
+    print()
+
+
+def verify(connection: Connection) -> bool:
+    source = "contacts" if not is_partitioned(connection, "contacts") else OLD
+    target = SHADOW if source == "contacts" else "contacts"
+    # one statement, so both tables are counted in the same snapshot
+    source_rows, target_rows, orphans = connection.execute(text(
+        f"SELECT (SELECT count(*) FROM {source} WHERE user_id IS NOT NULL), (SELECT count(*) FROM {target}), "
+        f"(SELECT count(*) FROM {source} WHERE user_id IS NULL)")).one()
+    print(f"{source}: {source_rows} rows, {target}: {target_rows} rows")
+    if orphans:
+        print(f"{orphans} rows of {source} have no user_id and cannot be moved: delete them or give them an owner")
+    return source_rows == target_rows and not orphans
+
+
+def _rename(connection: Connection, table: str, new_table: str, prefix: str, new_prefix: str) -> None:
+    indexes = index_definitions(connection, table, prefix)
+    connection.execute(text(f"ALTER TABLE {table} RENAME TO {new_table}"))
+    for index in indexes:
+        connection.execute(text(f"ALTER INDEX {prefix}{index} RENAME TO {new_prefix}{index}"))
+    for constraint in ("contacts_pkey", "contacts_user_id_fkey"):
+        connection.execute(text(f"ALTER TABLE {new_table} RENAME CONSTRAINT {prefix}{constraint} "
+                                f"TO {new_prefix}{constraint}"))
+
+
+def _switch(connection: Connection, current: str, current_prefix: str, standby: str, standby_prefix: str,
+            lock_timeout: str) -> None:
+    """
+    Makes ``standby`` the contacts table and renames the current one to ``current``, mirroring
+    writes of the new contacts table into the old one.
+    """
+    connection.execute(text(f"SET LOCAL lock_timeout = '{lock_timeout}'"))
+    connection.execute(text(f"LOCK TABLE contacts, {standby} IN ACCESS EXCLUSIVE MODE"))
+    connection.execute(text("DROP TRIGGER IF EXISTS contacts_mirror ON contacts"))
+    _rename(connection, "contacts", current, "", current_prefix)
+    _rename(connection, standby, "contacts", standby_prefix, "")
+    connection.execute(text("ALTER SEQUENCE contacts_id_seq OWNED BY contacts.id"))
+    connection.execute(text(f"CREATE TRIGGER contacts_mirror AFTER INSERT OR UPDATE OR DELETE ON contacts "
+                            f"FOR EACH ROW EXECUTE FUNCTION contacts_mirror('{current}')"))
+    connection.commit()
+
+
+def swap(connection: Connection, lock_timeout: str) -> None:
+    if is_partitioned(connection, "contacts"):
+        sys.exit("contacts is already partitioned")
+    if not verify(connection):
+        sys.exit("the tables differ: run backfill first, and move or delete the rows without user_id")
+    _switch(connection, OLD, "unpartitioned_", SHADOW, "p_", lock_timeout)
+    print("contacts is now partitioned; the old table is kept as", OLD)
+
+
+def unswap(connection: Connection, lock_timeout: str) -> None:
+    if not is_partitioned(connection, "contacts") or not table_exists(connection, OLD):
+        sys.exit(f"nothing to revert: contacts is not partitioned or {OLD} was dropped")
+    _switch(connection, SHADOW, "p_", OLD, "unpartitioned_", lock_timeout)
+    print("contacts is the plain table again; the partitioned one is kept as", SHADOW)
+
+
+def drop_old(connection: Connection) -> None:
+    if not is_partitioned(connection, "contacts"):
+        sys.exit("contacts is not partitioned yet")
+    connection.execute(text("DROP TRIGGER IF EXISTS contacts_mirror ON contacts"))
+    connection.execute(text(f"DROP TABLE IF EXISTS {OLD}"))
+    connection.commit()
+    print("dropped", OLD)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["prepare", "status", "backfill", "verify", "swap", "unswap", "drop-old",
+                                            "abort"])
+    parser.add_argument("--partitions", type=int, default=16, help="number of hash partitions for prepare")
+    parser.add_argument("--url", default=None, help="database URL, settings.sqlalchemy_database_url by default")
+    parser.add_argument("--batch-size", type=int, default=20000, help="contact IDs per backfill transaction")
+    parser.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between backfill batches")
+    parser.add_argument("--lock-timeout", default="5s", help="give up the swap if the tables stay locked longer")
+    args = parser.parse_args()
+
+    if args.url is None:
+        from src.conf.config import settings
+        args.url = settings.sqlalchemy_database_url
+    engine = create_engine(args.url)
+    if engine.dialect.name != "postgresql":
+        sys.exit("partitioning is only supported on Postgres")
+    with engine.connect() as connection:
+        if args.command == "prepare":
+            prepare(connection, args.partitions)
+        elif args.command == "abort":
+            abort(connection)
+        elif args.command == "status":
+            status(connection)
+        elif args.command == "backfill":
+            backfill(connection, args.batch_size, args.pause)
+        elif args.command == "verify":
+            sys.exit(0 if verify(connection) else 1)
+        elif args.command == "swap":
+            swap(connection, args.lock_timeout)
+        elif args.command == "unswap":
+            unswap(connection, args.lock_timeout)
+        else:
+            drop_old(connection)
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
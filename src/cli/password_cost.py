@@ -0,0 +1,124 @@
+"""
+Picks the bcrypt cost for this host and shows the cost of the stored password hashes.
+
+    python -m src.cli.password_cost calibrate --target-ms 250
+    python -m src.cli.password_cost stats
+
+``calibrate`` times hashing at increasing costs on the machine it runs on and prints the
+highest cost whose median time stays within the target, as the BCRYPT_ROUNDS line for the
+environment; run it on the production hosts, not on a laptop. After a change of the setting
+every user is rehashed with the new cost at their next login. ``stats`` counts the users by
+the cost of their hash, to follow that migration.
+"""
+import argparse
+import statistics
+import sys
+import time
+from typing import Dict, List, Tuple
+
+from passlib.context import CryptContext
+from sqlalchemy import create_engine, func, select
+
+from src.database.models import User
+from src.services.auth import hash_rounds
+
+MIN_ROUNDS, MAX_ROUNDS = 4, 31
+# OWASP's floor for bcrypt
+RECOMMENDED_MIN_ROUNDS = 10
+
+
+def time_hash(rounds: int, samples: int) -> float:
+    """
+    Measures the median time of one bcrypt hash at the given cost.
+
+    :param rounds: bcrypt cost factor.
+    :type rounds: int
+    :param samples: Number of hashes to time.
+    :type samples: int
+    :return: Median time in milliseconds.
+    :rtype: float
+    """
+    context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds)
+    # the first hash also loads the bcrypt backend
+    context.hash("calibration password")
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        context.hash("calibration password")
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def calibrate(target_ms: float, samples: int, start: int = MIN_ROUNDS) -> Tuple[int, List[Tuple[int, float]]]:
+    """
+    Finds the highest cost whose hash time stays within the target. Every extra round
+    doubles the time, so the search stops at the first cost above the target.
+
+    :param target_ms: Time budget of one hash in milliseconds.
+    :type target_ms: float
+    :param samples: Number of hashes to time per cost.
+    :type samples: int
+    :param start: Lowest cost to try.
+    :type start: int
+    :return: The chosen cost (``start`` if even that is too slow) and the timings per cost.
+    :rtype: Tuple[int, List[Tuple[int, float]]]
+    """
+    chosen, timings = start, []
+    for rounds in range(start, MAX_ROUNDS + 1):
+        elapsed = time_hash(rounds, samples)
+        timings.append((rounds, elapsed))
+        if elapsed > target_ms:
+            break
+        chosen = rounds
+    return chosen, timings
+
+
+def rounds_distribution(url: str) -> Dict[int | None, int]:
+    """
+    Counts users by the cost of their password hash.
+
+    :param url: Database URL.
+    :type url: str
+    :return: Number of users per cost, None for hashes that are not bcrypt.
+    :rtype: Dict[int | None, int]
+    """
+    engine = create_engine(url)
+    # "$2b$12$" holds the scheme and the cost
+    prefix = func.substr(User.password, 1, 7)
+    with engine.connect() as connection:
+        rows = connection.execute(select(prefix, func.count()).group_by(prefix)).all()
+    engine.dispose()
+    distribution: Dict[int | None, int] = {}
+    for value, count in rows:
+        rounds = hash_rounds(value + "$")
+        distribution[rounds] = distribution.get(rounds, 0) + count
+    return distribution
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["calibrate", "stats"])
+    parser.add_argument("--target-ms", type=float, default=250.0, help="time budget of one hash")
+    parser.add_argument("--samples", type=int, default=5, help="hashes timed per cost")
+    parser.add_argument("--url", default=None, help="database URL, settings.sqlalchemy_database_url by default")
+    args = parser.parse_args()
+
+    from src.conf.config import settings
+    if args.command == "calibrate":
+        rounds, timings = calibrate(args.target_ms, args.samples)
+        for cost, elapsed in timings:
+            print(f"rounds {cost:>2}: {elapsed:8.1f} ms")
+        if rounds < RECOMMENDED_MIN_ROUNDS:
+            print(f"warning: {rounds} rounds is below the recommended minimum of {RECOMMENDED_MIN_ROUNDS}",
+                  file=sys.stderr)
+        print(f"current setting: {settings.bcrypt_rounds}")
+        print(f"BCRYPT_ROUNDS={rounds}")
+    else:
+        distribution = rounds_distribution(args.url or settings.sqlalchemy_database_url)
+        for rounds, count in sorted(distribution.items(), key=lambda item: (item[0] is None, item[0] or 0)):
+            marker = " (current setting)" if rounds == settings.bcrypt_rounds else ""
+            print(f"{'other' if rounds is None else f'rounds {rounds:>2}'}: {count} users{marker}")
+
+
+if __name__ == "__main__":
+    main()
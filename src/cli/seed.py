@@ -0,0 +1,223 @@
+"""
+Fills a database with synthetic users and contacts for production-scale testing.
+
+    python -m src.cli.seed --users 100000 --contacts-per-user 100 --workers 8
+
+Every user gets the same password (``--password``), hashed once with bcrypt and reused.
+Rows are generated in memory and bulk-loaded in large batches: with COPY on Postgres,
+with executemany elsewhere. Postgres loads run in parallel worker processes, each one
+seeding its own range of user IDs. SQLite allows a single writer, so it always uses one
+process.
+"""
+import argparse
+import csv
+import io
+import multiprocessing
+import random
+import time
+from datetime import date, timedelta
+from typing import Dict, Iterator, List
+
+from sqlalchemy import create_engine, event, func, insert, select, text
+from sqlalchemy.engine import Engine
+
+from src.database.models import Base, Contact, ContactCounter, User
+from src.repository.stats import COUNTERS
+from src.services.phones import normalize_phone, reversed_digits
+
+FIRST_NAMES = ["Olena", "Ivan", "Maria", "Andriy", "Iryna", "Taras", "Oksana", "Petro", "Kateryna", "Dmytro",
+               "Natalia", "Serhii", "Yulia", "Oleksandr", "Tetiana", "Mykola", "Anna", "Viktor", "Sofia", "Yurii",
+               "Halyna", "Roman", "Larysa", "Bohdan", "Svitlana", "Maksym", "Daryna", "Volodymyr", "Alina", "Ihor"]
+LAST_NAMES = ["Shevchenko", "Bondarenko", "Kovalenko", "Boyko", "Tkachenko", "Kravchenko", "Oliynyk", "Shevchuk",
+              "Koval", "Polishchuk", "Bondar", "Tkachuk", "Moroz", "Marchenko", "Lysenko", "Rudenko", "Savchenko",
+              "Petrenko", "Klymenko", "Pavlenko", "Melnyk", "Kozak", "Ponomarenko", "Vasylenko", "Levchenko",
+              "Kharchenko", "Sydorenko", "Karpenko", "Yurchenko", "Hrytsenko"]
+DOMAINS = ["example.com", "example.org", "example.net", "mail.example", "post.example"]
+
+CONTACT_COLUMNS = ["first_name", "last_name", "email", "phone", "phone_normalized", "phone_reversed", "birthday",
+                   "birth_month", "birth_day", "user_id", "version"]
+
+
+def random_birthday(rng: random.Random, today: date) -> date:
+    """
+    Draws a birthday of an adult, with ages roughly normally distributed around 40.
+
+    :param rng: Random generator.
+    :type rng: random.Random
+    :param today: Day the ages are counted from.
+    :type today: date
+    :return: Birthday.
+    :rtype: date
+    """
+    age = min(max(rng.gauss(40, 15), 16), 95)
+    return today - timedelta(days=int(age * 365.25) + rng.randrange(365))
+
+
+def user_rows(first_id: int, count: int, contacts_per_user: int, password_hash: str) -> List[Dict]:
+    return [{"id": user_id, "username": f"user{user_id}"[:25], "email": f"user{user_id}@example.com",
+             "password": password_hash, "confirmed": True, "contacts_version": contacts_per_user}
+            for user_id in range(first_id, first_id + count)]
+
+
+def contact_rows(user_id: int, contacts_per_user: int, rng: random.Random, today: date) -> Iterator[Dict]:
+    """
+    Generates the contacts of one user. Emails and phones are unique across the whole database
+    because they are derived from the user ID and the contact's position.
+
+    :param user_id: Owner of the contacts.
+    :type user_id: int
+    :param contacts_per_user: Number of contacts to generate.
+    :type contacts_per_user: int
+    :param rng: Random generator.
+    :type rng: random.Random
+    :param today: Day the ages are counted from.
+    :type today: date
+    :return: Contact rows.
+    :rtype: Iterator[Dict]
+    """
+    for position in range(contacts_per_user):
+        number = (user_id - 1) * contacts_per_user + position
+        first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        phone = f"0{500000000 + number % 500000000:09d}" if rng.random() < 0.9 else None
+        normalized = normalize_phone(phone, "380")
+        birthday = random_birthday(rng, today)
+        yield {"first_name": first_name, "last_name": last_name,
+               "email": f"{first_name}.{last_name}.{number}@{rng.choice(DOMAINS)}".lower(),
+               "phone": phone, "phone_normalized": normalized, "phone_reversed": reversed_digits(normalized),
+               "birthday": birthday, "birth_month": birthday.month, "birth_day": birthday.day, "user_id": user_id,
+               "version": position + 1}
+
+
+def counter_rows(user_id: int, contacts: List[Dict]) -> List[Dict]:
+    counters = dict.fromkeys(COUNTERS, 0)
+    for contact in contacts:
+        counters["total"] += 1
+        counters["with_phone"] += contact["phone"] is not None
+        counters["with_birthday"] += 1
+        counters[f"birth_month_{contact['birthday'].month}"] += 1
+    return [{"user_id": user_id, "name": name, "value": value} for name, value in counters.items()]
+
+
+def copy_rows(engine: Engine, table: str, columns: List[str], rows: List[Dict]) -> None:
+    """
+    Loads rows with COPY ... FROM STDIN, the fastest bulk path on Postgres.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(["" if row[column] is None else row[column] for column in columns])
+    buffer.seek(0)
+    connection = engine.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def load(engine: Engine, model, rows: List[Dict]) -> None:
+    if not rows:
+        return
+    if engine.dialect.name == "postgresql":
+        copy_rows(engine, model.__tablename__, list(rows[0]), rows)
+    else:
+        with engine.begin() as connection:
+            connection.execute(insert(model), rows)
+
+
+def make_engine(url: str) -> Engine:
+    engine = create_engine(url)
+    if engine.dialect.name == "sqlite":
+        @event.listens_for(engine, "connect")
+        def _fast_sqlite(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=OFF")
+            cursor.close()
+    return engine
+
+
+def seed_users(url: str, first_id: int, count: int, contacts_per_user: int, password_hash: str,
+               batch_size: int, seed: int) -> int:
+    """
+    Seeds users first_id .. first_id + count - 1 with their contacts and counters.
+
+    :return: Number of contacts loaded.
+    :rtype: int
+    """
+    engine = make_engine(url)
+    rng = random.Random(seed + first_id)
+    today = date.today()
+    users_per_batch = max(1, batch_size // max(contacts_per_user, 1))
+    loaded = 0
+    for batch_first in range(first_id, first_id + count, users_per_batch):
+        batch_count = min(users_per_batch, first_id + count - batch_first)
+        load(engine, User, user_rows(batch_first, batch_count, contacts_per_user, password_hash))
+        contacts, counters = [], []
+        for user_id in range(batch_first, batch_first + batch_count):
+            rows = list(contact_rows(user_id, contacts_per_user, rng, today))
+            contacts.extend(rows)
+            counters.extend(counter_rows(user_id, rows))
+        load(engine, Contact, [{column: row[column] for column in CONTACT_COLUMNS} for row in contacts])
+        load(engine, ContactCounter, counters)
+        loaded += len(contacts)
+    engine.dispose()
+    return loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None, help="database URL, settings.sqlalchemy_database_url by default")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--contacts-per-user", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--batch-size", type=int, default=50000, help="contacts per bulk load")
+    parser.add_argument("--password", default="password123")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--create-schema", action="store_true", help="create missing tables first")
+    args = parser.parse_args()
+
+    if args.url is None:
+        from src.conf.config import settings
+        args.url = settings.sqlalchemy_database_url
+
+    from src.services.auth import auth_service
+    password_hash = auth_service.get_password_hash(args.password)
+
+    engine = make_engine(args.url)
+    if args.create_schema:
+        Base.metadata.create_all(engine)
+    with engine.connect() as connection:
+        first_id = (connection.execute(select(func.max(User.id))).scalar() or 0) + 1
+    workers = 1 if engine.dialect.name == "sqlite" else max(1, args.workers)
+
+    share, extra = divmod(args.users, workers)
+    ranges, next_id = [], first_id
+    for worker in range(workers):
+        count = share + (worker < extra)
+        if count:
+            ranges.append((args.url, next_id, count, args.contacts_per_user, password_hash, args.batch_size,
+                           args.seed))
+        next_id += count
+
+    started = time.perf_counter()
+    if len(ranges) == 1:
+        loaded = seed_users(*ranges[0])
+    else:
+        with multiprocessing.Pool(len(ranges)) as pool:
+            loaded = sum(pool.starmap(seed_users, ranges))
+    elapsed = time.perf_counter() - started
+
+    if engine.dialect.name == "postgresql":
+        # user IDs were assigned here, move the sequence past them
+        with engine.begin() as connection:
+            connection.execute(text("SELECT setval(pg_get_serial_sequence('users', 'id'), "
+                                    "(SELECT MAX(id) FROM users))"))
+    engine.dispose()
+    print(f"seeded {args.users} users and {loaded} contacts with {len(ranges)} worker(s) in {elapsed:.1f}s "
+          f"({loaded / elapsed if elapsed else 0:.0f} contacts/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Date, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, BigInteger, SmallInteger, String, Date, DateTime, ForeignKey, Boolean, Index, \
+    func
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
@@ -14,17 +15,73 @@ class User(Base):
     refresh_token = Column(String(255), nullable=True)
     confirmed = Column(Boolean, default=False)
     avatar = Column(String(255), nullable=True)
+    # last version handed out to this user's contacts, bumped by every contact write
+    contacts_version = Column(BigInteger, nullable=False, default=0, server_default='0')
 
     
 class Contact(Base):
     __tablename__ = "contacts"
-    id = Column(Integer, primary_key=True, index=True)
-    first_name = Column(String(25), nullable=False, index=True)
-    last_name = Column(String(25), nullable=False, index=True)
-    email = Column(String, unique=True, nullable=False, index=True)
-    phone = Column(String, unique=True, index=True)
-    birthday = Column(Date, default=None, index=True)
+    __table_args__ = (
+        # every contacts query filters by user_id first, so all lookups lead with it
+        Index("ix_contacts_user_id_id", "user_id", "id"),
+        Index("ix_contacts_user_id_last_name_first_name", "user_id", "last_name", "first_name"),
+        Index("ix_contacts_user_id_first_name_last_name", "user_id", "first_name", "last_name"),
+        Index("ix_contacts_user_id_email", "user_id", "email", unique=True),
+        Index("ix_contacts_user_id_phone", "user_id", "phone", unique=True),
+        Index("ix_contacts_user_id_birthday", "user_id", "birthday"),
+        Index("ix_contacts_user_id_birth_month_birth_day", "user_id", "birth_month", "birth_day"),
+        Index("ix_contacts_user_id_version", "user_id", "version"),
+        Index("ix_contacts_user_id_phone_normalized", "user_id", "phone_normalized"),
+        Index("ix_contacts_user_id_phone_reversed", "user_id", "phone_reversed"),
+    )
+    id = Column(Integer, primary_key=True)
+    first_name = Column(String(25), nullable=False)
+    last_name = Column(String(25), nullable=False)
+    email = Column(String, nullable=False)
+    phone = Column(String)
+    # canonical form of phone and its digits reversed, for exact and last-digits lookups
+    phone_normalized = Column(String(20))
+    phone_reversed = Column(String(20))
+    birthday = Column(Date, default=None)
+    # month and day of birthday, for month range filters and sorting in calendar order
+    birth_month = Column(SmallInteger)
+    birth_day = Column(SmallInteger)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    version = Column(BigInteger, nullable=False, default=0, server_default='0')
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     user = relationship('User', backref="contacts")
+    # the ORM identifies a contact by (id, user_id), so its UPDATE and DELETE statements
+    # filter on the partition key and stay prunable when contacts is hash partitioned
+    __mapper_args__ = {"primary_key": [id, user_id]}
+
+
+class ContactTombstone(Base):
+    __tablename__ = "contact_tombstones"
+    __table_args__ = (
+        Index("ix_contact_tombstones_user_id_version", "user_id", "version"),
+    )
+    id = Column(Integer, primary_key=True)
+    contact_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    version = Column(BigInteger, nullable=False)
+    deleted_at = Column(DateTime, default=func.now())
+
+
+class ContactCounter(Base):
+    __tablename__ = "contact_counters"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    name = Column(String(20), primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+
+class UpcomingBirthday(Base):
+    __tablename__ = "upcoming_birthdays"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    contact_id = Column(Integer, primary_key=True)
+    birthday_on = Column(Date, nullable=False)
 
 
+class JobRun(Base):
+    __tablename__ = "job_runs"
+    name = Column(String(50), primary_key=True)
+    ran_on = Column(Date, nullable=False)
@@ -0,0 +1,203 @@
+import zlib
+from typing import Callable, Iterable, List
+
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+
+class Encoder:
+    """
+    Incremental compressor with the same interface for every supported encoding.
+    """
+
+    def __init__(self, encoding: str, level: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=min(level, 11))
+            self._compress = self._compressor.process
+            self._flush = self._compressor.flush
+            self._finish = self._compressor.finish
+        elif encoding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+            self._compress = self._compressor.compress
+            self._flush = lambda: self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+            self._finish = self._compressor.flush
+        else:
+            # wbits=31 writes a gzip header and trailer
+            self._compressor = zlib.compressobj(min(level, 9), zlib.DEFLATED, 31)
+            self._compress = self._compressor.compress
+            self._flush = lambda: self._compressor.flush(zlib.Z_SYNC_FLUSH)
+            self._finish = self._compressor.flush
+
+    def chunk(self, data: bytes) -> bytes:
+        """
+        Compresses a chunk of a streamed body and flushes it, so the client can decode it right away.
+
+        :param data: Uncompressed chunk.
+        :type data: bytes
+        :return: Compressed bytes.
+        :rtype: bytes
+        """
+        return self._compress(data) + self._flush()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        """
+        Compresses the last chunk and closes the stream.
+
+        :param data: Uncompressed chunk.
+        :type data: bytes
+        :return: Compressed bytes.
+        :rtype: bytes
+        """
+        return self._compress(data) + self._finish()
+
+
+def available_encodings() -> List[str]:
+    """
+    Returns encodings that can be produced with the installed libraries.
+
+    :return: Content codings, gzip is always available.
+    :rtype: List[str]
+    """
+    encodings = ["gzip"]
+    if brotli is not None:
+        encodings.append("br")
+    if zstandard is not None:
+        encodings.append("zstd")
+    return encodings
+
+
+def negotiate(accept_encoding: str, preferred: Iterable[str]) -> str | None:
+    """
+    Picks the best encoding from the Accept-Encoding header.
+
+    Higher q-values win; among equal q-values the server preference order wins.
+
+    :param accept_encoding: Value of the Accept-Encoding request header.
+    :type accept_encoding: str
+    :param preferred: Supported encodings in order of preference.
+    :type preferred: Iterable[str]
+    :return: Chosen encoding or None if the client accepts none of them.
+    :rtype: str | None
+    """
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name] = q
+    best, best_q = None, 0.0
+    for encoding in preferred:
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses with brotli, zstd or gzip, whichever the client accepts and is installed.
+
+    Bodies smaller than ``minimum_size`` are sent as is. Bodies of at least ``offload_size``
+    bytes are compressed in a worker thread, so the event loop keeps serving other requests.
+    Streaming responses are compressed chunk by chunk instead of being buffered.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, level: int = 6, offload_size: int = 256 * 1024,
+                 encodings: Iterable[str] = ("br", "zstd", "gzip")):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+        self.offload_size = offload_size
+        self.encodings = [encoding for encoding in encodings if encoding in available_encodings()]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""), self.encodings)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressionResponder(send, lambda: Encoder(encoding, self.level), self.minimum_size,
+                                          self.offload_size)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+
+    def __init__(self, send: Send, make_encoder: Callable[[], Encoder], minimum_size: int, offload_size: int):
+        self._send = send
+        self._make_encoder = make_encoder
+        self.minimum_size = minimum_size
+        self.offload_size = offload_size
+        self.start_message: Message | None = None
+        self.encoder: Encoder | None = None
+        self.passthrough = False
+
+    async def _run(self, func: Callable[[bytes], bytes], data: bytes) -> bytes:
+        if len(data) >= self.offload_size:
+            return await anyio.to_thread.run_sync(func, data)
+        return func(data)
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            self.passthrough = "content-encoding" in headers
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            if self.start_message is not None:
+                await self._send(self.start_message)
+                self.start_message = None
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start_message is not None:
+            start, self.start_message = self.start_message, None
+            if not more_body and len(body) < self.minimum_size:
+                self.passthrough = True
+                await self._send(start)
+                await self._send(message)
+                return
+            self.encoder = self._make_encoder()
+            headers = MutableHeaders(raw=start["headers"])
+            headers["Content-Encoding"] = self.encoder.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                body = await self._run(self.encoder.finish, body)
+                headers["Content-Length"] = str(len(body))
+                await self._send(start)
+                await self._send({"type": "http.response.body", "body": body})
+                return
+            await self._send(start)
+
+        if more_body:
+            body = await self._run(self.encoder.chunk, body)
+        else:
+            body = await self._run(self.encoder.finish, body)
+        await self._send({"type": "http.response.body", "body": body, "more_body": more_body})
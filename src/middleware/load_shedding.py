@@ -0,0 +1,166 @@
+import asyncio
+import time
+from collections import deque
+from typing import Callable, Deque, Dict
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from src.services.metrics import registry
+
+limit_gauge = registry.gauge("load_shedding_limit", "Concurrency limit of the route group.", labels=["group"])
+in_flight_gauge = registry.gauge("load_shedding_in_flight", "Requests in flight in the route group.",
+                                 labels=["group"])
+rejected_total = registry.counter("load_shedding_rejected_total", "Requests rejected with 503.", labels=["group"])
+
+# reads that scan all of a user's contacts: counted apart, so that their latency does not cut the reads limit
+HEAVY_READS = {"/api/contacts/duplicates", "/api/contacts/filter/"}
+
+
+def route_group(method: str, path: str) -> str | None:
+    """
+    Tells which concurrency limit a request counts against.
+
+    :param method: HTTP method.
+    :type method: str
+    :param path: Request path.
+    :type path: str
+    :return: ``auth``, ``reads``, ``heavy``, ``writes`` or ``uploads``, or None for requests that are not limited.
+    :rtype: str | None
+    """
+    if method == "OPTIONS":
+        return None
+    if path.startswith("/api/auth/"):
+        return "auth"
+    if path == "/api/users/avatar":
+        return "uploads"
+    if path.startswith("/api/contacts/"):
+        if path == "/api/contacts/events":
+            # long-lived feed connections are capped by events_max_connections instead
+            return None
+        if path in HEAVY_READS and method in ("GET", "HEAD"):
+            return "heavy"
+        return "reads" if method in ("GET", "HEAD") else "writes"
+    return None
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit that adapts to latency with additive increase, multiplicative decrease.
+
+    A request that finishes slower than ``latency_target`` cuts the limit by ``backoff``, at
+    most once per generation of requests (those started before the previous cut do not cut
+    it again). A request that finishes in time while the limit is at least half used raises
+    it by ``1 / limit``, about one per limit's worth of requests. Requests over the limit
+    wait in a FIFO queue of ``queue_size`` for at most ``queue_timeout`` seconds.
+    """
+
+    def __init__(self, name: str, limit: int, latency_target: float, min_limit: int = 1, max_limit: int | None = None,
+                 queue_size: int = 16, queue_timeout: float = 0.2, backoff: float = 0.9):
+        self.name = name
+        self.limit = float(limit)
+        self.latency_target = latency_target
+        self.min_limit = min_limit
+        self.max_limit = max_limit or limit * 4
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.backoff = backoff
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+        limit_gauge.set(self.limit, group=name)
+
+    async def acquire(self) -> bool:
+        """
+        Takes a slot, waiting in the queue if the limit is reached.
+
+        :return: False if the queue is full or the wait timed out.
+        :rtype: bool
+        """
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self._take()
+            return True
+        if len(self._waiters) >= self.queue_size:
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait((waiter,), timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            if waiter.done():
+                # the slot was handed over, but the request is gone
+                self._free()
+            else:
+                self._abandon(waiter)
+            raise
+        if not waiter.done():
+            self._abandon(waiter)
+            return False
+        return True
+
+    def _abandon(self, waiter: asyncio.Future) -> None:
+        waiter.cancel()
+        self._waiters.remove(waiter)
+
+    def _take(self) -> None:
+        self.in_flight += 1
+        in_flight_gauge.set(self.in_flight, group=self.name)
+
+    def release(self, latency: float, started: float) -> None:
+        """
+        Frees a slot and adapts the limit to the request's latency.
+
+        :param latency: Seconds the request took.
+        :type latency: float
+        :param started: ``time.monotonic()`` when the request started.
+        :type started: float
+        """
+        if latency > self.latency_target:
+            if started > self._last_decrease:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self._last_decrease = time.monotonic()
+        elif self.in_flight >= self.limit / 2:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        limit_gauge.set(self.limit, group=self.name)
+        self._free()
+
+    def _free(self) -> None:
+        self.in_flight -= 1
+        while self._waiters and self.in_flight < int(self.limit):
+            self._take()
+            self._waiters.popleft().set_result(None)
+        in_flight_gauge.set(self.in_flight, group=self.name)
+
+
+class LoadSheddingMiddleware:
+    """
+    Caps the requests in flight per route group and sheds the rest with 503 and Retry-After,
+    so that a slow database makes requests fail fast instead of piling up in the worker.
+    """
+
+    def __init__(self, app: ASGIApp, limiters: Dict[str, AdaptiveLimiter], retry_after: int = 1,
+                 classify: Callable[[str, str], str | None] = route_group):
+        self.app = app
+        self.limiters = limiters
+        self.retry_after = retry_after
+        self.classify = classify
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        limiter = self.limiters.get(self.classify(scope["method"], scope["path"]))
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+        if not await limiter.acquire():
+            rejected_total.inc(group=limiter.name)
+            response = JSONResponse({"detail": "Service is overloaded, retry later"}, status_code=503,
+                                    headers={"Retry-After": str(self.retry_after)})
+            await response(scope, receive, send)
+            return
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(time.monotonic() - started, started)
@@ -0,0 +1,137 @@
+import hmac
+import json
+import random
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+
+class StackSampler:
+    """
+    Samples the call stack of one thread from a background thread at a fixed interval.
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.frames: List[Dict] = []
+        self.samples: List[List[int]] = []
+        self._frame_index: Dict[Tuple[str, str, int], int] = {}
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _index(self, code) -> int:
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        index = self._frame_index.get(key)
+        if index is None:
+            index = self._frame_index[key] = len(self.frames)
+            self.frames.append({"name": code.co_name, "file": code.co_filename, "line": code.co_firstlineno})
+        return index
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(self._index(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            self.samples.append(stack)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def speedscope(self, name: str, duration_ms: float) -> Dict:
+        """
+        Builds a speedscope document of the collected samples.
+
+        :param name: Profile name.
+        :type name: str
+        :param duration_ms: Duration of the profiled request.
+        :type duration_ms: float
+        :return: Document in the speedscope file format.
+        :rtype: Dict
+        """
+        weight = self.interval * 1000
+        return {"$schema": SPEEDSCOPE_SCHEMA, "name": name, "exporter": "contacts-api",
+                "shared": {"frames": self.frames},
+                "profiles": [{"type": "sampled", "name": name, "unit": "milliseconds", "startValue": 0,
+                              "endValue": duration_ms, "samples": self.samples,
+                              "weights": [weight] * len(self.samples)}]}
+
+
+class ProfilingMiddleware:
+    """
+    Profiles single requests on demand and saves speedscope profiles to ``directory``.
+
+    A request is profiled when it sends ``X-Profile: <token>`` with the configured token, or
+    at random with probability ``sample_rate``. The event loop thread is sampled while the
+    request is being handled, so a profile can also contain other requests served
+    concurrently, while handlers declared with ``def`` run in a worker thread and only show up
+    as waiting. One request is profiled at a time. The file name starts with the profile ID,
+    returned in the ``X-Profile-Id`` header, followed by the method, route and latency.
+
+    Requests that do not trigger the profiler only pay a header lookup; when profiling is
+    disabled the middleware is not installed at all.
+    """
+
+    def __init__(self, app: ASGIApp, directory: str = "profiles", token: str = "", sample_rate: float = 0.0,
+                 interval: float = 0.001):
+        self.app = app
+        self.directory = Path(directory)
+        self.token = token.encode()
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self._busy = False
+
+    def _triggered(self, scope: Scope) -> bool:
+        if self.token:
+            header = Headers(scope=scope).get("x-profile")
+            if header is not None and hmac.compare_digest(header.encode(), self.token):
+                return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self._busy or not self._triggered(scope):
+            await self.app(scope, receive, send)
+            return
+        self._busy = True
+        sampler = StackSampler(threading.get_ident(), self.interval)
+        started = time.perf_counter()
+        stamp = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Profile-Id"] = stamp
+            await send(message)
+
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            sampler.stop()
+            self._busy = False
+            latency = (time.perf_counter() - started) * 1000
+            route = scope.get("route")
+            path = route.path if route is not None else scope["path"]
+            slug = re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_") or "root"
+            document = sampler.speedscope(f"{scope['method']} {path}", latency)
+            await anyio.to_thread.run_sync(self._save, f"{stamp}-{scope['method']}-{slug}-{latency:.0f}ms", document)
+
+    def _save(self, name: str, document: Dict) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / f"{name}.speedscope.json").write_text(json.dumps(document))
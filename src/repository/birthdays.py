@@ -0,0 +1,146 @@
+from calendar import isleap
+from datetime import date, timedelta
+from typing import List
+
+from sqlalchemy import Row, and_, case, delete, extract, insert, or_, select
+from sqlalchemy.orm import Session
+
+from src.database.models import Contact, JobRun, UpcomingBirthday, User
+from src.repository.contact_rows import FIELDS
+
+SNAPSHOT_JOB = 'birthday_snapshot'
+
+
+def birthday_window(today: date) -> List[date]:
+    """
+    Returns the dates counted as upcoming birthdays: the eight days after today,
+    the same window as :func:`src.repository.contacts.birthdays`.
+
+    :param today: The day the window starts after.
+    :type today: date
+    :return: Dates in the window.
+    :rtype: List[date]
+    """
+    return [today + timedelta(days=days) for days in range(1, 9)]
+
+
+def falls_on(birthday: date, day: date) -> bool:
+    """
+    Tells whether a birthday is celebrated on the given day; 29 February is celebrated on
+    1 March outside of leap years, as :func:`src.repository.contact_rows.is_upcoming` counts it.
+
+    :param birthday: Date of birth.
+    :type birthday: date
+    :param day: The day to check.
+    :type day: date
+    :return: True if the birthday falls on the day.
+    :rtype: bool
+    """
+    if (birthday.month, birthday.day) == (day.month, day.day):
+        return True
+    return (birthday.month, birthday.day) == (2, 29) and (day.month, day.day) == (3, 1) and not isleap(day.year)
+
+
+def _falls_on(month, day, upcoming: date):
+    # the SQL form of falls_on, for the month and day columns
+    match = and_(month == upcoming.month, day == upcoming.day)
+    if (upcoming.month, upcoming.day) == (3, 1) and not isleap(upcoming.year):
+        match = or_(match, and_(month == 2, day == 29))
+    return match
+
+
+def rebuild_snapshot(db: Session, today: date | None = None) -> int:
+    """
+    Recomputes the upcoming birthdays of all users in one set-based statement.
+
+    The old snapshot is replaced in the same transaction, so readers see either the old
+    or the new one.
+
+    :param db: The database session.
+    :type db: Session
+    :param today: The day to compute the snapshot for, today by default.
+    :type today: date | None
+    :return: Number of stored upcoming birthdays.
+    :rtype: int
+    """
+    today = today or date.today()
+    month, day = extract('month', Contact.birthday), extract('day', Contact.birthday)
+    window = birthday_window(today)
+    matches = [_falls_on(month, day, upcoming) for upcoming in window]
+    birthday_on = case(*[(match, upcoming) for match, upcoming in zip(matches, window)])
+    rows = select(Contact.user_id, Contact.id, birthday_on)\
+        .where(Contact.user_id.isnot(None), Contact.birthday.isnot(None), or_(*matches))
+
+    db.execute(delete(UpcomingBirthday))
+    result = db.execute(insert(UpcomingBirthday).from_select(['user_id', 'contact_id', 'birthday_on'], rows))
+    run = db.get(JobRun, SNAPSHOT_JOB)
+    if run is None:
+        db.add(JobRun(name=SNAPSHOT_JOB, ran_on=today))
+    else:
+        run.ran_on = today
+    db.commit()
+    return result.rowcount
+
+
+def snapshot_day(db: Session) -> date | None:
+    """
+    Returns the day the stored snapshot was computed for.
+
+    :param db: The database session.
+    :type db: Session
+    :return: The day, or None if the snapshot was never built.
+    :rtype: date | None
+    """
+    run = db.get(JobRun, SNAPSHOT_JOB)
+    return run.ran_on if run is not None else None
+
+
+def patch_contact(contact: Contact, db: Session, removed: bool = False) -> None:
+    """
+    Brings the snapshot row of one contact up to date after a write, in the caller's transaction.
+
+    :param contact: The created, updated or removed contact.
+    :type contact: Contact
+    :param db: The database session.
+    :type db: Session
+    :param removed: Whether the contact was removed.
+    :type removed: bool
+    :return: None
+    """
+    day = snapshot_day(db)
+    if day is None:
+        return
+    db.execute(delete(UpcomingBirthday).where(UpcomingBirthday.user_id == contact.user_id,
+                                              UpcomingBirthday.contact_id == contact.id))
+    if removed or not contact.birthday:
+        return
+    for upcoming in birthday_window(day):
+        if falls_on(contact.birthday, upcoming):
+            db.add(UpcomingBirthday(user_id=contact.user_id, contact_id=contact.id, birthday_on=upcoming))
+            return
+
+
+async def get_upcoming(user: User, db: Session, fields: List[str] | None = None,
+                       today: date | None = None) -> List[Row] | None:
+    """
+    Returns contacts with upcoming birthdays from today's snapshot, as rows of the ORM-free read path.
+
+    :param user: The user to retrieve contacts for.
+    :type user: User
+    :param db: The database session.
+    :type db: Session
+    :param fields: Columns to return, all of FIELDS by default.
+    :type fields: List[str] | None
+    :param today: The current day, today by default.
+    :type today: date | None
+    :return: Rows with the selected columns, or None if there is no snapshot for today.
+    :rtype: List[Row] | None
+    """
+    if snapshot_day(db) != (today or date.today()):
+        return None
+    statement = select(*[getattr(Contact, field) for field in fields or FIELDS])\
+        .join(UpcomingBirthday, and_(UpcomingBirthday.user_id == Contact.user_id,
+                                     UpcomingBirthday.contact_id == Contact.id))\
+        .where(UpcomingBirthday.user_id == user.id)\
+        .order_by(UpcomingBirthday.birthday_on)
+    return db.execute(statement).all()
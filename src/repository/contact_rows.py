@@ -0,0 +1,236 @@
+"""
+ORM-free read path for contacts.
+
+The functions mirror the read functions of src.repository.contacts but run Core SELECTs
+and return the result rows as they are: no Contact instances, no identity map, no change
+tracking. Rows go straight to ``contacts_json``, which skips the Pydantic models as well.
+Large pages allocate far fewer objects this way, see benchmarks/read_path.py.
+
+With the contact cache enabled, the list, search and birthday reads are answered from the
+user's snapshot in src.services.contact_cache, read in one statement on the first miss.
+"""
+import json
+from datetime import date, datetime
+from typing import Iterable, List, Sequence
+
+from fastapi import HTTPException
+from sqlalchemy import Row, select
+from sqlalchemy.orm import Session
+
+from src.database.models import Contact, User
+from src.services.contact_cache import ContactSnapshot, contact_cache
+from src.services.contact_filters import QueryPlan
+
+FIELDS = ["id", "first_name", "last_name", "email", "phone", "birthday"]
+SEARCH_FIELDS = ['first_name', 'last_name', 'email']
+
+
+def _select(fields: List[str] | None):
+    return select(*[getattr(Contact, field) for field in fields or FIELDS])
+
+
+def load_snapshot(user: User, db: Session, max_contacts: int) -> ContactSnapshot | None:
+    """
+    Reads all contacts of the user together with the user's contacts version.
+
+    :param user: The user to read contacts for.
+    :type user: User
+    :param db: The database session.
+    :type db: Session
+    :param max_contacts: Give up above this many contacts.
+    :type max_contacts: int
+    :return: The snapshot, or None if the user has more than max_contacts contacts.
+    :rtype: ContactSnapshot | None
+    """
+    # one statement, so the version and the contacts come from the same database snapshot
+    statement = select(User.contacts_version, *[getattr(Contact, field) for field in FIELDS])\
+        .select_from(User).outerjoin(Contact, Contact.user_id == User.id).where(User.id == user.id)\
+        .limit(max_contacts + 1)
+    rows = db.execute(statement).all()
+    if len(rows) > max_contacts:
+        return None
+    version = rows[0][0] if rows else 0
+    return ContactSnapshot(user.id, version, [row[1:] for row in rows if row[1] is not None])
+
+
+async def _snapshot(user: User, db: Session) -> ContactSnapshot | None:
+    if not contact_cache.enabled or contact_cache.is_oversized(user.id):
+        return None
+    snapshot = contact_cache.get(user.id)
+    if snapshot is None:
+        snapshot = load_snapshot(user, db, contact_cache.max_contacts)
+        if snapshot is None:
+            contact_cache.mark_oversized(user.id)
+            return None
+        contact_cache.put(snapshot)
+    return snapshot
+
+
+async def get_contacts(skip: int, limit: int, user: User, db: Session,
+                       fields: List[str] | None = None) -> Sequence[Row]:
+    """
+    Returns a page of the user's contacts as rows.
+
+    :param skip: The number of contacts to skip.
+    :type skip: int
+    :param limit: The maximum number of contacts to return.
+    :type limit: int
+    :param user: The user to retrieve contacts for.
+    :type user: User
+    :param db: The database session.
+    :type db: Session
+    :param fields: Columns to select, all of FIELDS by default.
+    :type fields: List[str] | None
+    :return: Rows with the selected columns.
+    :rtype: Sequence[Row]
+    """
+    snapshot = await _snapshot(user, db)
+    if snapshot is not None:
+        return snapshot.rows(snapshot.page(skip, limit), fields)
+    statement = _select(fields).where(Contact.user_id == user.id).offset(skip).limit(limit)
+    return db.execute(statement).all()
+
+
+async def get_contact(contact_id: int, user: User, db: Session, fields: List[str] | None = None) -> Row | None:
+    """
+    Returns one contact of the user as a row.
+
+    :param contact_id: The ID of the contact to retrieve.
+    :type contact_id: int
+    :param user: The user to retrieve the contact for.
+    :type user: User
+    :param db: The database session.
+    :type db: Session
+    :param fields: Columns to select, all of FIELDS by default.
+    :type fields: List[str] | None
+    :return: The row, or None if the contact does not exist.
+    :rtype: Row | None
+    """
+    statement = _select(fields).where(Contact.id == contact_id, Contact.user_id == user.id)
+    return db.execute(statement).first()
+
+
+async def query_search(query_field: str, query_value: str, user: User, db: Session,
+                       fields: List[str] | None = None) -> Sequence[Row]:
+    """
+    Returns the user's contacts with the given first name, last name or email as rows.
+
+    :param query_field: Field to search contact by.
+    :type query_field: str
+    :param query_value: Search field value.
+    :type query_value: str
+    :param user: The user to retrieve contacts for.
+    :type user: User
+    :param db: The database session.
+    :type db: Session
+    :param fields: Columns to select, all of FIELDS by default.
+    :type fields: List[str] | None
+    :return: Rows with the selected columns.
+    :rtype: Sequence[Row]
+    """
+    if query_field not in SEARCH_FIELDS:
+        raise HTTPException(status_code=404, detail=f"Invalid query field. Valid fields: {SEARCH_FIELDS}")
+    snapshot = await _snapshot(user, db)
+    if snapshot is not None:
+        return snapshot.rows(snapshot.search(query_field, query_value), fields)
+    statement = _select(fields).where(getattr(Contact, query_field) == query_value, Contact.user_id == user.id)
+    return db.execute(statement).all()
+
+
+async def filter_contacts(plan: QueryPlan, skip: int, limit: int, user: User, db: Session,
+                          fields: List[str] | None = None) -> Sequence[Row]:
+    """
+    Returns a page of the user's contacts matching the filters of a plan, in its order.
+
+    :param plan: Plan of src.services.contact_filters.plan_query.
+    :type plan: QueryPlan
+    :param skip: The number of contacts to skip.
+    :type skip: int
+    :param limit: The maximum number of contacts to return.
+    :type limit: int
+    :param user: The user to retrieve contacts for.
+    :type user: User
+    :param db: The database session.
+    :type db: Session
+    :param fields: Columns to select, all of FIELDS by default.
+    :type fields: List[str] | None
+    :return: Rows with the selected columns.
+    :rtype: Sequence[Row]
+    """
+    statement = _select(fields).where(Contact.user_id == user.id, *plan.where).order_by(*plan.order_by)\
+        .offset(skip).limit(limit)
+    return db.execute(statement).all()
+
+
+def _birthday_in(year: int, birthday: date) -> datetime:
+    try:
+        return datetime(year=year, month=birthday.month, day=birthday.day)
+    except ValueError:
+        # 29 February outside of a leap year
+        return datetime(year=year, month=3, day=1)
+
+
+def is_upcoming(birthday: date, now: datetime) -> bool:
+    """
+    Tells whether a birthday is in the next week, the same way repository.contacts.birthdays does.
+
+    :param birthday: Date of birth.
+    :type birthday: date
+    :param now: Current time.
+    :type now: datetime
+    :return: True if the next birthday is less than 8 days away.
+    :rtype: bool
+    """
+    b_day = _birthday_in(now.year, birthday)
+    if b_day < now:
+        b_day = _birthday_in(now.year + 1, birthday)
+    return abs(b_day - now).days < 8
+
+
+async def birthdays(user: User, db: Session, fields: List[str] | None = None) -> List[Row]:
+    """
+    Returns the user's contacts with a birthday in the next week as rows.
+
+    :param user: The user to retrieve contacts for.
+    :type user: User
+    :param db: The database session.
+    :type db: Session
+    :param fields: Columns to return, all of FIELDS by default.
+    :type fields: List[str] | None
+    :return: Rows with the selected columns.
+    :rtype: List[Row]
+    """
+    now = datetime.now()
+    snapshot = await _snapshot(user, db)
+    if snapshot is not None:
+        return snapshot.rows(snapshot.with_birthday(lambda birthday: is_upcoming(birthday, now)), fields)
+    fields = fields or FIELDS
+    # birthday is selected last when it was not requested, and left out of the output by contacts_json
+    columns = fields if 'birthday' in fields else fields + ['birthday']
+    birthday = columns.index('birthday')
+    rows = db.execute(_select(columns).where(Contact.user_id == user.id, Contact.birthday.is_not(None)))
+    return [row for row in rows if is_upcoming(row[birthday], now)]
+
+
+def _json_default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def contacts_json(rows: Iterable[Row] | Row, fields: List[str] | None = None) -> bytes:
+    """
+    Serializes contact rows to the JSON of ContactResponse, without Pydantic models.
+
+    :param rows: Rows or a single row, their columns in the order of ``fields``.
+    :param fields: Names of the columns, all of FIELDS by default; extra trailing columns are dropped.
+    :type fields: List[str] | None
+    :return: JSON document, a list for rows and an object for a single row.
+    :rtype: bytes
+    """
+    fields = fields or FIELDS
+    if isinstance(rows, Row):
+        content = dict(zip(fields, rows))
+    else:
+        content = [dict(zip(fields, row)) for row in rows]
+    return json.dumps(content, default=_json_default, separators=(",", ":")).encode()
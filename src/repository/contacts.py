@@ -1,14 +1,105 @@
 from datetime import datetime
+import re
 from typing import List
 from fastapi import HTTPException
 
-from sqlalchemy.orm import Session
+from sqlalchemy import update
+from sqlalchemy.orm import Session, load_only
 
-from src.database.models import Contact, User
+from src.database.models import Contact, ContactTombstone, User
 from src.schemas import ContactModel
+from src.repository.stats import apply_counters, contact_counts
+from src.repository.birthdays import patch_contact
+from src.services.contact_cache import contact_cache
+from src.services.duplicates import ContactRecord
+from src.services.events import contact_event, event_bus
+from src.services.phones import normalize_phone, reversed_digits
 
 
-async def get_contacts(skip: int, limit: int, user: User, db: Session) -> List[Contact]:
+def _with_fields(query, fields: List[str] | None):
+    """
+    Restricts the columns loaded by a contacts query.
+
+    :param query: Query over Contact.
+    :param fields: Names of the columns to load, or None to load all of them.
+    :type fields: List[str] | None
+    :return: The query, loading only the requested columns.
+    """
+    if fields:
+        query = query.options(load_only(*[getattr(Contact, field) for field in fields]))
+    return query
+
+
+def _set_phone(contact: Contact, phone: str | None) -> None:
+    """
+    Sets the phone of a contact together with its normalized lookup columns.
+
+    :param contact: The contact to update.
+    :type contact: Contact
+    :param phone: Phone as entered by the user.
+    :type phone: str | None
+    :return: None
+    """
+    contact.phone = phone
+    contact.phone_normalized = normalize_phone(phone)
+    contact.phone_reversed = reversed_digits(contact.phone_normalized)
+
+
+def _set_birthday(contact: Contact, birthday) -> None:
+    """
+    Sets the birthday of a contact together with its month and day columns.
+
+    :param contact: The contact to update.
+    :type contact: Contact
+    :param birthday: Date of birth.
+    :type birthday: date | None
+    :return: None
+    """
+    contact.birthday = birthday
+    contact.birth_month = birthday.month if birthday else None
+    contact.birth_day = birthday.day if birthday else None
+
+
+def _next_version(user: User, db: Session) -> int:
+    """
+    Atomically bumps and returns the user's contacts version.
+
+    The row lock taken by the UPDATE orders concurrent writes of the same user,
+    so every change gets a distinct, increasing version.
+
+    :param user: The user whose contacts are written.
+    :type user: User
+    :param db: The database session.
+    :type db: Session
+    :return: The new version.
+    :rtype: int
+    """
+    statement = update(User).where(User.id == user.id)\
+        .values(contacts_version=User.contacts_version + 1)\
+        .returning(User.contacts_version)
+    return db.execute(statement, execution_options={"synchronize_session": False}).scalar_one()
+
+
+def _publish(user: User, event: dict) -> None:
+    """
+    Publishes the event of a committed write.
+
+    This worker's contact snapshot is patched right away, so the user's next read sees the
+    write; the other workers patch theirs when the event reaches them.
+
+    :param user: Owner of the changed contact.
+    :type user: User
+    :param event: Event built by contact_event.
+    :type event: dict
+    :return: None
+    """
+    if contact_cache.enabled:
+        contact_cache.apply(user.id, event)
+    event_bus.publish(user.id, event)
+
+
+async def get_contacts(skip: int, limit: int, user: User, db: Session,
+                       fields: List[str] | None = None) -> List[Contact]:
     """
     The get_contacts function returns a list of contacts for the user.
 
@@ -20,13 +111,16 @@ async def get_contacts(skip: int, limit: int, user: User, db: Session) -> List[C
     :type user: User
     :param db: The database session.
     :type db: Session
+    :param fields: Names of the columns to load, or None to load all of them.
+    :type fields: List[str] | None
     :return: A list of contacts.
     :rtype: List[Contact]
     """
-    return db.query(Contact).filter(Contact.user_id == user.id).offset(skip).limit(limit).all()
+    query = _with_fields(db.query(Contact), fields)
+    return query.filter(Contact.user_id == user.id).offset(skip).limit(limit).all()
 
 
-async def get_contact(contact_id: int, user: User, db: Session) -> Contact:
+async def get_contact(contact_id: int, user: User, db: Session, fields: List[str] | None = None) -> Contact:
     """
     Retrieves a single contact with the specified ID for a specific user.
 
@@ -36,10 +130,38 @@ async def get_contact(contact_id: int, user: User, db: Session) -> Contact:
     :type user: User
     :param db: The database session.
     :type db: Session
+    :param fields: Names of the columns to load, or None to load all of them.
+    :type fields: List[str] | None
     :return: The contact with the specified ID, or None if it does not exist.
     :rtype: Contact | None
     """
-    return db.query(Contact).filter(Contact.id == contact_id, Contact.user_id == user.id).first()
+    query = _with_fields(db.query(Contact), fields)
+    return query.filter(Contact.id == contact_id, Contact.user_id == user.id).first()
+
+
+async def get_contacts_by_ids(contact_ids: List[int], user: User, db: Session,
+                              fields: List[str] | None = None) -> List[Contact]:
+    """
+    Retrieves the user's contacts with the given IDs in one query.
+
+    :param contact_ids: IDs of the contacts to retrieve.
+    :type contact_ids: List[int]
+    :param user: The user to retrieve the contacts for.
+    :type user: User
+    :param db: The database session.
+    :type db: Session
+    :param fields: Names of the columns to load, or None to load all of them.
+    :type fields: List[str] | None
+    :return: The found contacts in the order of contact_ids; missing IDs are skipped.
+    :rtype: List[Contact]
+    """
+    contact_ids = list(dict.fromkeys(contact_ids))
+    if not contact_ids:
+        return []
+    query = _with_fields(db.query(Contact), fields)
+    found = {contact.id: contact for contact in
+             query.filter(Contact.user_id == user.id, Contact.id.in_(contact_ids)).all()}
+    return [found[contact_id] for contact_id in contact_ids if contact_id in found]
 
 
 async def create_contact(body: ContactModel, user: User, db: Session) -> Contact:
@@ -55,10 +177,17 @@ async def create_contact(body: ContactModel, user: User, db: Session) -> Contact
     :return: The new created contact.
     :rtype: Contact
     """
-    contact = Contact(first_name = body.first_name, last_name = body.last_name, email = body.email, phone = body.phone, birthday = body.birthday, user_id=user.id)
+    contact = Contact(first_name = body.first_name, last_name = body.last_name, email = body.email, user_id=user.id)
+    _set_phone(contact, body.phone)
+    _set_birthday(contact, body.birthday)
+    contact.version = _next_version(user, db)
     db.add(contact)
-    db.commit()
+    apply_counters(user, {}, contact_counts(contact), db)
+    db.flush()
+    patch_contact(contact, db)
     db.refresh(contact)
+    db.commit()
+    _publish(user, contact_event("created", contact, contact.version))
     return contact
 
 
@@ -79,12 +208,17 @@ async def update_contact(contact_id: int, body: ContactModel, user: User, db: Se
     """
     contact = db.query(Contact).filter(Contact.id == contact_id, Contact.user_id == user.id).first()
     if contact:
+        before = contact_counts(contact)
         contact.first_name = body.first_name
         contact.last_name = body.last_name
         contact.email = body.email
-        contact.phone = body.phone
-        contact.birthday = body.birthday
+        _set_phone(contact, body.phone)
+        _set_birthday(contact, body.birthday)
+        contact.version = _next_version(user, db)
+        apply_counters(user, before, contact_counts(contact), db)
+        patch_contact(contact, db)
         db.commit()
+        _publish(user, contact_event("updated", contact, contact.version))
     return contact
 
 
@@ -103,12 +237,18 @@ async def remove_contact(contact_id: int, user: User, db: Session)  -> Contact |
     """
     contact = db.query(Contact).filter(Contact.id == contact_id, Contact.user_id == user.id).first()
     if contact:
+        version = _next_version(user, db)
+        db.add(ContactTombstone(contact_id=contact.id, user_id=user.id, version=version))
+        apply_counters(user, contact_counts(contact), {}, db)
+        patch_contact(contact, db, removed=True)
         db.delete(contact)
         db.commit()
+        _publish(user, contact_event("deleted", contact, version))
     return contact
 
 
-async def query_search(query_field: str, query_value: str, user: User, db: Session):
+async def query_search(query_field: str, query_value: str, user: User, db: Session,
+                       fields: List[str] | None = None):
     """
     Returns a list of contacts by the value of one of the fields 
     ['first_name', 'last_name', 'email'] for the user.
@@ -121,6 +261,8 @@ async def query_search(query_field: str, query_value: str, user: User, db: Sessi
     :type user: User
     :param db: The database session.
     :type db: Session
+    :param fields: Names of the columns to load, or None to load all of them.
+    :type fields: List[str] | None
     :return: A list of contacts.
     :rtype: List[Contact]
     """
@@ -128,11 +270,12 @@ async def query_search(query_field: str, query_value: str, user: User, db: Sessi
     if query_field not in valid_fields:
         raise HTTPException(status_code=404, detail=f"Invalid query field. Valid fields: {valid_fields}")
     
-    contacts = db.query(Contact).filter(getattr(Contact, query_field) == query_value, Contact.user_id == user.id).all()
+    query = _with_fields(db.query(Contact), fields)
+    contacts = query.filter(getattr(Contact, query_field) == query_value, Contact.user_id == user.id).all()
     return contacts
 
 
-async def birthdays(user: User, db: Session) -> List[Contact]:
+async def birthdays(user: User, db: Session, fields: List[str] | None = None) -> List[Contact]:
     """
     The function returns a list of contacts whose birthday is in the next week for a specific user.
 
@@ -140,10 +283,15 @@ async def birthdays(user: User, db: Session) -> List[Contact]:
     :type user: User
     :param db: The database session.
     :type db: Session
+    :param fields: Names of the columns to load, or None to load all of them.
+        The birthday column is always loaded because the filter needs it.
+    :type fields: List[str] | None
     :return: A list of contacts.
     :rtype: List[Contact]
     """
-    contacts = db.query(Contact).filter(Contact.user_id == user.id).all()
+    if fields and 'birthday' not in fields:
+        fields = fields + ['birthday']
+    contacts = _with_fields(db.query(Contact), fields).filter(Contact.user_id == user.id).all()
     result = []
     today = datetime.now()
       
@@ -160,3 +308,87 @@ async def birthdays(user: User, db: Session) -> List[Contact]:
     return result
 
 
+async def get_changes(since: int, limit: int, user: User, db: Session) -> dict:
+    """
+    Returns contacts created, updated or deleted after the given version for a specific user.
+
+    Both lookups are range scans of a (user_id, version) index, so the cost depends on
+    the number of changes, not on the size of the address book.
+
+    :param since: Version from the previous sync token, 0 for a full sync.
+    :type since: int
+    :param limit: The maximum number of changes to return.
+    :type limit: int
+    :param user: The user to retrieve changes for.
+    :type user: User
+    :param db: The database session.
+    :type db: Session
+    :return: Changed contacts, deleted contact IDs, the next version and whether more changes are pending.
+    :rtype: dict
+    """
+    changed = db.query(Contact).filter(Contact.user_id == user.id, Contact.version > since)\
+        .order_by(Contact.version).limit(limit + 1).all()
+    deleted = db.query(ContactTombstone).filter(ContactTombstone.user_id == user.id, ContactTombstone.version > since)\
+        .order_by(ContactTombstone.version).limit(limit + 1).all()
+
+    changes = sorted(changed + deleted, key=lambda change: change.version)
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    version = changes[-1].version if changes else since
+
+    changed = [change for change in changes if isinstance(change, Contact)]
+    changed_ids = {contact.id for contact in changed}
+    deleted = [change.contact_id for change in changes
+               if isinstance(change, ContactTombstone) and change.contact_id not in changed_ids]
+    return {"changed": changed, "deleted": deleted, "version": version, "has_more": has_more}
+
+
+async def get_duplicate_candidates(user: User, db: Session) -> List[ContactRecord]:
+    """
+    Returns the fields used for duplicate detection of all contacts of a user.
+
+    :param user: The user to retrieve contacts for.
+    :type user: User
+    :param db: The database session.
+    :type db: Session
+    :return: A list of lightweight contact records.
+    :rtype: List[ContactRecord]
+    """
+    rows = db.query(Contact.id, Contact.first_name, Contact.last_name, Contact.email, Contact.phone,
+                    Contact.birthday).filter(Contact.user_id == user.id).all()
+    return [ContactRecord(*row) for row in rows]
+
+
+async def lookup_by_phone(phone: str, user: User, db: Session, suffix: bool = False,
+                          limit: int = 20) -> List[Contact]:
+    """
+    Finds contacts of a user by phone, in any format.
+
+    An exact lookup compares the canonical form of the phone. A suffix lookup matches
+    contacts whose phone ends with the given digits; it is a range scan over the reversed
+    digits, so both are served by an index.
+
+    :param phone: Phone, or its last digits for a suffix lookup.
+    :type phone: str
+    :param user: The user to retrieve contacts for.
+    :type user: User
+    :param db: The database session.
+    :type db: Session
+    :param suffix: Whether to match the last digits only.
+    :type suffix: bool
+    :param limit: The maximum number of contacts to return.
+    :type limit: int
+    :return: A list of contacts.
+    :rtype: List[Contact]
+    """
+    query = db.query(Contact).filter(Contact.user_id == user.id)
+    if suffix:
+        prefix = re.sub(r'\D', '', phone)[::-1]
+        # ':' sorts right after '9', so the range holds exactly the values starting with prefix
+        query = query.filter(Contact.phone_reversed >= prefix, Contact.phone_reversed < prefix + ':')
+    else:
+        normalized = normalize_phone(phone)
+        if normalized is None:
+            return []
+        query = query.filter(Contact.phone_normalized == normalized)
+    return query.limit(limit).all()
@@ -0,0 +1,109 @@
+from typing import Dict
+
+from sqlalchemy import case, extract, func, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from src.database.models import Contact, ContactCounter, User
+
+COUNTERS = ['total', 'with_phone', 'with_birthday'] + [f'birth_month_{month}' for month in range(1, 13)]
+
+
+def contact_counts(contact: Contact | None) -> Dict[str, int]:
+    """
+    Returns the counters a single contact contributes to.
+
+    :param contact: The contact, or None for no contact.
+    :type contact: Contact | None
+    :return: Counter names mapped to 1.
+    :rtype: Dict[str, int]
+    """
+    if contact is None:
+        return {}
+    counts = {'total': 1}
+    if contact.phone:
+        counts['with_phone'] = 1
+    if contact.birthday:
+        counts['with_birthday'] = 1
+        counts[f'birth_month_{contact.birthday.month}'] = 1
+    return counts
+
+
+def apply_counters(user: User, before: Dict[str, int], after: Dict[str, int], db: Session) -> None:
+    """
+    Moves the user's counters from the ``before`` to the ``after`` state of a contact.
+
+    Runs a single UPDATE in the caller's transaction. Counters of a user that has never
+    requested statistics do not exist yet and are left alone; they are computed on first read.
+
+    :param user: The owner of the contact.
+    :type user: User
+    :param before: Counts of the contact before the write, empty for a new contact.
+    :type before: Dict[str, int]
+    :param after: Counts of the contact after the write, empty for a removed contact.
+    :type after: Dict[str, int]
+    :param db: The database session.
+    :type db: Session
+    :return: None
+    """
+    deltas = {name: after.get(name, 0) - before.get(name, 0) for name in set(before) | set(after)}
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    statement = update(ContactCounter)\
+        .where(ContactCounter.user_id == user.id, ContactCounter.name.in_(deltas))\
+        .values(value=ContactCounter.value + case(deltas, value=ContactCounter.name, else_=0))
+    db.execute(statement, execution_options={"synchronize_session": False})
+
+
+def _initialize(user: User, db: Session) -> Dict[str, int]:
+    # the user row lock orders this against concurrent contact writes, which bump users.contacts_version
+    db.query(User.id).filter(User.id == user.id).with_for_update().one()
+    counters = dict.fromkeys(COUNTERS, 0)
+    total, with_phone, with_birthday = db.query(
+        func.count(Contact.id),
+        func.count(case((Contact.phone != '', 1))),
+        func.count(Contact.birthday),
+    ).filter(Contact.user_id == user.id).one()
+    counters.update(total=total, with_phone=with_phone, with_birthday=with_birthday)
+    month = extract('month', Contact.birthday)
+    for birth_month, count in db.query(month, func.count(Contact.id))\
+            .filter(Contact.user_id == user.id, Contact.birthday.isnot(None)).group_by(month):
+        counters[f'birth_month_{int(birth_month)}'] = count
+    db.add_all([ContactCounter(user_id=user.id, name=name, value=value) for name, value in counters.items()])
+    try:
+        db.commit()
+    except IntegrityError:
+        # initialized concurrently by another request
+        db.rollback()
+        return _read(user, db)
+    return counters
+
+
+def _read(user: User, db: Session) -> Dict[str, int]:
+    rows = db.query(ContactCounter.name, ContactCounter.value).filter(ContactCounter.user_id == user.id).all()
+    return {name: value for name, value in rows}
+
+
+async def get_stats(user: User, db: Session, initialize: bool = True) -> Dict[str, int] | None:
+    """
+    Returns the contact counters of a user.
+
+    Counters are computed with one aggregate query the first time they are requested and
+    are kept up to date by the contact write functions afterwards.
+
+    :param user: The user to retrieve statistics for.
+    :type user: User
+    :param db: The database session. Must be a primary session when ``initialize`` is True.
+    :type db: Session
+    :param initialize: Whether to compute missing counters.
+    :type initialize: bool
+    :return: Counter names mapped to values, or None if they are missing and ``initialize`` is False.
+    :rtype: Dict[str, int] | None
+    """
+    counters = _read(user, db)
+    if counters:
+        return counters
+    if not initialize:
+        return None
+    return _initialize(user, db)
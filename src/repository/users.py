@@ -1,6 +1,7 @@
 from sqlalchemy.orm import Session
 
-from src.database.models import User
+from src.database.models import ContactCounter, User
+from src.repository.stats import COUNTERS
 from src.schemas import UserModel
 from libgravatar import Gravatar
 
@@ -38,8 +39,10 @@ async def create_user(body: UserModel, db: Session) -> User:
         print(e)
     new_user = User(**body.dict(), avatar=avatar)
     db.add(new_user)
-    db.commit()
+    db.flush()
+    db.add_all([ContactCounter(user_id=new_user.id, name=name, value=0) for name in COUNTERS])
     db.refresh(new_user)
+    db.commit()
     return new_user
 
 
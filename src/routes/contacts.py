@@ -1,29 +1,224 @@
+import json
 from typing import List
 
-from fastapi import APIRouter, HTTPException, Depends, status
+import anyio
+from fastapi import APIRouter, HTTPException, Depends, status, Query, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
 
-from src.database.db import get_db
-from src.schemas import ContactModel, ContactResponse
+from src.conf.config import settings
+from src.database.db import get_db, get_read_db, release
+from src.schemas import ContactModel, ContactResponse, ContactBatch, ContactChanges, ContactFilter, ContactStats, \
+    DuplicateCluster
 from src.repository import contacts as repository_contacts
+from src.repository import contact_rows as repository_contact_rows
+from src.repository import stats as repository_stats
+from src.repository import birthdays as repository_birthdays
 from src.services.auth import auth_service
+from src.services.contact_cache import contact_cache
+from src.services.contact_filters import UnsupportedQuery, plan_query
+from src.services.duplicates import find_duplicates
+from src.services.events import SubscriptionLimitError, event_bus
+from src.services.resilience import ResilientRateLimiter
 from src.database.models import User
-from fastapi_limiter.depends import RateLimiter
 
 router = APIRouter(prefix='/contacts', tags=["contacts"])
 
+
+def contact_fields(fields: str | None = Query(None, description='Comma separated list of fields to return, '
+                                                                   'e.g. "first_name,last_name". id is always included.')
+                   ) -> List[str] | None:
+    """
+    Parses the sparse fieldset requested with the ``fields`` query parameter.
+
+    :param fields: Comma separated field names.
+    :type fields: str | None
+    :return: Field names to select and return, or None for all fields.
+    :rtype: List[str] | None
+    """
+    requested = [field.strip() for field in (fields or '').split(',') if field.strip()]
+    if not requested:
+        return None
+    valid_fields = list(ContactResponse.__fields__)
+    invalid = [field for field in requested if field not in valid_fields]
+    if invalid:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail=f"Invalid fields: {invalid}. Valid fields: {valid_fields}")
+    return ['id'] + [field for field in dict.fromkeys(requested) if field != 'id']
+
+
+def rows_response(rows, fields: List[str] | None, headers: dict | None = None) -> Response:
+    """
+    Serializes contact rows of the ORM-free read path.
+
+    :param rows: Rows or a single row from repository.contact_rows.
+    :param fields: Field names of the rows, or None for all fields.
+    :type fields: List[str] | None
+    :param headers: Extra response headers.
+    :type headers: dict | None
+    :return: JSON response.
+    :rtype: Response
+    """
+    return Response(content=repository_contact_rows.contacts_json(rows, fields), media_type="application/json",
+                    headers=headers)
+
 # Отримати список всіх контактів
 @router.get("/contacts/", response_model=List[ContactResponse], description='No more than 10 requests per minute',
-            dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-async def get_contacts(skip: int = 0, limit: int = 100, db: Session = Depends(get_db),
+            dependencies=[Depends(ResilientRateLimiter(times=10, seconds=60))])
+async def get_contacts(skip: int = 0, limit: int = 100,
+                       fields: List[str] | None = Depends(contact_fields), db: Session = Depends(get_read_db),
                        current_user: User = Depends(auth_service.get_current_user)):
     """
     The get_contacts function returns a list of contacts for the user.
+    The total number of the user's contacts is sent in the X-Total-Count header.
 
     :param skip: The number of contacts to skip.
     :type skip: int
     :param limit: The maximum number of contacts to return.
     :type limit: int
+    :param fields: Fields to return, or None for all fields.
+    :type fields: List[str] | None
+    :param current_user: The user to retrieve contacts for.
+    :type current_user: User
+    :param db: The database session.
+    :type db: Session
+    :return: A list of contacts.
+    :rtype: List[Contact]
+    """
+    contacts = await repository_contact_rows.get_contacts(skip, limit, current_user, db, fields)
+    stats = await repository_stats.get_stats(current_user, db, initialize=False)
+    release(db)
+    headers = {"X-Total-Count": str(stats["total"])} if stats else {}
+    return rows_response(contacts, fields, headers)
+
+
+# Отримати зміни контактів після попередньої синхронізації
+@router.get("/changes", response_model=ContactChanges)
+async def get_changes(since: str = Query('0', description='Token returned by the previous sync, 0 for a full sync'),
+                      limit: int = Query(500, ge=1, le=5000), db: Session = Depends(get_read_db),
+                      current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Returns contacts created, updated or deleted since the given sync token.
+
+    :param since: Token returned by the previous sync, 0 for a full sync.
+    :type since: str
+    :param limit: The maximum number of changes to return.
+    :type limit: int
+    :param current_user: The user to retrieve changes for.
+    :type current_user: User
+    :param db: The database session.
+    :type db: Session
+    :return: Changed contacts, deleted contact IDs and the token for the next sync.
+    :rtype: dict
+    """
+    if not since.isdigit():
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Invalid sync token")
+    changes = await repository_contacts.get_changes(int(since), limit, current_user, db)
+    release(db)
+    return {"changed": changes["changed"], "deleted": changes["deleted"], "token": str(changes["version"]),
+            "has_more": changes["has_more"]}
+
+
+# Отримувати зміни контактів наживо (Server-Sent Events)
+@router.get("/events", response_class=StreamingResponse)
+async def contact_events(current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Streams created, updated and deleted contacts of the user as Server-Sent Events.
+
+    Every event carries the change version as its ID, usable as a /contacts/changes token.
+    A ``resync`` event means events were lost (the client was too slow or the worker lost
+    its Redis subscription): catch up through /contacts/changes before going on.
+
+    :param current_user: The user to stream changes of.
+    :type current_user: User
+    :return: The event stream.
+    :rtype: StreamingResponse
+    """
+    try:
+        subscription = event_bus.subscribe(current_user.id)
+    except SubscriptionLimitError as err:
+        if err.per_user:
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(err))
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(err),
+                            headers={"Retry-After": "30"})
+
+    async def stream():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                event = await subscription.get(settings.events_heartbeat_seconds)
+                if event is None:
+                    # keeps proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+                    continue
+                event_id = f"id: {event['version']}\n" if "version" in event else ""
+                yield f"{event_id}event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            subscription.close()
+
+    # the background task also closes a subscription whose stream never started
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+                             background=BackgroundTask(subscription.close))
+
+
+# Отримати статистику контактів
+@router.get("/stats", response_model=ContactStats)
+async def get_stats(db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Returns contact statistics for the user: totals, contacts with phones and counts by birth month.
+
+    :param current_user: The user to retrieve statistics for.
+    :type current_user: User
+    :param db: The database session.
+    :type db: Session
+    :return: Contact statistics.
+    :rtype: dict
+    """
+    stats = await repository_stats.get_stats(current_user, db)
+    return {"total": stats["total"], "with_phone": stats["with_phone"], "with_birthday": stats["with_birthday"],
+            "by_birth_month": {month: stats[f"birth_month_{month}"] for month in range(1, 13)}}
+
+
+# Знайти ймовірні дублікати контактів
+@router.get("/duplicates", response_model=List[DuplicateCluster], description='No more than 2 requests per minute',
+            dependencies=[Depends(ResilientRateLimiter(times=2, seconds=60))])
+async def get_duplicates(threshold: float = Query(0.75, ge=0.5, le=1.0), db: Session = Depends(get_read_db),
+                         current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Returns clusters of contacts that probably describe the same person. The comparison
+    takes seconds for a large address book, so it runs in a worker thread.
+
+    :param threshold: The minimal similarity for two contacts to be linked.
+    :type threshold: float
+    :param current_user: The user to check contacts for.
+    :type current_user: User
+    :param db: The database session.
+    :type db: Session
+    :return: Clusters of contact IDs with their scores.
+    :rtype: List[dict]
+    """
+    contacts = await repository_contacts.get_duplicate_candidates(current_user, db)
+    release(db)
+    return await anyio.to_thread.run_sync(find_duplicates, contacts, threshold)
+
+
+# Знайти контакт за номером телефону
+@router.get("/lookup/phone", response_model=List[ContactResponse])
+async def lookup_by_phone(number: str = Query(..., min_length=4, max_length=32),
+                          suffix: bool = Query(False, description='Match the last digits of the phone only'),
+                          db: Session = Depends(get_read_db),
+                          current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Returns the user's contacts with the given phone, or with a phone ending with the given digits.
+
+    :param number: Phone in any format, or its last digits when suffix is set.
+    :type number: str
+    :param suffix: Whether to match the last digits only.
+    :type suffix: bool
     :param current_user: The user to retrieve contacts for.
     :type current_user: User
     :param db: The database session.
@@ -31,19 +226,123 @@ async def get_contacts(skip: int = 0, limit: int = 100, db: Session = Depends(ge
     :return: A list of contacts.
     :rtype: List[Contact]
     """
-    contacts = await repository_contacts.get_contacts(skip, limit, current_user, db)
+    if sum(c.isdigit() for c in number) < 4:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="At least 4 digits are required")
+    contacts = await repository_contacts.lookup_by_phone(number, current_user, db, suffix)
+    release(db)
     return contacts
 
 
+# Отримати кілька контактів за ідентифікаторами одним запитом
+@router.get("/batch/", response_model=ContactBatch)
+async def get_contacts_by_ids(ids: str = Query(..., description='Comma separated contact IDs, e.g. "3,1,7"'),
+                              fields: List[str] | None = Depends(contact_fields),
+                              db: Session = Depends(get_read_db),
+                              current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Retrieves several contacts of the user by their IDs with a single query.
+
+    :param ids: Comma separated contact IDs.
+    :type ids: str
+    :param fields: Fields to return, or None for all fields.
+    :type fields: List[str] | None
+    :param current_user: The user to retrieve the contacts for.
+    :type current_user: User
+    :param db: The database session.
+    :type db: Session
+    :return: The found contacts in the requested order and the IDs that were not found.
+    :rtype: dict
+    """
+    try:
+        contact_ids = list(dict.fromkeys(int(value) for value in ids.split(',') if value.strip()))
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="IDs must be integers")
+    if not contact_ids or len(contact_ids) > settings.batch_max_ids:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail=f"From 1 to {settings.batch_max_ids} IDs are allowed")
+    contacts = await repository_contacts.get_contacts_by_ids(contact_ids, current_user, db, fields)
+    release(db)
+    found = {contact.id for contact in contacts}
+    missing = [contact_id for contact_id in contact_ids if contact_id not in found]
+    if fields:
+        content = {"contacts": [{field: getattr(contact, field) for field in fields} for contact in contacts],
+                   "missing": missing}
+        return JSONResponse(content=jsonable_encoder(content))
+    return {"contacts": contacts, "missing": missing}
+
+
+def contact_filter(first_name_prefix: str | None = None, last_name_prefix: str | None = None,
+                   email_prefix: str | None = None, name_contains: str | None = None,
+                   email_contains: str | None = None, birth_month_from: int | None = None,
+                   birth_month_to: int | None = None, has_phone: bool | None = None,
+                   sort: str | None = Query(None, description='last_name, first_name or birthday (month and day)')
+                   ) -> ContactFilter:
+    """
+    Collects the filters of the ``filter`` route from the query parameters.
+
+    :return: The filters.
+    :rtype: ContactFilter
+    """
+    try:
+        return ContactFilter(first_name_prefix=first_name_prefix, last_name_prefix=last_name_prefix,
+                             email_prefix=email_prefix, name_contains=name_contains, email_contains=email_contains,
+                             birth_month_from=birth_month_from, birth_month_to=birth_month_to, has_phone=has_phone,
+                             sort=sort)
+    except ValidationError as err:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=err.errors())
+
+
+# Знайти контакти за кількома критеріями з сортуванням
+@router.get("/filter/", response_model=List[ContactResponse])
+async def filter_contacts(criteria: ContactFilter = Depends(contact_filter), skip: int = 0,
+                          limit: int = Query(100, ge=1, le=1000),
+                          fields: List[str] | None = Depends(contact_fields), db: Session = Depends(get_read_db),
+                          current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Returns a page of the user's contacts matching all of the given filters, sorted.
+    Only combinations that an index can serve are accepted, see src.services.contact_filters;
+    the index is sent in the X-Query-Index header, and X-Query-Scan: user flags queries that
+    read the user's contacts one by one.
+
+    :param criteria: Filters and sort.
+    :type criteria: ContactFilter
+    :param skip: The number of contacts to skip.
+    :type skip: int
+    :param limit: The maximum number of contacts to return.
+    :type limit: int
+    :param fields: Fields to return, or None for all fields.
+    :type fields: List[str] | None
+    :param current_user: The user to retrieve contacts for.
+    :type current_user: User
+    :param db: The database session.
+    :type db: Session
+    :return: A list of contacts.
+    :rtype: List[Contact]
+    """
+    try:
+        plan = plan_query(criteria, db.get_bind().dialect.name)
+    except UnsupportedQuery as err:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
+    contacts = await repository_contact_rows.filter_contacts(plan, skip, limit, current_user, db, fields)
+    release(db)
+    headers = {"X-Query-Index": plan.index}
+    if plan.user_scan:
+        headers["X-Query-Scan"] = "user"
+    return rows_response(contacts, fields, headers)
+
+
 # Отримати один контакт за ідентифікатором
 @router.get("/{contact_id}", response_model=ContactResponse)
-async def get_contact(contact_id: int, db: Session = Depends(get_db),
+async def get_contact(contact_id: int, fields: List[str] | None = Depends(contact_fields),
+                      db: Session = Depends(get_read_db),
                       current_user: User = Depends(auth_service.get_current_user)):
     """
     Retrieves a single contact with the specified ID for a specific user.
 
     :param contact_id: The ID of the contact to retrieve.
     :type contact_id: int
+    :param fields: Fields to return, or None for all fields.
+    :type fields: List[str] | None
     :param current_user: The user to retrieve the contact for.
     :type current_user: User
     :param db: The database session.
@@ -51,10 +350,11 @@ async def get_contact(contact_id: int, db: Session = Depends(get_db),
     :return: The contact with the specified ID
     :rtype: Contact
     """
-    contact = await repository_contacts.get_contact(contact_id, current_user, db)
+    contact = await repository_contact_rows.get_contact(contact_id, current_user, db, fields)
+    release(db)
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="The contact is not found")
-    return contact
+    return rows_response(contact, fields)
 
 
 # Створити новий контакт
@@ -124,7 +424,8 @@ async def remove_contact(contact_id: int, db: Session = Depends(get_db),
 
 # Пошук за іменем, прізвищем чи адресою електронної пошти
 @router.get("/{query_field}/{query_value}", response_model=List[ContactResponse])
-async def query_search(query_field: str = '', query_value: str = '', db: Session = Depends(get_db),
+async def query_search(query_field: str = '', query_value: str = '',
+                       fields: List[str] | None = Depends(contact_fields), db: Session = Depends(get_read_db),
                        current_user: User = Depends(auth_service.get_current_user)):
     """
     Returns a list of contacts by the value of one of the fields 
@@ -134,6 +435,8 @@ async def query_search(query_field: str = '', query_value: str = '', db: Session
     :type query_field: str
     :param query_value: Search field value.
     :type query_value: str
+    :param fields: Fields to return, or None for all fields.
+    :type fields: List[str] | None
     :param current_user: The user to retrieve contacts for.
     :type current_user: User
     :param db: The database session.
@@ -141,19 +444,24 @@ async def query_search(query_field: str = '', query_value: str = '', db: Session
     :return: A list of contacts.
     :rtype: List[Contact]
     """
-    contacts = await repository_contacts.query_search(query_field, query_value, current_user, db)
+    contacts = await repository_contact_rows.query_search(query_field, query_value, current_user, db, fields)
+    release(db)
     if contacts is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contacts are not found")
-    return contacts
+    return rows_response(contacts, fields)
 
 
 # Отримати список контактів з днями народження на найближчі 7 днів
 @router.get("/birthdays/", response_model=List[ContactResponse])
-async def birthdays(db: Session = Depends(get_db),
+async def birthdays(fields: List[str] | None = Depends(contact_fields), db: Session = Depends(get_read_db),
                     current_user: User = Depends(auth_service.get_current_user)):
     """
     The function returns a list of contacts whose birthday is in the next week for a specific user.
+    Served from the contact cache when it is enabled, otherwise from the daily snapshot when it is
+    up to date, computed on the fly otherwise.
 
+    :param fields: Fields to return, or None for all fields.
+    :type fields: List[str] | None
     :param current_user: The user to retrieve contacts for.
     :type current_user: User
     :param db: The database session.
@@ -161,7 +469,11 @@ async def birthdays(db: Session = Depends(get_db),
     :return: A list of contacts.
     :rtype: List[Contact]
     """
-    contacts = await repository_contacts.birthdays(current_user, db)
+    contacts = None
+    if not contact_cache.enabled or contact_cache.is_oversized(current_user.id):
+        contacts = await repository_birthdays.get_upcoming(current_user, db, fields)
     if contacts is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contacts are not found")
-    return contacts
\ No newline at end of file
+        # answered from the user's contact snapshot, or computed
+        contacts = await repository_contact_rows.birthdays(current_user, db, fields)
+    release(db)
+    return rows_response(contacts, fields)
\ No newline at end of file
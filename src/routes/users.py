@@ -1,4 +1,6 @@
-from fastapi import APIRouter, Depends, status, UploadFile, File
+import io
+
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
 from sqlalchemy.orm import Session
 import cloudinary
 import cloudinary.uploader
@@ -7,12 +9,20 @@ from src.database.db import get_db
 from src.database.models import User
 from src.repository import users as repository_users
 from src.services.auth import auth_service
+from src.services.resilience import CircuitOpenError, DependencyUnavailable, cloudinary_dependency
+from src.services.tracing import tracer
 from src.conf.config import settings
 from src.schemas import UserDb
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 
+def upload_avatar(data: bytes, public_id: str) -> dict:
+    # every attempt reads its own file object: a timed out attempt may still be sending its copy
+    return cloudinary.uploader.upload(io.BytesIO(data), public_id=public_id, overwrite=True,
+                                      timeout=settings.cloudinary_upload_timeout)
+
+
 @router.get("/me/", response_model=UserDb)
 async def read_users_me(current_user: User = Depends(auth_service.get_current_user)):
     """
@@ -48,7 +58,13 @@ async def update_avatar_user(file: UploadFile = File(), current_user: User = Dep
         secure=True
     )
 
-    r = cloudinary.uploader.upload(file.file, public_id=f'NotesApp/{current_user.username}', overwrite=True)
+    try:
+        with tracer.span("cloudinary.upload"):
+            r = await cloudinary_dependency.call_sync(upload_avatar, await file.read(), f'NotesApp/{current_user.username}')
+    except DependencyUnavailable as err:
+        retry_after = err.retry_after if isinstance(err, CircuitOpenError) else settings.circuit_reset_seconds
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Avatar storage is unavailable",
+                            headers={"Retry-After": str(max(int(retry_after), 1))})
     src_url = cloudinary.CloudinaryImage(f'NotesApp/{current_user.username}')\
                         .build_url(width=250, height=250, crop='fill', version=r.get('version'))
     user = await repository_users.update_avatar(current_user.email, src_url, db)
@@ -1,5 +1,9 @@
 from datetime import date
-from pydantic import BaseModel, Field, EmailStr
+from typing import Dict, List, Literal
+
+from pydantic import BaseModel, Field, EmailStr, root_validator, validator
+
+from src.services.phones import MAX_DIGITS, normalize_phone
 
 
 class ContactModel(BaseModel):
@@ -10,6 +14,12 @@ class ContactModel(BaseModel):
     birthday: date
    # user: UserResponse
 
+    @validator("phone")
+    def phone_fits_e164(cls, phone):
+        if any(c.isdigit() for c in phone) and normalize_phone(phone) is None:
+            raise ValueError(f"a phone number has at most {MAX_DIGITS} digits with the country code")
+        return phone
+
 
 class ContactResponse(BaseModel):
     id: int
@@ -23,6 +33,49 @@ class ContactResponse(BaseModel):
         orm_mode = True
 
 
+class ContactFilter(BaseModel):
+    first_name_prefix: str | None = Field(None, min_length=1, max_length=25)
+    last_name_prefix: str | None = Field(None, min_length=1, max_length=25)
+    email_prefix: str | None = Field(None, min_length=1, max_length=100)
+    # shorter values have no trigrams to search the index with
+    name_contains: str | None = Field(None, min_length=3, max_length=25)
+    email_contains: str | None = Field(None, min_length=3, max_length=100)
+    birth_month_from: int | None = Field(None, ge=1, le=12)
+    birth_month_to: int | None = Field(None, ge=1, le=12)
+    has_phone: bool | None = None
+    sort: Literal["last_name", "first_name", "birthday"] | None = None
+
+    @root_validator(skip_on_failure=True)
+    def month_range(cls, values):
+        if (values["birth_month_from"] or 1) > (values["birth_month_to"] or 12):
+            raise ValueError("birth_month_from must not be after birth_month_to")
+        return values
+
+
+class ContactChanges(BaseModel):
+    changed: List[ContactResponse]
+    deleted: List[int]
+    token: str
+    has_more: bool
+
+
+class ContactBatch(BaseModel):
+    contacts: List[ContactResponse]
+    missing: List[int]
+
+
+class ContactStats(BaseModel):
+    total: int
+    with_phone: int
+    with_birthday: int
+    by_birth_month: Dict[int, int]
+
+
+class DuplicateCluster(BaseModel):
+    contact_ids: List[int]
+    score: float
+
+
 class UserModel(BaseModel):
     username: str = Field(min_length=6, max_length=10)
     email: str
@@ -1,27 +1,50 @@
-from typing import Optional
+from typing import Optional, Tuple
 
+import anyio
 from jose import JWTError, jwt
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
-import redis
 from sqlalchemy.orm import Session
 
-from src.database.db import get_db
+from src.database.db import get_read_db, release
 from src.repository import users as repository_users
+from src.services.metrics import registry
+from src.services.tracing import TracedRedis, tracer
 
 from src.conf.config import settings
 
+hash_rounds_histogram = registry.histogram("password_hash_rounds", "bcrypt cost of the passwords verified at login.",
+                                           buckets=range(4, 18))
+rehash_total = registry.counter("password_rehash_total", "Passwords rehashed at login with the configured cost.")
+
+
+def hash_rounds(hashed_password: str) -> int | None:
+    """
+    Reads the cost factor of a bcrypt hash.
+
+    :param hashed_password: Hash in modular crypt format, e.g. "$2b$12$...".
+    :type hashed_password: str
+    :return: The number of rounds (log2), or None for other hashes.
+    :rtype: int | None
+    """
+    parts = hashed_password.split("$")
+    if len(parts) < 4 or not parts[1].startswith("2") or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
 class Auth:
     """
     A class to define the authorization process.
     """
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.bcrypt_rounds)
     SECRET_KEY = settings.secret_key
     ALGORITHM = settings.algorithm
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
-    r = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0)
+    r = TracedRedis(host=settings.redis_host, port=settings.redis_port, db=0, socket_timeout=settings.redis_timeout,
+                    socket_connect_timeout=settings.redis_timeout)
 
 
     def verify_password(self, plain_password, hashed_password):
@@ -30,6 +53,39 @@ class Auth:
     def get_password_hash(self, password: str):
         return self.pwd_context.hash(password)
 
+    async def hash_password(self, password: str) -> str:
+        """
+        Hashes a password in a worker thread, so that bcrypt does not block the event loop.
+
+        :param password: The plain password.
+        :type password: str
+        :return: The hash.
+        :rtype: str
+        """
+        return await anyio.to_thread.run_sync(self.get_password_hash, password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> Tuple[bool, str | None]:
+        """
+        Checks a password in a worker thread and rehashes it if the hash does not have the
+        configured cost.
+
+        :param plain_password: The password to check.
+        :type plain_password: str
+        :param hashed_password: The stored hash.
+        :type hashed_password: str
+        :return: Whether the password matches, and the new hash to store or None.
+        :rtype: Tuple[bool, str | None]
+        """
+        valid, new_hash = await anyio.to_thread.run_sync(self.pwd_context.verify_and_update, plain_password,
+                                                         hashed_password)
+        if valid:
+            rounds = hash_rounds(hashed_password)
+            if rounds is not None:
+                hash_rounds_histogram.observe(rounds)
+            if new_hash is not None:
+                rehash_total.inc()
+        return valid, new_hash
+
     # define a function to generate a new access token
     async def create_access_token(self, data: dict, expires_delta: Optional[float] = None):
         to_encode = data.copy()
@@ -62,29 +118,33 @@ class Auth:
         except JWTError:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate credentials')
 
-    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_read_db)):
         credentials_exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-        try:
-            # Decode JWT
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
-            if payload['scope'] == 'access_token':
-                email = payload["sub"]
-                if email is None:
+        with tracer.span("auth.get_current_user"):
+            try:
+                # Decode JWT
+                with tracer.span("auth.decode_jwt"):
+                    payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+                if payload['scope'] == 'access_token':
+                    email = payload["sub"]
+                    if email is None:
+                        raise credentials_exception
+                else:
                     raise credentials_exception
-            else:
+            except JWTError as e:
                 raise credentials_exception
-        except JWTError as e:
-            raise credentials_exception
 
-        user = await repository_users.get_user_by_email(email, db)
-        if user is None:
-            raise credentials_exception
-        return user
+            user = await repository_users.get_user_by_email(email, db)
+            # do not hold the connection while the handler waits for other services
+            release(db)
+            if user is None:
+                raise credentials_exception
+            return user
 
     def create_email_token(self, data: dict):
         to_encode = data.copy()
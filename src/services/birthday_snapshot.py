@@ -0,0 +1,109 @@
+"""
+Daily job that materializes upcoming birthdays for all users.
+
+Run it from cron shortly after midnight::
+
+    python -m src.services.birthday_snapshot
+
+or set ``birthday_snapshot_schedule`` to let the application workers run it. Every
+worker then tries at start and at 00:05; on Postgres an advisory lock lets one of them
+rebuild at a time, and the others skip a snapshot that is already today's.
+"""
+import asyncio
+import logging
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from src.database.db import SessionLocal
+from src.repository.birthdays import rebuild_snapshot, snapshot_day
+
+logger = logging.getLogger(__name__)
+
+# key of the Postgres advisory lock held while the snapshot is rebuilt
+LOCK_KEY = 7_341_001
+
+
+def rebuild_if_due(db: Session, today: date | None = None, force: bool = False) -> int | None:
+    """
+    Rebuilds the snapshot unless another worker is rebuilding it or it is already today's.
+
+    The advisory lock is taken in the rebuild's transaction and released by its commit.
+
+    :param db: The database session.
+    :type db: Session
+    :param today: The day to compute the snapshot for, today by default.
+    :type today: date | None
+    :param force: Rebuild even if the snapshot is already today's.
+    :type force: bool
+    :return: Number of stored upcoming birthdays, or None if the rebuild was skipped.
+    :rtype: int | None
+    """
+    today = today or date.today()
+    locked = db.get_bind().dialect.name != "postgresql" \
+        or db.execute(select(func.pg_try_advisory_xact_lock(LOCK_KEY))).scalar()
+    if not locked or (not force and snapshot_day(db) == today):
+        db.rollback()
+        return None
+    return rebuild_snapshot(db, today)
+
+
+def rebuild(force: bool = False) -> int | None:
+    """
+    Rebuilds today's snapshot with a new database session, see :func:`rebuild_if_due`.
+
+    :param force: Rebuild even if the snapshot is already today's.
+    :type force: bool
+    :return: Number of stored upcoming birthdays, or None if the rebuild was skipped.
+    :rtype: int | None
+    """
+    db = SessionLocal()
+    try:
+        return rebuild_if_due(db, force=force)
+    finally:
+        db.close()
+
+
+def seconds_until(hour: int, minute: int, now: datetime | None = None) -> float:
+    """
+    Returns the number of seconds until the next hour:minute.
+
+    :param hour: Hour of the day.
+    :type hour: int
+    :param minute: Minute of the hour.
+    :type minute: int
+    :param now: The current time, now by default.
+    :type now: datetime | None
+    :return: Seconds to sleep.
+    :rtype: float
+    """
+    now = now or datetime.now()
+    run_at = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if run_at <= now:
+        run_at += timedelta(days=1)
+    return (run_at - now).total_seconds()
+
+
+async def run_daily(hour: int = 0, minute: int = 5) -> None:
+    """
+    Rebuilds the snapshot on start and then every day at hour:minute, off the event loop.
+
+    :param hour: Hour of the day.
+    :type hour: int
+    :param minute: Minute of the hour.
+    :type minute: int
+    :return: None
+    """
+    while True:
+        try:
+            count = await asyncio.to_thread(rebuild)
+            if count is not None:
+                logger.info("birthday snapshot rebuilt: %s upcoming birthdays", count)
+        except Exception:
+            logger.exception("birthday snapshot rebuild failed")
+        await asyncio.sleep(seconds_until(hour, minute))
+
+
+if __name__ == '__main__':
+    print(f"{rebuild(force=True)} upcoming birthdays stored")
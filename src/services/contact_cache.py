@@ -0,0 +1,248 @@
+"""
+Per-worker cache of users' address books for the list, search and birthday reads.
+
+A ``ContactSnapshot`` holds all contacts of one user column by column (IDs and birthdays
+in arrays, the text columns in lists) together with the user's ``contacts_version`` it was
+read at. The contacts repository applies every committed write to the snapshot of this
+worker at once; the other workers apply it when the event arrives through Redis. An event
+with the next version patches the snapshot, an older one is already in it, and a gap
+means a missed event and drops the snapshot. When the Redis subscription fails, every
+snapshot is dropped. Snapshots older than ``ttl`` seconds are read again, in case an
+event was lost on the way.
+
+``ContactCache`` keeps the snapshots in LRU order within ``max_bytes``; users with more
+than ``max_contacts`` contacts are read from the database as before, until they delete a
+contact or the user is invalidated. It also remembers the latest event version of
+recently written users, so that a snapshot read from a lagging replica after a newer
+event has been seen is not cached.
+"""
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import date
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+from src.conf.config import settings
+from src.services.events import event_bus
+from src.services.metrics import registry
+
+FIELDS = ["id", "first_name", "last_name", "email", "phone", "birthday"]
+TEXT_FIELDS = ["first_name", "last_name", "email", "phone"]
+
+requests_total = registry.counter("contact_cache_requests_total", "Contact cache lookups by result.",
+                                  labels=["result"])
+evictions_total = registry.counter("contact_cache_evictions_total", "Snapshots evicted to stay within memory.")
+bytes_gauge = registry.gauge("contact_cache_bytes", "Estimated memory held by contact snapshots.")
+users_gauge = registry.gauge("contact_cache_users", "Users with a cached contact snapshot.")
+
+
+def _text_size(value: str | None) -> int:
+    return sys.getsizeof(value) if value is not None else 0
+
+
+class ContactSnapshot:
+    """
+    All contacts of one user in columns, sorted by ID.
+    """
+
+    def __init__(self, user_id: int, version: int, rows: Iterable[Sequence]):
+        self.user_id = user_id
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.ids = array("q")
+        # date ordinals, 0 for no birthday
+        self.birthdays = array("l")
+        self.text: Dict[str, List[str | None]] = {field: [] for field in TEXT_FIELDS}
+        self.nbytes = 0
+        for row in sorted(rows, key=lambda row: row[0]):
+            self._insert(len(self.ids), row)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _insert(self, index: int, row: Sequence) -> None:
+        contact_id, first_name, last_name, email, phone, birthday = row
+        self.ids.insert(index, contact_id)
+        self.birthdays.insert(index, birthday.toordinal() if birthday else 0)
+        for field, value in zip(TEXT_FIELDS, (first_name, last_name, email, phone)):
+            self.text[field].insert(index, value)
+        self.nbytes += self._row_size(index)
+
+    def _remove(self, index: int) -> None:
+        self.nbytes -= self._row_size(index)
+        del self.ids[index]
+        del self.birthdays[index]
+        for column in self.text.values():
+            del column[index]
+
+    def _row_size(self, index: int) -> int:
+        # array items, list slots and the strings themselves
+        return 16 + 8 * len(TEXT_FIELDS) + sum(_text_size(column[index]) for column in self.text.values())
+
+    def _index(self, contact_id: int) -> int | None:
+        index = bisect_left(self.ids, contact_id)
+        return index if index < len(self.ids) and self.ids[index] == contact_id else None
+
+    def apply(self, event: Dict) -> None:
+        """
+        Applies a created, updated or deleted event of the next version.
+
+        :param event: Event built by ``src.services.events.contact_event``.
+        :type event: Dict
+        """
+        index = self._index(event["contact_id"])
+        if index is not None:
+            self._remove(index)
+        if event["type"] != "deleted":
+            contact = event["contact"]
+            birthday = date.fromisoformat(contact["birthday"]) if contact["birthday"] else None
+            row = (contact["id"], contact["first_name"], contact["last_name"], contact["email"], contact["phone"],
+                   birthday)
+            self._insert(bisect_left(self.ids, contact["id"]), row)
+        self.version = event["version"]
+
+    def _value(self, field: str, index: int):
+        if field == "id":
+            return self.ids[index]
+        if field == "birthday":
+            ordinal = self.birthdays[index]
+            return date.fromordinal(ordinal) if ordinal else None
+        return self.text[field][index]
+
+    def rows(self, indexes: Iterable[int], fields: List[str] | None = None) -> List[Tuple]:
+        """
+        Materializes rows with the given columns, in the shape of the contact_rows results.
+
+        :param indexes: Positions of the contacts in the snapshot.
+        :type indexes: Iterable[int]
+        :param fields: Columns, all of FIELDS by default.
+        :type fields: List[str] | None
+        :return: Row tuples.
+        :rtype: List[Tuple]
+        """
+        fields = fields or FIELDS
+        return [tuple(self._value(field, index) for field in fields) for index in indexes]
+
+    def page(self, skip: int, limit: int) -> range:
+        return range(min(skip, len(self)), min(skip + limit, len(self)))
+
+    def search(self, field: str, value: str) -> List[int]:
+        return [index for index, candidate in enumerate(self.text[field]) if candidate == value]
+
+    def with_birthday(self, predicate: Callable[[date], bool]) -> List[int]:
+        return [index for index, ordinal in enumerate(self.birthdays)
+                if ordinal and predicate(date.fromordinal(ordinal))]
+
+
+class ContactCache:
+    """
+    Snapshots of this worker in LRU order, bounded by their estimated size.
+    """
+
+    def __init__(self, max_bytes: int, max_contacts: int, ttl: float = 300.0, enabled: bool = True,
+                 tracked_users: int = 10000):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_contacts = max_contacts
+        self.enabled = enabled
+        self.tracked_users = tracked_users
+        self.nbytes = 0
+        self._snapshots: "OrderedDict[int, ContactSnapshot]" = OrderedDict()
+        self._latest: "OrderedDict[int, int]" = OrderedDict()
+        self._oversized: "OrderedDict[int, None]" = OrderedDict()
+
+    def _remember(self, entries: OrderedDict, user_id: int, value) -> None:
+        entries[user_id] = value
+        entries.move_to_end(user_id)
+        if len(entries) > self.tracked_users:
+            entries.popitem(last=False)
+
+    def is_oversized(self, user_id: int) -> bool:
+        return user_id in self._oversized
+
+    def mark_oversized(self, user_id: int) -> None:
+        self._remember(self._oversized, user_id, None)
+
+    def get(self, user_id: int) -> ContactSnapshot | None:
+        snapshot = self._snapshots.get(user_id)
+        if snapshot is not None and time.monotonic() - snapshot.loaded_at > self.ttl:
+            self.invalidate(user_id)
+            snapshot = None
+        if snapshot is None:
+            requests_total.inc(result="miss")
+            return None
+        requests_total.inc(result="hit")
+        self._snapshots.move_to_end(user_id)
+        return snapshot
+
+    def put(self, snapshot: ContactSnapshot) -> None:
+        self.invalidate(snapshot.user_id)
+        if snapshot.nbytes > self.max_bytes or self._latest.get(snapshot.user_id, 0) > snapshot.version:
+            return
+        self._snapshots[snapshot.user_id] = snapshot
+        self.nbytes += snapshot.nbytes
+        while self.nbytes > self.max_bytes:
+            _, evicted = self._snapshots.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+            evictions_total.inc()
+        self._update_gauges()
+
+    def invalidate(self, user_id: int) -> None:
+        # the next read counts the contacts again
+        self._oversized.pop(user_id, None)
+        snapshot = self._snapshots.pop(user_id, None)
+        if snapshot is not None:
+            self.nbytes -= snapshot.nbytes
+            self._update_gauges()
+
+    def clear(self) -> None:
+        self._snapshots.clear()
+        self._latest.clear()
+        self._oversized.clear()
+        self.nbytes = 0
+        self._update_gauges()
+
+    def apply(self, user_id: int | None, event: Dict) -> None:
+        """
+        Brings the user's snapshot up to date with a contact event; listener of the event bus.
+
+        :param user_id: Owner of the changed contact, None for events of all users.
+        :type user_id: int | None
+        :param event: The event.
+        :type event: Dict
+        """
+        if user_id is None:
+            self.clear()
+            return
+        if "version" not in event:
+            return
+        self._remember(self._latest, user_id, max(event["version"], self._latest.get(user_id, 0)))
+        snapshot = self._snapshots.get(user_id)
+        if snapshot is None and event["type"] == "deleted":
+            # a deletion may bring an oversized user back under the limit
+            self._oversized.pop(user_id, None)
+        if snapshot is None or event["version"] <= snapshot.version:
+            return
+        if event["version"] != snapshot.version + 1:
+            self.invalidate(user_id)
+            return
+        self.nbytes -= snapshot.nbytes
+        snapshot.apply(event)
+        self.nbytes += snapshot.nbytes
+        if snapshot.nbytes > self.max_bytes or len(snapshot) > self.max_contacts:
+            self.invalidate(user_id)
+            if len(snapshot) > self.max_contacts:
+                self.mark_oversized(user_id)
+        self._update_gauges()
+
+    def _update_gauges(self) -> None:
+        bytes_gauge.set(self.nbytes)
+        users_gauge.set(len(self._snapshots))
+
+
+contact_cache = ContactCache(settings.contact_cache_max_mb * 2 ** 20, settings.contact_cache_max_contacts,
+                             settings.contact_cache_ttl_seconds, enabled=settings.contact_cache_enabled)
+if contact_cache.enabled:
+    event_bus.add_listener(contact_cache.apply)
@@ -0,0 +1,166 @@
+"""
+Index plans for the combinable filters of GET /api/contacts/filter/.
+
+Every accepted combination of filters and sort is read through one index of the user's
+contacts, in the order of that index, so no query sorts or scans more than it returns:
+
+* the prefix and birth month filters are ranges of an index: email, last name, first name
+  or month and day of birth. The first of them in that order drives the query, the others
+  are checked on the rows of its range;
+* a sort walks its own index, so it can only be combined with the range filter of the
+  same index (and the other filters checked on that range);
+* the "contains" filters are served by trigram indexes on Postgres, which hold the user
+  ID as well, so only the user's matches are read. Elsewhere, and for a sort, they have
+  no index; alone they read all of the user's contacts, which the plan
+  flags, and with a sort they are rejected;
+* has_phone is checked on the rows of whatever index drives the query.
+
+Prefix filters are case sensitive, the "contains" filters are not. Prefix ranges and the
+sorts by name or email compare bytes: SQLite does by default, Postgres reads them through
+indexes in the "C" collation. The database collation, en_US.utf8 for example, skips
+punctuation on the first pass, so a range from the prefix up misses strings starting with
+it: "o-z" compares like "oz" there and sorts after "o.", the upper bound of "o-".
+"""
+from dataclasses import dataclass
+from typing import Dict, List
+
+from sqlalchemy import and_, func, or_
+
+from src.database.models import Contact
+from src.schemas import ContactFilter
+
+# the leading user_id column of every index is left out
+INDEXES = {
+    "email": ("ix_contacts_user_id_email", [Contact.email]),
+    "last_name": ("ix_contacts_user_id_last_name_first_name", [Contact.last_name, Contact.first_name]),
+    "first_name": ("ix_contacts_user_id_first_name_last_name", [Contact.first_name, Contact.last_name]),
+    "birthday": ("ix_contacts_user_id_birth_month_birth_day", [Contact.birth_month, Contact.birth_day]),
+}
+# Postgres only, the same columns in the "C" collation, see migration b58e2d7c1f04
+C_INDEXES = {
+    "email": "ix_contacts_user_id_email_c",
+    "last_name": "ix_contacts_user_id_last_name_first_name_c",
+    "first_name": "ix_contacts_user_id_first_name_last_name_c",
+}
+USER_INDEX = "ix_contacts_user_id_id"
+# Postgres only, GIN on user_id and the trigrams of the column, see migration b58e2d7c1f04
+TRIGRAM_INDEXES = {"name_contains": ["ix_contacts_user_id_first_name_trgm", "ix_contacts_user_id_last_name_trgm"],
+                   "email_contains": ["ix_contacts_user_id_email_trgm"]}
+
+
+class UnsupportedQuery(ValueError):
+    """
+    Raised for a combination of filters and sort that no index can serve.
+    """
+
+
+@dataclass
+class QueryPlan:
+    """
+    Conditions and order of a filter query, and the index expected to serve it.
+
+    ``user_scan`` is True when the query reads the user's contacts one by one, in the
+    order of the index, instead of a range of it.
+    """
+    index: str
+    where: List
+    order_by: List
+    user_scan: bool = False
+
+
+def _index(key: str, dialect: str):
+    """
+    The name and columns of the index serving the range filter or sort ``key``.
+    """
+    name, columns = INDEXES[key]
+    if dialect == "postgresql" and key in C_INDEXES:
+        return C_INDEXES[key], [column.collate("C") for column in columns]
+    return name, columns
+
+
+def _upper_bound(prefix: str) -> str:
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _prefix(column, prefix: str, indexed: bool):
+    if indexed:
+        # in byte order the range holds exactly the strings starting with the prefix
+        return and_(column >= prefix, column < _upper_bound(prefix))
+    # equality is exact in any deterministic collation, and substr can not be served by an
+    # index, so the check does not compete with the driving one
+    return func.substr(column, 1, len(prefix)) == prefix
+
+
+def _contains(column, value: str):
+    escaped = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return column.ilike(f"%{escaped}%", escape="\\")
+
+
+def _ranges(criteria: ContactFilter) -> Dict[str, object]:
+    """
+    The range filters of the criteria by index name, in the order of INDEXES.
+    """
+    ranges = {}
+    for key, value in (("email", criteria.email_prefix), ("last_name", criteria.last_name_prefix),
+                       ("first_name", criteria.first_name_prefix)):
+        if value is not None:
+            ranges[key] = value
+    if criteria.birth_month_from is not None or criteria.birth_month_to is not None:
+        ranges["birthday"] = (criteria.birth_month_from or 1, criteria.birth_month_to or 12)
+    return ranges
+
+
+def _range_condition(key: str, value, indexed: bool, dialect: str):
+    if key == "birthday":
+        low, high = value
+        # coalesce keeps the residual check off the index and excludes contacts without a birthday
+        column = Contact.birth_month if indexed else func.coalesce(Contact.birth_month, 0)
+        return column.between(low, high)
+    column = _index(key, dialect)[1][0] if indexed else INDEXES[key][1][0]
+    return _prefix(column, value, indexed)
+
+
+def plan_query(criteria: ContactFilter, dialect: str) -> QueryPlan:
+    """
+    Picks the index that serves the criteria and builds the conditions and order for it.
+
+    :param criteria: Filters and sort.
+    :type criteria: ContactFilter
+    :param dialect: Name of the database dialect, e.g. "postgresql".
+    :type dialect: str
+    :return: The plan; the conditions do not include the user.
+    :rtype: QueryPlan
+    :raises UnsupportedQuery: If the sort can not be served together with the filters.
+    """
+    ranges = _ranges(criteria)
+    contains = {}
+    if criteria.name_contains is not None:
+        contains["name_contains"] = or_(_contains(Contact.first_name, criteria.name_contains),
+                                        _contains(Contact.last_name, criteria.name_contains))
+    if criteria.email_contains is not None:
+        contains["email_contains"] = _contains(Contact.email, criteria.email_contains)
+
+    if criteria.sort is not None:
+        if contains:
+            raise UnsupportedQuery(f"sort can not be combined with {', '.join(contains)}")
+        if ranges and criteria.sort not in ranges:
+            allowed = "birth_month_from/birth_month_to" if criteria.sort == "birthday" else f"{criteria.sort}_prefix"
+            raise UnsupportedQuery(f"sort={criteria.sort} can only be combined with filters that include {allowed}")
+        driving = criteria.sort
+    else:
+        driving = next(iter(ranges), None)
+
+    where = [_range_condition(key, value, key == driving, dialect) for key, value in ranges.items()]
+    where.extend(contains.values())
+    if criteria.has_phone is not None:
+        # compared through coalesce, so that the phone index does not compete with the driving one
+        has_phone = func.coalesce(Contact.phone, "") != ""
+        where.append(has_phone if criteria.has_phone else ~has_phone)
+
+    if driving is not None:
+        index, columns = _index(driving, dialect)
+        # the ID breaks ties; SQLite keeps it in every index, Postgres sorts the ties only
+        return QueryPlan(index, where, [*columns, Contact.id], user_scan=driving not in ranges)
+    if contains and dialect == "postgresql":
+        return QueryPlan(",".join(index for key in contains for index in TRIGRAM_INDEXES[key]), where, [Contact.id])
+    return QueryPlan(USER_INDEX, where, [Contact.id], user_scan=True)
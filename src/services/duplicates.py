@@ -0,0 +1,289 @@
+import re
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Iterable, List, NamedTuple, Set, Tuple
+
+import numpy as np
+
+
+class ContactRecord(NamedTuple):
+    id: int
+    first_name: str
+    last_name: str
+    email: str
+    phone: str | None
+    birthday: date | None
+
+
+_SOUNDEX_CODES = {c: str(code) for code, letters in enumerate(
+    ["aeiouyhw", "bfpv", "cgjkqsxz", "dt", "l", "mn", "r"]) for c in letters}
+
+
+def normalize_email(email: str | None) -> str:
+    """
+    Lower-cases an email and drops the ``+tag`` part of the local part.
+
+    :param email: Email address.
+    :type email: str | None
+    :return: Normalized email, empty string for no email.
+    :rtype: str
+    """
+    if not email:
+        return ''
+    local, _, domain = email.strip().lower().partition('@')
+    return f"{local.split('+', 1)[0]}@{domain}"
+
+
+def phone_key(phone: str | None, digits: int = 9) -> str:
+    """
+    Returns the last ``digits`` digits of a phone, so "+380 93 909 09 00" and "093-909-0900" match.
+
+    :param phone: Phone in any format.
+    :type phone: str | None
+    :param digits: Number of trailing digits to keep.
+    :type digits: int
+    :return: Trailing digits, empty string if the phone is too short to be compared.
+    :rtype: str
+    """
+    only_digits = re.sub(r'\D', '', phone or '')
+    return only_digits[-digits:] if len(only_digits) >= 7 else ''
+
+
+def soundex(name: str | None) -> str:
+    """
+    American Soundex code of a name, e.g. "Robert" and "Rupert" both give "R163".
+
+    :param name: Name to encode.
+    :type name: str | None
+    :return: Four character code, empty string for a name without latin letters.
+    :rtype: str
+    """
+    letters = [c for c in (name or '').lower() if c in _SOUNDEX_CODES]
+    if not letters:
+        return ''
+    code = letters[0].upper()
+    previous = _SOUNDEX_CODES[letters[0]]
+    for c in letters[1:]:
+        digit = _SOUNDEX_CODES[c]
+        if digit != '0' and digit != previous:
+            code += digit
+        if c not in 'hw':
+            previous = digit
+    return (code + '000')[:4]
+
+
+def blocking_keys(contact: ContactRecord) -> List[Tuple[str, str]]:
+    """
+    Keys under which a contact is compared with others; only contacts sharing a key are compared.
+
+    :param contact: The contact.
+    :type contact: ContactRecord
+    :return: List of (kind, value) keys.
+    :rtype: List[Tuple[str, str]]
+    """
+    keys = []
+    email = normalize_email(contact.email)
+    if email:
+        keys.append(('email', email))
+    phone = phone_key(contact.phone)
+    if phone:
+        keys.append(('phone', phone))
+    last, first = soundex(contact.last_name), (contact.first_name or '')[:1].lower()
+    if last:
+        keys.append(('name', f'{last}{first}'))
+    # catches first and last name swapped
+    first_code, last_initial = soundex(contact.first_name), (contact.last_name or '')[:1].lower()
+    if first_code:
+        keys.append(('name', f'{first_code}{last_initial}'))
+    return keys
+
+
+def name_grams(first_name: str | None, last_name: str | None) -> Set[str]:
+    """
+    Trigrams of every word of both names, padded so that word boundaries count.
+
+    A set, so first and last name swapped give the same trigrams.
+
+    :param first_name: First name.
+    :type first_name: str | None
+    :param last_name: Last name.
+    :type last_name: str | None
+    :return: The trigrams, e.g. " ka", "kat", "ate" and "te " for "Kate".
+    :rtype: Set[str]
+    """
+    words = f'{first_name or ""} {last_name or ""}'.lower().split()
+    return {f' {word} '[i:i + 3] for word in words for i in range(len(word))}
+
+
+def _codes(values: Iterable) -> np.ndarray:
+    # equal values get equal codes, a missing value -1
+    codes = {}
+    return np.array([codes.setdefault(value, len(codes)) if value else -1 for value in values], dtype=np.int64)
+
+
+class _Scorer:
+    """
+    Scores contacts against each other a block at a time, as matrices.
+
+    Email, phone digits and birthday are compared as integer codes. The names are rows of
+    a 0/1 matrix with a column per trigram, so the shared trigrams of all pairs of a block
+    are one matrix product, and the name similarity is their Dice coefficient.
+    """
+
+    def __init__(self, contacts: List[ContactRecord]):
+        vocabulary = {}
+        self.grams = [np.array([vocabulary.setdefault(gram, len(vocabulary))
+                                for gram in name_grams(contact.first_name, contact.last_name)], dtype=np.int64)
+                      for contact in contacts]
+        self.gram_counts = np.array([len(grams) for grams in self.grams], dtype=np.float64)
+        self.emails = _codes(normalize_email(contact.email) for contact in contacts)
+        self.phones = _codes(phone_key(contact.phone) for contact in contacts)
+        self.birthdays = _codes(contact.birthday for contact in contacts)
+
+    def _gram_matrix(self, rows: List[int]) -> np.ndarray:
+        grams = [self.grams[i] for i in rows]
+        _, columns = np.unique(np.concatenate(grams), return_inverse=True)
+        matrix = np.zeros((len(rows), columns.max() + 1 if len(columns) else 0), dtype=np.float32)
+        matrix[np.repeat(np.arange(len(rows)), [len(row) for row in grams]), columns] = 1.0
+        return matrix
+
+    def scores(self, left: List[int], right: List[int]) -> np.ndarray:
+        """
+        Similarity of every contact of ``left`` with every contact of ``right``.
+
+        :param left: Indexes of contacts, the rows.
+        :type left: List[int]
+        :param right: Indexes of contacts, the columns.
+        :type right: List[int]
+        :return: Scores from 0 to 1, ``len(left)`` by ``len(right)``.
+        :rtype: np.ndarray
+        """
+        weights = np.full((len(left), len(right)), 0.4)
+        exact = np.zeros_like(weights)
+        for codes, weight in ((self.emails, 0.3), (self.phones, 0.3), (self.birthdays, 0.2)):
+            a, b = codes[left][:, None], codes[right][None, :]
+            known = (a >= 0) & (b >= 0)
+            weights += weight * known
+            exact += weight * (known & (a == b))
+        # one matrix over the trigrams of both sides, so that their columns match
+        matrix = self._gram_matrix(left if left is right else [*left, *right])
+        shared = matrix @ matrix.T if left is right else matrix[:len(left)] @ matrix[len(left):].T
+        total = self.gram_counts[left][:, None] + self.gram_counts[right][None, :]
+        name = np.divide(2 * shared, total, out=np.zeros_like(weights), where=total > 0)
+        return (exact + 0.4 * name) / weights
+
+
+def _secondary_key(contact: ContactRecord) -> Tuple[str, str]:
+    # both names, in either order, so swapped names stay together
+    return tuple(sorted((soundex(contact.first_name), soundex(contact.last_name))))
+
+
+def _block_links(members: List[int], contacts: List[ContactRecord], scorer: _Scorer, threshold: float,
+                 max_block_size: int) -> Iterable[Tuple[int, int, float]]:
+    """
+    Pairs of a block scoring at least ``threshold``, ``(i, j, score)`` with ``i < j``.
+
+    A block larger than ``max_block_size`` is split by the phonetic codes of both names.
+    A part that is still too large (many contacts with the same name) is sorted by name,
+    email and phone, and each contact is compared with its ``max_block_size - 1`` next
+    neighbours only, ``max_block_size`` rows at a time.
+    """
+    if len(members) <= max_block_size:
+        parts = [members]
+    else:
+        by_key = defaultdict(list)
+        for i in members:
+            by_key[_secondary_key(contacts[i])].append(i)
+        parts = list(by_key.values())
+    for part in parts:
+        if len(part) < 2:
+            continue
+        if len(part) <= max_block_size:
+            # every pair once: the upper triangle
+            scores = scorer.scores(part, part)
+            rows, columns = np.nonzero(np.triu(scores >= threshold, k=1))
+            for row, column in zip(rows.tolist(), columns.tolist()):
+                i, j = part[row], part[column]
+                yield min(i, j), max(i, j), float(scores[row, column])
+            continue
+        part = sorted(part, key=lambda i: (f'{contacts[i].first_name or ""} {contacts[i].last_name or ""}'.lower(),
+                                           normalize_email(contacts[i].email), phone_key(contacts[i].phone)))
+        for start in range(0, len(part), max_block_size):
+            left = part[start:start + max_block_size]
+            right = part[start:start + 2 * max_block_size - 1]
+            scores = scorer.scores(left, right)
+            # the next max_block_size - 1 neighbours of each row
+            offsets = np.arange(len(right))[None, :] - np.arange(len(left))[:, None]
+            rows, columns = np.nonzero((scores >= threshold) & (offsets > 0) & (offsets < max_block_size))
+            for row, column in zip(rows.tolist(), columns.tolist()):
+                i, j = left[row], right[column]
+                yield min(i, j), max(i, j), float(scores[row, column])
+
+
+def similarity(a: ContactRecord, b: ContactRecord) -> float:
+    """
+    Scores how likely two contacts describe the same person, from 0 to 1.
+
+    :param a: First contact.
+    :type a: ContactRecord
+    :param b: Second contact.
+    :type b: ContactRecord
+    :return: Weighted similarity of names (trigrams, in either order), email, phone and birthday.
+    :rtype: float
+    """
+    return float(_Scorer([a, b]).scores([0], [1])[0, 0])
+
+
+def find_duplicates(contacts: Iterable[ContactRecord], threshold: float = 0.75,
+                    max_block_size: int = 200) -> List[Dict]:
+    """
+    Groups contacts that probably describe the same person.
+
+    Contacts are only compared inside blocks that share a normalized email, phone digits
+    or phonetic name key, so the cost grows with the number of contacts times the block
+    size instead of with the square of the number of contacts. Blocks larger than
+    ``max_block_size`` (e.g. a very common surname) are split by the phonetic codes of
+    both names; a part that is still too large is compared in sorted neighbourhoods of
+    ``max_block_size`` contacts. A block is scored at once, as a matrix of all its pairs.
+
+    :param contacts: The contacts to check.
+    :type contacts: Iterable[ContactRecord]
+    :param threshold: The minimal similarity for two contacts to be linked.
+    :type threshold: float
+    :param max_block_size: The largest block whose contacts are all compared with each other.
+    :type max_block_size: int
+    :return: Clusters of contact IDs with the score of their weakest link, best clusters first.
+    :rtype: List[Dict]
+    """
+    contacts = list(contacts)
+    scorer = _Scorer(contacts)
+    blocks = defaultdict(list)
+    for index, contact in enumerate(contacts):
+        for key in blocking_keys(contact):
+            blocks[key].append(index)
+
+    parent = list(range(len(contacts)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # a pair sharing several blocks is found in each of them
+    links = {}
+    for members in blocks.values():
+        if len(members) < 2:
+            continue
+        for i, j, score in _block_links(members, contacts, scorer, threshold, max_block_size):
+            links[i, j] = score
+            parent[find(i)] = find(j)
+
+    clusters = defaultdict(lambda: {"members": set(), "score": 1.0})
+    for (i, j), score in links.items():
+        cluster = clusters[find(i)]
+        cluster["members"].update((i, j))
+        cluster["score"] = min(cluster["score"], score)
+    result = [{"contact_ids": sorted(contacts[i].id for i in cluster["members"]), "score": round(cluster["score"], 3)}
+              for cluster in clusters.values()]
+    return sorted(result, key=lambda cluster: (-cluster["score"], cluster["contact_ids"]))
@@ -5,6 +5,8 @@ from fastapi_mail.errors import ConnectionErrors
 from pydantic import EmailStr
 
 from src.services.auth import auth_service
+from src.services.resilience import DependencyUnavailable, smtp_dependency
+from src.services.tracing import tracer
 from src.conf.config import settings
 
 
@@ -20,6 +22,7 @@ conf = ConnectionConfig(
     USE_CREDENTIALS=True,
     VALIDATE_CERTS=True,
     TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
+    TIMEOUT=int(settings.smtp_timeout),
 )
 
 async def send_email(email: EmailStr, username: str, host: str):
@@ -44,6 +47,7 @@ async def send_email(email: EmailStr, username: str, host: str):
         )
 
         fm = FastMail(conf)
-        await fm.send_message(message, template_name="email_template.html")
-    except ConnectionErrors as err:
+        with tracer.span("smtp.send", {"smtp.server": settings.mail_server, "smtp.template": "email_template.html"}):
+            await smtp_dependency.call(fm.send_message, message, template_name="email_template.html")
+    except (ConnectionErrors, DependencyUnavailable) as err:
         print(err)
@@ -0,0 +1,241 @@
+"""
+Contact change events for the live feed.
+
+The contacts repository publishes an event after every committed write. With Redis the
+event goes to the ``contacts:<user_id>`` channel; every worker holds a single pattern
+subscription to ``contacts:*`` and fans the events out to its local subscribers, so any
+worker can serve any user and an idle feed connection costs one small queue, not a Redis
+connection. Without Redis (tests, one-off scripts) events are delivered locally.
+
+Each subscriber has a bounded queue. A client that does not keep up loses its queued
+events and gets a single ``resync`` event instead, telling it to catch up through
+/contacts/changes.
+"""
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from typing import Callable, Dict, List, Set
+
+from src.conf.config import settings
+from src.database.models import Contact
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = "contacts:"
+RESYNC = {"type": "resync"}
+
+
+class SubscriptionLimitError(Exception):
+    """
+    Raised when a new subscriber would exceed the per-user or per-worker connection limit.
+    """
+
+    def __init__(self, per_user: bool):
+        super().__init__("Too many feed connections for the user" if per_user else "Too many feed connections")
+        self.per_user = per_user
+
+
+class Subscription:
+    """
+    Events of one user for one feed connection.
+    """
+
+    def __init__(self, bus: "EventBus", user_id: int, queue_size: int):
+        self.bus = bus
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self.overflowed = False
+
+    def put(self, event: Dict) -> None:
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # the client is too slow: drop what it has not read and ask it to resync
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+    async def get(self, timeout: float) -> Dict | None:
+        """
+        Waits for the next event.
+
+        :param timeout: Seconds to wait.
+        :type timeout: float
+        :return: The event, or None on timeout.
+        :rtype: Dict | None
+        """
+        try:
+            event = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if event is RESYNC:
+            self.overflowed = False
+        return event
+
+    def close(self) -> None:
+        self.bus.unsubscribe(self)
+
+
+class EventBus:
+    """
+    Publishes contact events and delivers them to the feed connections of this worker.
+    """
+
+    def __init__(self, max_connections: int, max_connections_per_user: int, queue_size: int,
+                 outgoing_size: int = 10000):
+        self.max_connections = max_connections
+        self.max_connections_per_user = max_connections_per_user
+        self.queue_size = queue_size
+        self.outgoing_size = outgoing_size
+        self.dropped = 0
+        self._subscribers: Dict[int, Set[Subscription]] = defaultdict(set)
+        self._connections = 0
+        self._redis = None
+        self._outgoing: asyncio.Queue | None = None
+        self._tasks = []
+        self._listeners: List[Callable[[int | None, Dict], None]] = []
+
+    def add_listener(self, listener: Callable[[int | None, Dict], None]) -> None:
+        """
+        Registers a callback for the events of all users delivered to this worker; it gets
+        None for the user ID when events may have been missed.
+
+        :param listener: Callback taking the user ID and the event.
+        :type listener: Callable[[int | None, Dict], None]
+        :return: None
+        """
+        self._listeners.append(listener)
+
+    @property
+    def connections(self) -> int:
+        return self._connections
+
+    def subscribe(self, user_id: int) -> Subscription:
+        """
+        Registers a feed connection of the user.
+
+        :param user_id: The user to receive events of.
+        :type user_id: int
+        :return: The subscription, close it when the connection ends.
+        :rtype: Subscription
+        :raises SubscriptionLimitError: If a connection limit is reached.
+        """
+        if self._connections >= self.max_connections:
+            raise SubscriptionLimitError(per_user=False)
+        if len(self._subscribers[user_id]) >= self.max_connections_per_user:
+            raise SubscriptionLimitError(per_user=True)
+        subscription = Subscription(self, user_id, self.queue_size)
+        self._subscribers[user_id].add(subscription)
+        self._connections += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self._subscribers.get(subscription.user_id)
+        if subscribers is None or subscription not in subscribers:
+            return
+        subscribers.discard(subscription)
+        self._connections -= 1
+        if not subscribers:
+            del self._subscribers[subscription.user_id]
+
+    def deliver(self, user_id: int, event: Dict) -> None:
+        for listener in self._listeners:
+            listener(user_id, event)
+        for subscription in self._subscribers.get(user_id, ()):
+            subscription.put(event)
+
+    def publish(self, user_id: int, event: Dict) -> None:
+        """
+        Publishes an event of the user without waiting for Redis.
+
+        :param user_id: Owner of the changed contacts.
+        :type user_id: int
+        :param event: JSON serializable event.
+        :type event: Dict
+        :return: None
+        """
+        if self._outgoing is None:
+            self.deliver(user_id, event)
+            return
+        try:
+            self._outgoing.put_nowait((f"{CHANNEL_PREFIX}{user_id}", json.dumps(event)))
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def _publisher(self) -> None:
+        while True:
+            channel, data = await self._outgoing.get()
+            try:
+                await self._redis.publish(channel, data)
+            except Exception as err:
+                self.dropped += 1
+                logger.warning("event publish failed: %s", err)
+
+    async def _listener(self) -> None:
+        while True:
+            try:
+                pubsub = self._redis.pubsub()
+                await pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+                async for message in pubsub.listen():
+                    if message["type"] != "pmessage":
+                        continue
+                    channel = message["channel"]
+                    channel = channel.decode() if isinstance(channel, bytes) else channel
+                    self.deliver(int(channel[len(CHANNEL_PREFIX):]), json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("event subscription failed")
+                # events may have been missed while disconnected
+                for listener in self._listeners:
+                    listener(None, RESYNC)
+                for user_id in list(self._subscribers):
+                    self.deliver(user_id, RESYNC)
+                await asyncio.sleep(1)
+
+    async def start(self, redis) -> None:
+        """
+        Switches to publishing through Redis and starts listening for events of all workers.
+
+        :param redis: asyncio Redis client.
+        :return: None
+        """
+        self._redis = redis
+        self._outgoing = asyncio.Queue(self.outgoing_size)
+        self._tasks = [asyncio.create_task(self._publisher()), asyncio.create_task(self._listener())]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._redis = self._outgoing = None
+
+
+event_bus = EventBus(settings.events_max_connections, settings.events_max_connections_per_user,
+                     settings.events_queue_size)
+
+
+def contact_event(kind: str, contact: Contact, version: int) -> Dict:
+    """
+    Builds the event of a created, updated or deleted contact.
+
+    :param kind: "created", "updated" or "deleted".
+    :type kind: str
+    :param contact: The contact.
+    :type contact: Contact
+    :param version: Version of the change, usable as a /contacts/changes token.
+    :type version: int
+    :return: The event.
+    :rtype: Dict
+    """
+    event = {"type": kind, "contact_id": contact.id, "version": version}
+    if kind != "deleted":
+        event["contact"] = {"id": contact.id, "first_name": contact.first_name, "last_name": contact.last_name,
+                            "email": contact.email, "phone": contact.phone,
+                            "birthday": contact.birthday.isoformat() if contact.birthday else None}
+    return event
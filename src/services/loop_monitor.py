@@ -0,0 +1,92 @@
+"""
+Event-loop lag monitor.
+
+A task on the loop sleeps for ``interval`` seconds and measures how late it wakes up: the
+overshoot is the time the loop spent running something else without yielding, exported
+as ``event_loop_lag_seconds``. In debug mode a watchdog thread also watches the task's
+heartbeat; when the loop has not come back for longer than ``threshold`` it logs the
+stack of the loop thread, i.e. the code that is blocking it, once per stall.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from src.services.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+LAG_BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0]
+
+lag_gauge = registry.gauge("event_loop_lag_seconds", "Lag of the last event loop tick.")
+lag_histogram = registry.histogram("event_loop_lag_seconds_histogram", "Lag of the event loop ticks.", LAG_BUCKETS)
+blocked_total = registry.counter("event_loop_blocked_total", "Times the event loop was blocked beyond the threshold.")
+
+
+class LoopMonitor:
+    """
+    Measures the lag of the running event loop; see the module docstring.
+    """
+
+    def __init__(self, interval: float = 0.1, threshold: float = 0.1, debug: bool = False):
+        self.interval = interval
+        self.threshold = threshold
+        self.debug = debug
+        self._task: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stopped = threading.Event()
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: int | None = None
+
+    def start(self) -> None:
+        """
+        Starts monitoring the running loop; must be called from a coroutine.
+        """
+        if self._task is not None:
+            return
+        self._stopped.clear()
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id = threading.get_ident()
+        self._task = asyncio.get_running_loop().create_task(self._tick())
+        if self.debug:
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join()
+            self._watchdog = None
+
+    async def _tick(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self._heartbeat = time.monotonic()
+            lag = max(loop.time() - started - self.interval, 0.0)
+            lag_gauge.set(lag)
+            lag_histogram.observe(lag)
+            if lag > self.threshold:
+                blocked_total.inc()
+
+    def _watch(self) -> None:
+        reported = None
+        while not self._stopped.wait(min(self.threshold, self.interval) / 2):
+            heartbeat = self._heartbeat
+            stalled = time.monotonic() - heartbeat - self.interval
+            if stalled > self.threshold and reported != heartbeat:
+                reported = heartbeat
+                frame = sys._current_frames().get(self._loop_thread_id)
+                if frame is not None:
+                    stack = "".join(traceback.format_stack(frame))
+                    logger.warning("Event loop blocked for %.0f ms, loop thread stack:\n%s", stalled * 1000, stack)
@@ -0,0 +1,61 @@
+import re
+
+from src.conf.config import settings
+
+# E.164 allows at most 15 digits, country code included
+MAX_DIGITS = 15
+
+
+def normalize_phone(phone: str | None, country_code: str | None = None) -> str | None:
+    """
+    Converts a free-form phone to a canonical E.164-style form, e.g. "093 909-09-00" to "+380939090900".
+
+    Numbers written with a leading "+" or "00" keep their country code, a national
+    number with a trunk "0" gets ``country_code`` instead of it. A result with more than
+    ``MAX_DIGITS`` digits is not a phone number.
+
+    :param phone: Phone in any format.
+    :type phone: str | None
+    :param country_code: Country code for national numbers, settings.phone_default_country_code by default.
+    :type country_code: str | None
+    :return: Canonical phone, or None if there are no digits or too many.
+    :rtype: str | None
+    """
+    if not phone:
+        return None
+    digits = re.sub(r'\D', '', phone)
+    if not digits:
+        return None
+    country_code = country_code or settings.phone_default_country_code
+    if phone.strip().startswith('+'):
+        canonical = digits
+    elif digits.startswith('00'):
+        canonical = digits[2:]
+    elif digits.startswith(country_code) and len(digits) > 10:
+        canonical = digits
+    elif digits.startswith('0'):
+        canonical = country_code + digits[1:]
+    elif len(digits) > 10:
+        canonical = digits
+    else:
+        canonical = country_code + digits
+    if not canonical or len(canonical) > MAX_DIGITS:
+        return None
+    return f'+{canonical}'
+
+
+def reversed_digits(phone: str | None) -> str | None:
+    """
+    Returns the digits of a canonical phone in reverse order.
+
+    Matching the last N digits of a phone then becomes a prefix match on this value,
+    which a B-tree index can serve.
+
+    :param phone: Canonical phone.
+    :type phone: str | None
+    :return: Reversed digits, or None.
+    :rtype: str | None
+    """
+    if not phone:
+        return None
+    return re.sub(r'\D', '', phone)[::-1]
@@ -0,0 +1,246 @@
+"""
+Timeouts, retries and circuit breakers for the calls to Redis, SMTP and Cloudinary.
+
+Every external call goes through the ``Dependency`` of its service. A call that times out
+or fails with one of the dependency's ``retry_on`` errors is retried with full jitter
+backoff and then reported as ``DependencyUnavailable``; other errors are answers of a
+healthy service and propagate unchanged. After ``failure_threshold`` consecutive failures
+the circuit opens and calls fail at once with ``CircuitOpenError`` for ``reset_timeout``
+seconds, then a single trial call decides whether it closes again.
+"""
+import asyncio
+import functools
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Tuple, Type
+
+from cloudinary.exceptions import GeneralError
+from fastapi_limiter import FastAPILimiter
+from fastapi_limiter.depends import RateLimiter
+from fastapi_mail.errors import ConnectionErrors
+from redis.exceptions import ConnectionError as RedisConnectionError, NoScriptError, TimeoutError as RedisTimeoutError
+
+from src.conf.config import settings
+from src.services.metrics import registry
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+state_gauge = registry.gauge("circuit_breaker_state", "Circuit state: 0 closed, 1 half open, 2 open.",
+                             labels=["dependency"])
+calls_total = registry.counter("dependency_calls_total", "Calls to external services by outcome.",
+                               labels=["dependency", "outcome"])
+rate_limit_fallback_total = registry.counter("rate_limit_local_fallback_total",
+                                             "Rate limit checks done locally because Redis was unavailable.")
+
+
+class DependencyUnavailable(Exception):
+    """
+    Raised when a call to an external service failed after all attempts.
+    """
+
+    def __init__(self, name: str, message: str | None = None):
+        super().__init__(message or f"{name} is unavailable")
+        self.name = name
+
+
+class CircuitOpenError(DependencyUnavailable):
+    """
+    Raised without calling the service while its circuit is open.
+    """
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(name, f"{name} is unavailable, circuit open for {retry_after:.0f} s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Counts consecutive failures of a service and stops calling it while it is failing.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial = False
+        self._set_state(CLOSED)
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        state_gauge.set(STATE_VALUES[state], dependency=self.name)
+
+    def retry_after(self) -> float:
+        return max(self.opened_at + self.reset_timeout - time.monotonic(), 0.0)
+
+    def allow(self) -> bool:
+        """
+        Tells whether a call may go through, letting a single trial call through once the
+        open circuit has waited ``reset_timeout``.
+
+        :return: False while the circuit is open.
+        :rtype: bool
+        """
+        if self.state == OPEN and self.retry_after() == 0:
+            self._set_state(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            if self._trial:
+                return False
+            self._trial = True
+        return self.state != OPEN
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._trial = False
+        if self.state != CLOSED:
+            self._set_state(CLOSED)
+
+    def cancel_trial(self) -> None:
+        self._trial = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._set_state(OPEN)
+
+
+class Dependency:
+    """
+    Timeout, retry and circuit breaker policy of one external service.
+    """
+
+    def __init__(self, name: str, timeout: float, retries: int = 0, retry_on: Tuple[Type[Exception], ...] = (),
+                 backoff: float = 0.1, max_backoff: float = 2.0, failure_threshold: int = 5,
+                 reset_timeout: float = 30.0):
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_on = retry_on
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+
+    async def call(self, func: Callable[..., Awaitable], *args, **kwargs) -> Any:
+        """
+        Awaits ``func(*args, **kwargs)`` under the policy.
+
+        :param func: Coroutine function calling the service.
+        :type func: Callable[..., Awaitable]
+        :return: What ``func`` returns.
+        :rtype: Any
+        :raises CircuitOpenError: If the circuit is open.
+        :raises DependencyUnavailable: If every attempt timed out or failed with a ``retry_on`` error.
+        """
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow():
+                calls_total.inc(dependency=self.name, outcome="rejected")
+                raise CircuitOpenError(self.name, self.breaker.retry_after())
+            try:
+                result = await asyncio.wait_for(func(*args, **kwargs), self.timeout)
+            except (asyncio.TimeoutError, *self.retry_on) as err:
+                outcome = "timeout" if isinstance(err, asyncio.TimeoutError) else "failure"
+                calls_total.inc(dependency=self.name, outcome=outcome)
+                self.breaker.record_failure()
+                if attempt == self.retries:
+                    raise DependencyUnavailable(self.name) from err
+                await asyncio.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+            except Exception:
+                # the service answered, with a client error for example
+                self.breaker.record_success()
+                raise
+            except asyncio.CancelledError:
+                self.breaker.cancel_trial()
+                raise
+            else:
+                calls_total.inc(dependency=self.name, outcome="success")
+                self.breaker.record_success()
+                return result
+
+    async def call_sync(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        Runs the blocking ``func(*args, **kwargs)`` in a worker thread under the policy.
+
+        A timed out call keeps its thread until the call returns, so ``func`` should have a
+        timeout of its own as well; the request does not wait for it.
+
+        :param func: Blocking function calling the service.
+        :type func: Callable
+        :return: What ``func`` returns.
+        :rtype: Any
+        """
+        def run():
+            # an executor future, unlike anyio.to_thread, can be abandoned on timeout
+            return asyncio.get_running_loop().run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+        return await self.call(run)
+
+
+def _dependency(name: str, timeout: float, retries: int, retry_on: Tuple[Type[Exception], ...]) -> Dependency:
+    return Dependency(name, timeout, retries, retry_on, failure_threshold=settings.circuit_failure_threshold,
+                      reset_timeout=settings.circuit_reset_seconds)
+
+
+redis_dependency = _dependency("redis", settings.redis_timeout, 0, (RedisConnectionError, RedisTimeoutError))
+smtp_dependency = _dependency("smtp", settings.smtp_timeout, settings.smtp_retries, (ConnectionErrors,))
+cloudinary_dependency = _dependency("cloudinary", settings.cloudinary_timeout, settings.cloudinary_retries,
+                                    (GeneralError,))
+
+
+class LocalRateLimits:
+    """
+    Fixed window counters of this worker, with the semantics of FastAPILimiter's Lua script.
+    """
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._windows: Dict[str, Tuple[int, float]] = {}
+
+    def check(self, key: str, times: int, milliseconds: int) -> int:
+        """
+        Counts a request.
+
+        :return: Milliseconds until the window ends if the limit is exceeded, otherwise 0.
+        :rtype: int
+        """
+        now = time.monotonic()
+        count, ends = self._windows.get(key, (0, 0.0))
+        if ends <= now:
+            if len(self._windows) >= self.max_keys:
+                self._windows = {k: window for k, window in self._windows.items() if window[1] > now}
+            self._windows[key] = (1, now + milliseconds / 1000)
+            return 0
+        if count + 1 > times:
+            return max(int((ends - now) * 1000), 1)
+        self._windows[key] = (count + 1, ends)
+        return 0
+
+
+local_rate_limits = LocalRateLimits()
+
+
+class ResilientRateLimiter(RateLimiter):
+    """
+    RateLimiter that counts requests in Redis and falls back to per-worker counters while
+    Redis is unavailable, so the limited routes keep working (with a limit per worker).
+    """
+
+    async def _check(self, key):
+        try:
+            return await redis_dependency.call(self._check_redis, key)
+        except DependencyUnavailable:
+            rate_limit_fallback_total.inc()
+            return local_rate_limits.check(key, self.times, self.milliseconds)
+
+    async def _check_redis(self, key):
+        if FastAPILimiter.lua_sha is None:
+            FastAPILimiter.lua_sha = await FastAPILimiter.redis.script_load(FastAPILimiter.lua_script)
+        try:
+            return await super()._check(key)
+        except NoScriptError:
+            # Redis was restarted and lost the script
+            FastAPILimiter.lua_sha = await FastAPILimiter.redis.script_load(FastAPILimiter.lua_script)
+            return await super()._check(key)
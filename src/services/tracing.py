@@ -0,0 +1,415 @@
+"""
+Lightweight request tracing.
+
+A request gets a root span in TracingMiddleware; spans opened while it is being handled
+(get_current_user, SQL statements, Redis commands, SMTP, Cloudinary) become its children
+through a context variable. Trace context is read from and written to the W3C
+``traceparent`` header. Only sampled requests create spans: for the others every
+instrumentation point costs one context variable lookup.
+
+Finished spans are batched in a background thread and written as OTLP/JSON, either as
+lines of a local file or posted to an OTLP/HTTP collector.
+"""
+import json
+import logging
+import queue
+import random
+import re
+import threading
+import time
+import urllib.request
+from contextvars import ContextVar
+from typing import Dict, List
+
+import redis
+import redis.asyncio
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+MAX_STATEMENT_LENGTH = 1000
+
+_current_span: ContextVar["Span | None"] = ContextVar("current_span", default=None)
+
+
+class Span:
+    """
+    A timed operation of a trace. Used as a context manager it becomes the parent of the spans
+    opened inside it.
+    """
+    sampled = True
+
+    def __init__(self, tracer: "Tracer", name: str, trace_id: int, parent_id: int | None,
+                 attributes: Dict | None = None):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = random.getrandbits(64) or 1
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.error = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self._token = None
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id:032x}-{self.span_id:016x}-01"
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def record_error(self, error: BaseException) -> None:
+        self.error = f"{type(error).__name__}: {error}"
+
+    def end(self) -> None:
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            self.tracer.export(self)
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self._token)
+        if exc is not None:
+            self.record_error(exc)
+        self.end()
+        return False
+
+    def to_otlp(self) -> Dict:
+        span = {"traceId": f"{self.trace_id:032x}", "spanId": f"{self.span_id:016x}", "name": self.name,
+                "kind": 2 if self.parent_id is None else 1,
+                "startTimeUnixNano": str(self.start_ns), "endTimeUnixNano": str(self.end_ns),
+                "attributes": [_otlp_attribute(key, value) for key, value in self.attributes.items()],
+                "status": {"code": 2, "message": self.error} if self.error else {"code": 1}}
+        if self.parent_id is not None:
+            span["parentSpanId"] = f"{self.parent_id:016x}"
+        return span
+
+
+class _NoopSpan:
+    """
+    Stands in for a span outside of sampled traces, so callers never have to check.
+    """
+    sampled = False
+
+    def set_attribute(self, key: str, value) -> None:
+        pass
+
+    def record_error(self, error: BaseException) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def _otlp_attribute(key: str, value) -> Dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def parse_traceparent(header: str | None):
+    """
+    Parses a W3C traceparent header.
+
+    :param header: Value of the header.
+    :type header: str | None
+    :return: (trace_id, parent_span_id, sampled) or None if the header is missing or invalid.
+    :rtype: tuple | None
+    """
+    match = TRACEPARENT.match((header or "").strip().lower())
+    if match is None:
+        return None
+    trace_id, span_id, flags = int(match[1], 16), int(match[2], 16), int(match[3], 16)
+    if not trace_id or not span_id:
+        return None
+    return trace_id, span_id, bool(flags & 1)
+
+
+class FileExporter:
+    """
+    Appends batches of spans to a file, one OTLP/JSON document per line.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def __call__(self, document: Dict) -> None:
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write(json.dumps(document, separators=(",", ":")) + "\n")
+
+
+class OTLPExporter:
+    """
+    Posts batches of spans to an OTLP/HTTP collector in the JSON encoding.
+    """
+
+    def __init__(self, endpoint: str, timeout: float = 5.0):
+        self.endpoint = endpoint
+        self.timeout = timeout
+
+    def __call__(self, document: Dict) -> None:
+        request = urllib.request.Request(self.endpoint, data=json.dumps(document).encode(), method="POST",
+                                         headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+class BatchProcessor:
+    """
+    Collects finished spans in a bounded queue and exports them in batches from a daemon thread.
+
+    When the exporter cannot keep up the queue fills and new spans are dropped, so tracing
+    never slows requests down or grows memory without bound.
+    """
+
+    def __init__(self, exporter, service_name: str, max_queue_size: int = 10000, batch_size: int = 512,
+                 interval: float = 2.0):
+        self.exporter = exporter
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.interval = interval
+        self.dropped = 0
+        self._queue = queue.Queue(max_queue_size)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def submit(self, span: Span) -> None:
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _drain(self) -> List[Span]:
+        spans = []
+        while len(spans) < self.batch_size:
+            try:
+                spans.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return spans
+
+    def _export(self, spans: List[Span]) -> None:
+        document = {"resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", self.service_name)]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": [span.to_otlp() for span in spans]}],
+        }]}
+        try:
+            self.exporter(document)
+        except Exception as err:
+            logger.warning("span export failed: %s", err)
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            while spans := self._drain():
+                self._export(spans)
+
+    def shutdown(self) -> None:
+        """
+        Stops the thread and exports the spans still in the queue.
+        """
+        self._stopped.set()
+        self._thread.join()
+        while spans := self._drain():
+            self._export(spans)
+
+
+class Tracer:
+    """
+    Creates spans and hands finished ones to the processor.
+    """
+
+    def __init__(self, sample_rate: float = 0.0, processor: BatchProcessor | None = None):
+        self.sample_rate = sample_rate
+        self.processor = processor
+
+    @property
+    def enabled(self) -> bool:
+        return self.processor is not None
+
+    def start_trace(self, name: str, traceparent: str | None = None, attributes: Dict | None = None):
+        """
+        Starts the root span of a request, continuing the caller's trace if it sent one.
+
+        The caller's sampling decision is honoured; requests without a trace context are
+        sampled with probability ``sample_rate``.
+
+        :param name: Span name.
+        :type name: str
+        :param traceparent: Incoming traceparent header.
+        :type traceparent: str | None
+        :param attributes: Span attributes.
+        :type attributes: Dict | None
+        :return: The root span, or a no-op span when the request is not sampled.
+        :rtype: Span | _NoopSpan
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        parent = parse_traceparent(traceparent)
+        if parent is not None:
+            trace_id, parent_id, sampled = parent
+        else:
+            trace_id, parent_id, sampled = None, None, random.random() < self.sample_rate
+        if not sampled:
+            return NOOP_SPAN
+        return Span(self, name, trace_id or random.getrandbits(128) or 1, parent_id, attributes)
+
+    def start_span(self, name: str, attributes: Dict | None = None):
+        """
+        Starts a child of the current span without making it current; call ``end()`` on it.
+
+        :param name: Span name.
+        :type name: str
+        :param attributes: Span attributes.
+        :type attributes: Dict | None
+        :return: The span, or a no-op span outside of a sampled trace.
+        :rtype: Span | _NoopSpan
+        """
+        parent = _current_span.get()
+        if parent is None:
+            return NOOP_SPAN
+        return Span(self, name, parent.trace_id, parent.span_id, attributes)
+
+    def span(self, name: str, attributes: Dict | None = None):
+        """
+        Child of the current span to be used as a context manager:
+        ``with tracer.span("cloudinary.upload"): ...``
+        """
+        return self.start_span(name, attributes)
+
+    def export(self, span: Span) -> None:
+        if self.processor is not None:
+            self.processor.submit(span)
+
+    def configure(self, exporter, service_name: str, sample_rate: float) -> None:
+        self.sample_rate = sample_rate
+        self.processor = BatchProcessor(exporter, service_name)
+
+    def shutdown(self) -> None:
+        if self.processor is not None:
+            self.processor.shutdown()
+            self.processor = None
+
+
+tracer = Tracer()
+
+
+def current_span():
+    """
+    Returns the span of the running operation, or a no-op span.
+    """
+    return _current_span.get() or NOOP_SPAN
+
+
+class TracingMiddleware:
+    """
+    Opens the root span of every sampled HTTP request and returns its traceparent header.
+    """
+
+    def __init__(self, app: ASGIApp, tracer: Tracer = tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        span = self.tracer.start_trace(f"{scope['method']} {scope['path']}", headers.get("traceparent"),
+                                       {"http.method": scope["method"], "http.target": scope["path"]})
+        if not span.sampled:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                span.set_attribute("http.status_code", message["status"])
+                span.set_attribute("http.time_to_headers_ms", (time.time_ns() - span.start_ns) / 1e6)
+                MutableHeaders(scope=message)["traceparent"] = span.traceparent
+                route = scope.get("route")
+                if route is not None:
+                    span.name = f"{scope['method']} {route.path}"
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                # background tasks run after this; their spans still belong to the trace
+                span.end()
+
+        with span:
+            await self.app(scope, receive, send_wrapper)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    span = tracer.start_span("db.query")
+    if span.sampled:
+        span.set_attribute("db.system", conn.dialect.name)
+        span.set_attribute("db.statement", statement[:MAX_STATEMENT_LENGTH])
+        context._trace_span = span
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    span = getattr(context, "_trace_span", None)
+    if span is not None:
+        span.set_attribute("db.rows", cursor.rowcount)
+        span.end()
+
+
+def _handle_error(exception_context):
+    context = exception_context.execution_context
+    span = getattr(context, "_trace_span", None)
+    if span is not None:
+        span.record_error(exception_context.original_exception)
+        span.end()
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Records a span for every SQL statement the engine executes.
+
+    :param engine: The engine to instrument.
+    :type engine: Engine
+    :return: None
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+class TracedRedis(redis.Redis):
+    """
+    Redis client that records a span for every command.
+    """
+
+    def execute_command(self, *args, **options):
+        with tracer.span(f"redis {args[0]}", {"db.system": "redis"}):
+            return super().execute_command(*args, **options)
+
+
+class TracedAsyncRedis(redis.asyncio.Redis):
+    """
+    asyncio Redis client that records a span for every command.
+    """
+
+    async def execute_command(self, *args, **options):
+        with tracer.span(f"redis {args[0]}", {"db.system": "redis"}):
+            return await super().execute_command(*args, **options)
@@ -0,0 +1,97 @@
+"""
+In-memory stand-ins for Redis and SMTP, so that tests run without the services.
+
+``FakeRedis`` covers what the application asks of Redis: plain keys with expiry, the
+FastAPILimiter script and publishing of events. ``FakeMailer.send_message`` replaces
+``FastMail.send_message`` and keeps the messages instead of sending them:
+
+    mailer = FakeMailer()
+    monkeypatch.setattr(FastMail, "send_message", mailer.send_message)
+
+For Cloudinary, use ``src.testing.faults.FaultyCall`` with a result in place of the upload.
+"""
+import hashlib
+import time
+from typing import Any, Dict, List, Tuple
+
+from fastapi_limiter import FastAPILimiter
+
+
+class FakeRedis:
+    """
+    Async Redis client keeping the keys of one test in a dict.
+    """
+
+    def __init__(self):
+        self._values: Dict[str, Tuple[Any, float | None]] = {}
+        self._scripts: Dict[str, str] = {}
+        self.published: List[Tuple[str, str]] = []
+
+    def _live(self, key: str) -> Tuple[Any, float | None] | None:
+        entry = self._values.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._values[key]
+            return None
+        return entry
+
+    async def get(self, key: str) -> Any:
+        entry = self._live(key)
+        return entry[0] if entry else None
+
+    async def set(self, key: str, value: Any, ex: float | None = None, px: float | None = None) -> bool:
+        ttl = ex if ex is not None else px / 1000 if px is not None else None
+        self._values[key] = (value, time.monotonic() + ttl if ttl is not None else None)
+        return True
+
+    async def incr(self, key: str) -> int:
+        entry = self._live(key)
+        value = int(entry[0]) + 1 if entry else 1
+        self._values[key] = (value, entry[1] if entry else None)
+        return value
+
+    async def pttl(self, key: str) -> int:
+        entry = self._live(key)
+        if entry is None:
+            return -2
+        return -1 if entry[1] is None else max(int((entry[1] - time.monotonic()) * 1000), 0)
+
+    async def delete(self, *keys: str) -> int:
+        return sum(self._values.pop(key, None) is not None for key in keys)
+
+    async def script_load(self, script: str) -> str:
+        sha = hashlib.sha1(script.encode()).hexdigest()
+        self._scripts[sha] = script
+        return sha
+
+    async def evalsha(self, sha: str, numkeys: int, *args) -> Any:
+        if self._scripts.get(sha) != FastAPILimiter.lua_script:
+            raise NotImplementedError("FakeRedis only runs the FastAPILimiter script")
+        key, limit, expire = args[0], int(args[1]), int(args[2])
+        # the script, step by step
+        current = int(await self.get(key) or 0)
+        if current > 0:
+            if current + 1 > limit:
+                return await self.pttl(key)
+            await self.incr(key)
+            return 0
+        await self.set(key, 1, px=expire)
+        return 0
+
+    async def publish(self, channel: str, message: str) -> int:
+        self.published.append((channel, message))
+        return 0
+
+    async def close(self) -> None:
+        pass
+
+
+class FakeMailer:
+    """
+    Keeps the messages the application sends, with the template they were sent with.
+    """
+
+    def __init__(self):
+        self.outbox: List[Tuple[Any, str | None]] = []
+
+    async def send_message(self, message, template_name: str | None = None) -> None:
+        self.outbox.append((message, template_name))
@@ -0,0 +1,44 @@
+"""
+Local stand-ins for Redis, SMTP and Cloudinary calls that fail on purpose.
+
+A ``FaultyCall`` follows a script, one step per call: ``None`` succeeds, an exception
+instance is raised, a number hangs for that many seconds first. Once the script is used
+up every call succeeds. Use it in place of the real client method:
+
+    upload = FaultyCall(GeneralError("502"), 30.0, result={"version": 1})
+    monkeypatch.setattr(cloudinary.uploader, "upload", upload.sync)
+"""
+import asyncio
+import time
+from typing import Any, List
+
+
+class FaultyCall:
+    """
+    Callable that fails, hangs or succeeds according to a script; see the module docstring.
+    """
+
+    def __init__(self, *script, result: Any = None):
+        self.script: List = list(script)
+        self.result = result
+        self.calls = 0
+
+    def _next(self):
+        self.calls += 1
+        return self.script.pop(0) if self.script else None
+
+    async def __call__(self, *args, **kwargs) -> Any:
+        step = self._next()
+        if isinstance(step, BaseException):
+            raise step
+        if step is not None:
+            await asyncio.sleep(step)
+        return self.result
+
+    def sync(self, *args, **kwargs) -> Any:
+        step = self._next()
+        if isinstance(step, BaseException):
+            raise step
+        if step is not None:
+            time.sleep(step)
+        return self.result
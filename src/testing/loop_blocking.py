@@ -0,0 +1,111 @@
+"""
+Pytest plugin that fails route tests whose handlers block the event loop.
+
+Opt in with ``-p``, optionally setting the threshold in milliseconds:
+
+    python -m pytest -p src.testing.loop_blocking --loop-block-ms 50
+
+While it is loaded, every asyncio callback is timed: a callback (a step of a task, e.g.
+an ``async def`` handler up to its next ``await``) that runs longer than the threshold
+is a blocking call. A watchdog thread records the stack of the loop thread while the
+callback is still running, so the failure shows the blocking line, not just the task.
+Only tests that use the ``client`` fixture are checked; mark a test with
+``@pytest.mark.allow_loop_block`` to let it block.
+"""
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from typing import Dict, List, Tuple
+
+import pytest
+
+_original_run = asyncio.events.Handle._run
+
+
+class BlockDetector:
+    """
+    Times the callbacks of every event loop in the process and records the slow ones.
+    """
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self.blocks: List[Tuple[float, str]] = []
+        # thread id -> (start time, handle, stack captured by the watchdog)
+        self._running: Dict[int, list] = {}
+        self._stopped = threading.Event()
+        self._watchdog = threading.Thread(target=self._watch, name="loop-block-watchdog", daemon=True)
+
+    def install(self) -> None:
+        detector = self
+
+        def _run(handle):
+            entry = [time.perf_counter(), handle, None]
+            thread_id = threading.get_ident()
+            detector._running[thread_id] = entry
+            try:
+                _original_run(handle)
+            finally:
+                detector._running.pop(thread_id, None)
+                duration = time.perf_counter() - entry[0]
+                if duration > detector.threshold:
+                    detector.blocks.append((duration, entry[2] or repr(handle)))
+
+        asyncio.events.Handle._run = _run
+        self._watchdog.start()
+
+    def uninstall(self) -> None:
+        asyncio.events.Handle._run = _original_run
+        self._stopped.set()
+        self._watchdog.join()
+
+    def _watch(self) -> None:
+        while not self._stopped.wait(self.threshold / 4):
+            now = time.perf_counter()
+            for thread_id, entry in list(self._running.items()):
+                if entry[2] is None and now - entry[0] > self.threshold:
+                    frame = sys._current_frames().get(thread_id)
+                    if frame is not None:
+                        entry[2] = "".join(traceback.format_stack(frame))
+
+
+_detector_key = pytest.StashKey[BlockDetector]()
+
+
+def pytest_addoption(parser):
+    parser.addoption("--loop-block-ms", type=float, default=50.0,
+                     help="fail route tests whose handlers block the event loop longer than this")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "allow_loop_block: do not fail the test when it blocks the event loop")
+    detector = BlockDetector(config.getoption("--loop-block-ms") / 1000)
+    detector.install()
+    config.stash[_detector_key] = detector
+
+
+def pytest_unconfigure(config):
+    detector = config.stash.get(_detector_key, None)
+    if detector is not None:
+        detector.uninstall()
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    item.config.stash[_detector_key].blocks.clear()
+    yield
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    outcome = yield
+    report = outcome.get_result()
+    detector = item.config.stash[_detector_key]
+    if report.when != "call" or not report.passed or not detector.blocks:
+        return
+    if "client" in item.fixturenames and item.get_closest_marker("allow_loop_block") is None:
+        blocks = "\n".join(f"blocked for {duration * 1000:.0f} ms at:\n{where}"
+                           for duration, where in detector.blocks)
+        report.outcome = "failed"
+        report.longrepr = f"The event loop was blocked longer than {detector.threshold * 1000:.0f} ms:\n{blocks}"
@@ -1,50 +1,127 @@
+"""
+Shared fixtures: an in-memory database per test process and fakes for the services.
+
+The schema is built once per process. Every test runs in a transaction of its own that
+is rolled back at the end; the code under test commits to a savepoint inside it, so tests
+neither see each other's rows nor depend on their order. With pytest-xdist
+(``pytest -n auto``) each worker process has its own database.
+
+Redis, SMTP and Cloudinary are replaced by the fakes of src.testing, so the suite does
+not need any of the services.
+"""
+import asyncio
+import os
+
+# settings has no default for the Cloudinary key; set it before the application is imported
+os.environ.setdefault("CLOUDINARY_API_KEY", "0")
+# the fewest rounds bcrypt allows; the cost factor is not what the tests are about
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+import cloudinary.uploader
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from fastapi_limiter import FastAPILimiter
+from fastapi_mail import FastMail
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 
 from main import app
-from src.database.models import Base
-from src.database.db import get_db
+from src.database.models import Base, User
+from src.database.db import get_db, get_read_db
+from src.services.auth import auth_service
+from src.testing.fakes import FakeMailer, FakeRedis
+from src.testing.faults import FaultyCall
 
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+@event.listens_for(engine, "connect")
+def _disable_pysqlite_transactions(dbapi_connection, connection_record):
+    # let SQLAlchemy emit BEGIN and SAVEPOINT itself, see "Serializable isolation / Savepoints"
+    # in the SQLAlchemy SQLite documentation
+    dbapi_connection.isolation_level = None
 
-@pytest.fixture(scope="module")
-def session():
-    # Create the database
 
-    Base.metadata.drop_all(bind=engine)
-    Base.metadata.create_all(bind=engine)
+@event.listens_for(engine, "begin")
+def _begin(connection):
+    connection.exec_driver_sql("BEGIN")
+
 
-    db = TestingSessionLocal()
+Base.metadata.create_all(bind=engine)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False)
+
+
+@pytest.fixture()
+def session():
+    connection = engine.connect()
+    transaction = connection.begin()
+    db = TestingSessionLocal(bind=connection, join_transaction_mode="create_savepoint")
     try:
         yield db
     finally:
         db.close()
+        transaction.rollback()
+        connection.close()
+
+
+@pytest.fixture()
+def redis(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(FastAPILimiter, "redis", None)
+    monkeypatch.setattr(FastAPILimiter, "lua_sha", None)
+    asyncio.run(FastAPILimiter.init(fake))
+    return fake
 
 
-@pytest.fixture(scope="module")
-def client(session):
+@pytest.fixture()
+def mailer(monkeypatch):
+    fake = FakeMailer()
+    monkeypatch.setattr(FastMail, "send_message", fake.send_message)
+    return fake
+
+
+@pytest.fixture()
+def cloudinary_upload(monkeypatch):
+    upload = FaultyCall(result={"version": 1})
+    monkeypatch.setattr(cloudinary.uploader, "upload", upload.sync)
+    return upload
+
+
+@pytest.fixture()
+def client(session, redis, mailer, cloudinary_upload):
     # Dependency override
 
     def override_get_db():
-        try:
-            yield session
-        finally:
-            session.close()
+        yield session
 
     app.dependency_overrides[get_db] = override_get_db
-
-    yield TestClient(app)
+    app.dependency_overrides[get_read_db] = override_get_db
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.clear()
 
 
-@pytest.fixture(scope="module")
+@pytest.fixture()
 def user():
-    return {"username": "deadpool", "email": "deadpool@example.com", "password": "123456789"}
\ No newline at end of file
+    return {"username": "deadpool", "email": "deadpool@example.com", "password": "123456789"}
+
+
+@pytest.fixture()
+def confirmed_user(session, user):
+    """
+    The ``user`` signed up and confirmed, stored in the test's transaction.
+    """
+    db_user = User(username=user["username"], email=user["email"],
+                   password=auth_service.get_password_hash(user["password"]), confirmed=True)
+    session.add(db_user)
+    session.commit()
+    return db_user
+
+
+@pytest.fixture()
+def auth_headers(confirmed_user):
+    token = asyncio.run(auth_service.create_access_token(data={"sub": confirmed_user.email}))
+    return {"Authorization": f"Bearer {token}"}
@@ -0,0 +1,107 @@
+import asyncio
+from datetime import date, datetime, time, timedelta
+
+import pytest
+
+from src.database.models import Contact, User
+from src.repository import contact_rows
+from src.repository import contacts as repository_contacts
+from src.repository.birthdays import get_upcoming, rebuild_snapshot
+from src.schemas import ContactModel
+from src.services.birthday_snapshot import rebuild_if_due
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def born(days: int) -> date:
+    # a leap year, so that the 29th of February has a birthday too
+    return (date.today() + timedelta(days=days)).replace(year=1992)
+
+
+@pytest.fixture()
+def contacts(session, confirmed_user):
+    other = User(username="other", email="other@example.com", password="secret")
+    session.add(other)
+    session.flush()
+    rows = [Contact(first_name=f"Contact{days}", last_name="Koval", email=f"contact{days}@example.com",
+                    birthday=born(days), birth_month=born(days).month, birth_day=born(days).day,
+                    user_id=user.id)
+            for user in (confirmed_user, other) for days in (0, 1, 4, 8, 9, 200)]
+    session.add_all(rows)
+    session.commit()
+    return [row for row in rows if row.user_id == confirmed_user.id]
+
+
+def upcoming_ids(user, db):
+    return sorted(row.id for row in run(get_upcoming(user, db, ["id"])))
+
+
+def live_ids(user, db):
+    return sorted(row.id for row in run(contact_rows.birthdays(user, db, ["id"])))
+
+
+def test_snapshot_matches_the_live_query(session, confirmed_user, contacts):
+    rebuild_snapshot(session)
+    assert upcoming_ids(confirmed_user, session) == live_ids(confirmed_user, session) == \
+           sorted(contact.id for contact in contacts[1:4])
+
+
+def test_writes_keep_the_snapshot_current(session, confirmed_user, contacts):
+    rebuild_snapshot(session)
+    body = ContactModel(first_name="New", last_name="Koval", email="new@example.com", phone="0939090900",
+                        birthday=born(2))
+    run(repository_contacts.create_contact(body, confirmed_user, session))
+    moved = ContactModel(first_name="Moved", last_name="Koval", email=contacts[1].email, phone="0939090901",
+                         birthday=born(30))
+    run(repository_contacts.update_contact(contacts[1].id, moved, confirmed_user, session))
+    closer = ContactModel(first_name="Closer", last_name="Koval", email=contacts[4].email, phone="0939090902",
+                          birthday=born(3))
+    run(repository_contacts.update_contact(contacts[4].id, closer, confirmed_user, session))
+    run(repository_contacts.remove_contact(contacts[2].id, confirmed_user, session))
+    assert upcoming_ids(confirmed_user, session) == live_ids(confirmed_user, session)
+    assert len(upcoming_ids(confirmed_user, session)) == 3
+
+
+@pytest.mark.parametrize("today, upcoming", [(date(2027, 2, 25), True), (date(2027, 2, 20), False),
+                                             (date(2027, 2, 28), True), (date(2027, 3, 1), False),
+                                             (date(2028, 2, 21), True), (date(2028, 2, 20), False),
+                                             (date(2028, 3, 5), False), (date(2028, 12, 31), False)])
+def test_leap_day_birthdays_fall_on_the_first_of_march(session, confirmed_user, today, upcoming):
+    leap_day = Contact(first_name="Leap", last_name="Koval", email="leap@example.com", birthday=date(2000, 2, 29),
+                       birth_month=2, birth_day=29, user_id=confirmed_user.id)
+    session.add(leap_day)
+    session.commit()
+    rebuild_snapshot(session, today)
+    ids = [row.id for row in run(get_upcoming(confirmed_user, session, ["id"], today=today))]
+    assert ids == ([leap_day.id] if upcoming else [])
+    # the live query counts it the same way
+    assert contact_rows.is_upcoming(leap_day.birthday, datetime.combine(today, time(12))) == upcoming
+
+    # and so do the writes that patch the snapshot
+    run(repository_contacts.remove_contact(leap_day.id, confirmed_user, session))
+    body = ContactModel(first_name="Leap", last_name="Again", email="again@example.com", phone="0939090903",
+                        birthday=date(1996, 2, 29))
+    again = run(repository_contacts.create_contact(body, confirmed_user, session))
+    ids = [row.id for row in run(get_upcoming(confirmed_user, session, ["id"], today=today))]
+    assert ids == ([again.id] if upcoming else [])
+
+
+def test_snapshot_is_not_rebuilt_twice_a_day(session, confirmed_user, contacts):
+    assert rebuild_if_due(session) == 6
+    assert rebuild_if_due(session) is None
+    assert rebuild_if_due(session, force=True) == 6
+    assert rebuild_if_due(session, today=date.today() + timedelta(days=1)) is not None
+
+
+@pytest.mark.parametrize("fields", [None, "first_name,birthday"])
+def test_route_answers_the_same_from_the_snapshot(client, session, auth_headers, contacts, fields):
+    params = {"fields": fields} if fields else {}
+    live = client.get("/api/contacts/birthdays/", headers=auth_headers, params=params)
+    rebuild_snapshot(session)
+    snapshot = client.get("/api/contacts/birthdays/", headers=auth_headers, params=params)
+    assert snapshot.status_code == live.status_code == 200
+    assert sorted(snapshot.json(), key=lambda contact: contact["id"]) == \
+           sorted(live.json(), key=lambda contact: contact["id"])
+    assert len(snapshot.json()) == 3
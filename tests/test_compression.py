@@ -0,0 +1,92 @@
+import gzip
+import zlib
+
+import anyio
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from src.middleware.compression import CompressionMiddleware, negotiate
+
+PAYLOAD = "contact," * 1000
+
+app = FastAPI()
+app.add_middleware(CompressionMiddleware, minimum_size=500, offload_size=4000, encodings=["gzip"])
+
+
+@app.get("/large")
+def large():
+    return PlainTextResponse(PAYLOAD)
+
+
+@app.get("/small")
+def small():
+    return PlainTextResponse("contact")
+
+
+def chunks():
+    for _ in range(10):
+        yield PAYLOAD
+
+
+stream = StreamingResponse(chunks(), media_type="text/plain")
+
+
+client = TestClient(app)
+
+
+def raw_get(path, accept_encoding="gzip"):
+    with client.stream("GET", path, headers={"Accept-Encoding": accept_encoding}) as response:
+        return response, b"".join(response.iter_raw())
+
+
+def test_large_body_is_compressed():
+    response, body = raw_get("/large")
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["content-length"] == str(len(body))
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert gzip.decompress(body).decode() == PAYLOAD
+
+
+def test_small_body_is_not_compressed():
+    response, body = raw_get("/small")
+    assert "content-encoding" not in response.headers
+    assert body == b"contact"
+
+
+def test_client_without_gzip_gets_identity():
+    response, body = raw_get("/large", accept_encoding="identity")
+    assert "content-encoding" not in response.headers
+    assert body.decode() == PAYLOAD
+
+
+def test_streaming_body_is_compressed_incrementally():
+    messages = []
+
+    async def receive():
+        await anyio.sleep_forever()
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/stream", "raw_path": b"/stream", "query_string": b"",
+             "root_path": "", "scheme": "http", "server": ("testserver", 80), "client": ("testclient", 50000),
+             "http_version": "1.1", "headers": [(b"accept-encoding", b"gzip")]}
+    anyio.run(CompressionMiddleware(stream, minimum_size=500, encodings=["gzip"]), scope, receive, send)
+
+    headers = dict(messages[0]["headers"])
+    assert headers[b"content-encoding"] == b"gzip"
+    assert b"content-length" not in headers
+    bodies = [message["body"] for message in messages[1:]]
+    decompressor = zlib.decompressobj(31)
+    # every chunk can be decoded on arrival, nothing is held back until the end
+    for body in bodies[:10]:
+        assert decompressor.decompress(body).decode() == PAYLOAD
+    assert decompressor.decompress(b"".join(bodies[10:])) + decompressor.flush() == b""
+
+
+def test_negotiate_respects_q_values():
+    assert negotiate("gzip;q=0.5, br", ["br", "gzip"]) == "br"
+    assert negotiate("gzip, br;q=0.1", ["br", "gzip"]) == "gzip"
+    assert negotiate("br;q=0", ["br"]) is None
+    assert negotiate("*", ["zstd", "gzip"]) == "zstd"
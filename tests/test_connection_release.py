@@ -0,0 +1,49 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+
+from main import app
+from src.database.db import get_read_db
+from src.database.models import Base, User
+from src.repository import contact_rows
+
+
+@pytest.fixture()
+def pooled(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=QueuePool, pool_size=1, max_overflow=0)
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.mark.parametrize("path", ["/api/contacts/contacts/", "/api/contacts/birthdays/",
+                                  "/api/contacts/last_name/Koval"])
+def test_connection_is_back_in_the_pool_before_the_response_is_serialized(client, auth_headers, confirmed_user,
+                                                                          pooled, monkeypatch, path):
+    sessions = sessionmaker(bind=pooled, autoflush=False, expire_on_commit=False)
+    with sessions() as db:
+        # the user is authenticated through the read session as well
+        db.add(User(id=confirmed_user.id, username=confirmed_user.username, email=confirmed_user.email,
+                    password=confirmed_user.password, confirmed=True))
+        db.commit()
+
+    def read_db():
+        db = sessions()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_read_db] = read_db
+    checked_out = []
+    serialize = contact_rows.contacts_json
+
+    def contacts_json(rows, fields=None):
+        checked_out.append(pooled.pool.checkedout())
+        return serialize(rows, fields)
+
+    monkeypatch.setattr(contact_rows, "contacts_json", contacts_json)
+    response = client.get(path, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert checked_out == [0]
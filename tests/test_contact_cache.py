@@ -0,0 +1,165 @@
+import json
+import time
+import unittest
+from datetime import date, timedelta
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.database.models import Base, Contact, User
+from src.repository import contact_rows
+from src.repository import contacts as repository_contacts
+from src.schemas import ContactModel
+from src.services.contact_cache import ContactCache, ContactSnapshot
+from src.services.events import RESYNC, event_bus
+
+ROWS = [(3, "Taras", "Koval", "t@example.com", "0670000003", date(2000, 5, 1)),
+        (1, "Olena", "Bondar", "o@example.com", "0670000001", None)]
+
+
+def event(kind, version, contact_id, **contact):
+    result = {"type": kind, "contact_id": contact_id, "version": version}
+    if kind != "deleted":
+        result["contact"] = {"id": contact_id, "first_name": "New", "last_name": "Koval", "email": "n@example.com",
+                             "phone": None, "birthday": None, **contact}
+    return result
+
+
+class TestContactCache(unittest.TestCase):
+
+    def test_snapshot_is_columnar_and_sorted(self):
+        snapshot = ContactSnapshot(1, 7, ROWS)
+        self.assertEqual(list(snapshot.ids), [1, 3])
+        self.assertEqual(snapshot.rows(snapshot.page(0, 10), ["id", "birthday"]), [(1, None), (3, date(2000, 5, 1))])
+        self.assertEqual(snapshot.rows(snapshot.search("last_name", "Koval")), [ROWS[0]])
+
+    def test_events_patch_ignore_or_drop_the_snapshot(self):
+        cache = ContactCache(max_bytes=10 ** 6, max_contacts=100)
+        cache.put(ContactSnapshot(1, 7, ROWS))
+        cache.apply(1, event("created", 8, 2, birthday="1990-01-02"))
+        snapshot = cache.get(1)
+        self.assertEqual(list(snapshot.ids), [1, 2, 3])
+        self.assertEqual(snapshot.rows([1], ["birthday"]), [(date(1990, 1, 2),)])
+        cache.apply(1, event("updated", 9, 3, first_name="Petro"))
+        cache.apply(1, event("deleted", 10, 1))
+        cache.apply(1, event("updated", 9, 3, first_name="stale"))  # echo of an applied event
+        self.assertEqual(snapshot.rows(snapshot.page(0, 10), ["id", "first_name"]), [(2, "New"), (3, "Petro")])
+        self.assertEqual(snapshot.version, 10)
+
+        cache.apply(1, event("deleted", 12, 2))  # version 11 was missed
+        self.assertIsNone(cache.get(1))
+
+    def test_resync_drops_every_snapshot(self):
+        cache = ContactCache(max_bytes=10 ** 6, max_contacts=100)
+        cache.put(ContactSnapshot(1, 7, ROWS))
+        cache.put(ContactSnapshot(2, 3, ROWS))
+        cache.apply(None, RESYNC)
+        self.assertEqual((cache.get(1), cache.get(2), cache.nbytes), (None, None, 0))
+
+    def test_oversized_users_are_forgotten(self):
+        cache = ContactCache(max_bytes=10 ** 6, max_contacts=100)
+        for user_id in (1, 2, 3):
+            cache.mark_oversized(user_id)
+        cache.apply(1, event("updated", 8, 1))
+        cache.apply(2, event("deleted", 8, 1))
+        cache.invalidate(3)
+        self.assertEqual([cache.is_oversized(user_id) for user_id in (1, 2, 3)], [True, False, False])
+        cache.apply(None, RESYNC)
+        self.assertFalse(cache.is_oversized(1))
+
+    def test_snapshot_older_than_a_seen_event_is_not_cached(self):
+        cache = ContactCache(max_bytes=10 ** 6, max_contacts=100)
+        cache.apply(1, event("deleted", 8, 1))
+        cache.put(ContactSnapshot(1, 7, ROWS))  # e.g. read from a lagging replica
+        self.assertIsNone(cache.get(1))
+
+    def test_lru_eviction_within_memory_bound(self):
+        size = ContactSnapshot(1, 0, ROWS).nbytes
+        cache = ContactCache(max_bytes=size * 2, max_contacts=100)
+        for user_id in (1, 2):
+            cache.put(ContactSnapshot(user_id, 0, ROWS))
+        cache.get(1)
+        cache.put(ContactSnapshot(3, 0, ROWS))
+        self.assertIsNotNone(cache.get(1))
+        self.assertIsNone(cache.get(2))
+        self.assertEqual(cache.nbytes, size * 2)
+
+    def test_expired_snapshot_is_read_again(self):
+        cache = ContactCache(max_bytes=10 ** 6, max_contacts=100, ttl=0.01)
+        cache.put(ContactSnapshot(1, 7, ROWS))
+        time.sleep(0.02)
+        self.assertIsNone(cache.get(1))
+
+
+class TestCachedReads(unittest.IsolatedAsyncioTestCase):
+    """
+    Reads served from the snapshot return what the database returns, writes included.
+    """
+
+    def setUp(self):
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine, expire_on_commit=False)()
+        self.user = User(id=1, username="cache", email="cache@example.com", password="secret")
+        soon = (date.today() + timedelta(days=3)).replace(year=2000)
+        self.session.add_all([self.user] + [
+            Contact(first_name=f"Name{i}", last_name="Koval" if i % 2 else "Bondar", email=f"c{i}@example.com",
+                    phone=f"06700000{i:02d}", birthday=soon if i % 3 == 0 else None, user_id=1)
+            for i in range(10)])
+        self.session.commit()
+        self.cache = ContactCache(max_bytes=10 ** 6, max_contacts=100)
+        for module in (contact_rows, repository_contacts):
+            patcher = patch.object(module, "contact_cache", self.cache)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.session.close()
+
+    async def reads(self):
+        # without ORDER BY the database returns the page in the order of whichever index serves it
+        return [sorted(json.loads(contact_rows.contacts_json(rows)), key=lambda contact: contact["id"]) for rows in (
+            await contact_rows.get_contacts(0, 100, self.user, self.session),
+            await contact_rows.query_search("last_name", "Koval", self.user, self.session),
+            await contact_rows.birthdays(self.user, self.session))]
+
+    async def uncached_reads(self):
+        self.cache.enabled = False
+        try:
+            return await self.reads()
+        finally:
+            self.cache.enabled = True
+
+    async def test_reads_match_the_database(self):
+        cached = await self.reads()
+        self.assertIsNotNone(self.cache.get(1))
+        self.assertEqual(cached, await self.uncached_reads())
+
+    async def test_writes_patch_the_snapshot(self):
+        await self.reads()
+        body = ContactModel(first_name="Ivan", last_name="Koval", email="ivan@example.com", phone="0671234567",
+                            birthday=date.today() + timedelta(days=1))
+        with patch.object(event_bus, "publish"):
+            created = await repository_contacts.create_contact(body, self.user, self.session)
+            await repository_contacts.update_contact(2, body.copy(update={"email": "i2@example.com",
+                                                                          "phone": "0671234568"}),
+                                                     self.user, self.session)
+            await repository_contacts.remove_contact(4, self.user, self.session)
+        snapshot = self.cache.get(1)
+        self.assertIn(created.id, snapshot.ids)
+        self.assertNotIn(4, snapshot.ids)
+        self.assertEqual(await self.reads(), await self.uncached_reads())
+
+    async def test_users_over_the_limit_are_not_cached(self):
+        self.cache.max_contacts = 5
+        await self.reads()
+        self.assertTrue(self.cache.is_oversized(1))
+        self.assertEqual(self.cache.nbytes, 0)
+        with patch.object(event_bus, "publish"):
+            for contact_id in range(1, 6):
+                await repository_contacts.remove_contact(contact_id, self.user, self.session)
+        self.assertFalse(self.cache.is_oversized(1))
+        self.assertEqual(await self.reads(), await self.uncached_reads())
+        self.assertEqual(len(self.cache.get(1)), 5)
@@ -0,0 +1,94 @@
+import asyncio
+from datetime import date
+
+import pytest
+
+from src.database.models import Contact
+from src.services.events import RESYNC, EventBus, SubscriptionLimitError, contact_event
+from src.testing.faults import FaultyCall
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def make_bus(**kwargs):
+    options = {"max_connections": 10, "max_connections_per_user": 2, "queue_size": 3}
+    options.update(kwargs)
+    return EventBus(**options)
+
+
+def test_events_reach_only_subscribers_of_the_user():
+    async def scenario():
+        bus = make_bus()
+        mine, other = bus.subscribe(1), bus.subscribe(2)
+        bus.publish(1, {"type": "created", "version": 5})
+        assert await mine.get(0.1) == {"type": "created", "version": 5}
+        assert await other.get(0.01) is None
+
+    run(scenario())
+
+
+def test_connection_limits():
+    async def scenario():
+        bus = make_bus(max_connections=3)
+        first = bus.subscribe(1)
+        bus.subscribe(1)
+        with pytest.raises(SubscriptionLimitError) as err:
+            bus.subscribe(1)
+        assert err.value.per_user
+        bus.subscribe(2)
+        with pytest.raises(SubscriptionLimitError) as err:
+            bus.subscribe(3)
+        assert not err.value.per_user
+        first.close()
+        first.close()
+        assert bus.connections == 2
+        bus.subscribe(3)
+
+    run(scenario())
+
+
+def test_slow_subscriber_gets_resync():
+    async def scenario():
+        bus = make_bus()
+        subscription = bus.subscribe(1)
+        for version in range(10):
+            bus.publish(1, {"type": "updated", "version": version})
+        assert await subscription.get(0.1) == RESYNC
+        assert await subscription.get(0.01) is None
+        bus.publish(1, {"type": "deleted", "version": 11})
+        assert await subscription.get(0.1) == {"type": "deleted", "version": 11}
+
+    run(scenario())
+
+
+class FailingRedis:
+    publish = FaultyCall(ConnectionError("connection refused"))
+
+    def pubsub(self):
+        raise ConnectionError("connection refused")
+
+
+def test_redis_failures_are_logged(caplog):
+    async def scenario():
+        bus = make_bus()
+        await bus.start(FailingRedis())
+        bus.publish(1, {"type": "created", "version": 5})
+        await asyncio.sleep(0.05)
+        await bus.stop()
+        return bus
+
+    assert run(scenario()).dropped == 1
+    assert "event publish failed: connection refused" in caplog.text
+    assert "event subscription failed" in caplog.text
+
+
+def test_contact_event():
+    contact = Contact(id=7, first_name="Kate", last_name="Duka", email="kate@example.com", phone=None,
+                      birthday=date(2000, 6, 7))
+    assert contact_event("updated", contact, 12) == {
+        "type": "updated", "contact_id": 7, "version": 12,
+        "contact": {"id": 7, "first_name": "Kate", "last_name": "Duka", "email": "kate@example.com",
+                    "phone": None, "birthday": "2000-06-07"}}
+    assert contact_event("deleted", contact, 13) == {"type": "deleted", "contact_id": 7, "version": 13}
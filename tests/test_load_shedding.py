@@ -0,0 +1,112 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from src.middleware.load_shedding import AdaptiveLimiter, LoadSheddingMiddleware, route_group
+
+
+@pytest.mark.parametrize("method, path, group", [
+    ("POST", "/api/auth/login", "auth"),
+    ("GET", "/api/contacts/1", "reads"),
+    ("GET", "/api/contacts/batch/", "reads"),
+    ("GET", "/api/contacts/duplicates", "heavy"),
+    ("GET", "/api/contacts/filter/", "heavy"),
+    ("PUT", "/api/contacts/1", "writes"),
+    ("POST", "/api/contacts/create/", "writes"),
+    ("PATCH", "/api/users/avatar", "uploads"),
+    ("GET", "/api/contacts/events", None),
+    ("OPTIONS", "/api/contacts/1", None),
+    ("GET", "/metrics", None),
+])
+def test_route_group(method, path, group):
+    assert route_group(method, path) == group
+
+
+def test_slow_requests_cut_the_limit_once_per_generation():
+    limiter = AdaptiveLimiter("test", limit=10, latency_target=0.1)
+    started = time.monotonic()
+    limiter.in_flight = 3
+    limiter.release(0.5, started)
+    limiter.release(0.5, started)
+    assert limiter.limit == 9
+    limiter.release(0.5, time.monotonic())
+    assert limiter.limit == pytest.approx(8.1)
+
+
+def test_fast_requests_raise_the_limit_only_when_it_is_used():
+    limiter = AdaptiveLimiter("test", limit=10, latency_target=0.1, max_limit=11)
+    limiter.in_flight = 1
+    limiter.release(0.01, time.monotonic())
+    assert limiter.limit == 10
+    for _ in range(20):
+        limiter.in_flight = 6
+        limiter.release(0.01, time.monotonic())
+    assert limiter.limit == 11
+
+
+def test_queue_hands_over_slots_and_times_out():
+    async def scenario():
+        limiter = AdaptiveLimiter("test", limit=1, latency_target=1, max_limit=1, queue_size=1,
+                                  queue_timeout=0.05)
+        assert await limiter.acquire()
+        waiting = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        assert not await limiter.acquire()  # queue full
+        limiter.release(0.01, time.monotonic())
+        assert await waiting
+        assert limiter.in_flight == 1
+        assert not await limiter.acquire()  # timed out in the queue
+        assert limiter.in_flight == 1
+
+    asyncio.run(scenario())
+
+
+def make_app(limiter: AdaptiveLimiter) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(LoadSheddingMiddleware, limiters={"reads": limiter}, retry_after=2)
+
+    @app.get("/api/contacts/{contact_id}")
+    async def contact(contact_id: int):
+        await asyncio.sleep(0.1)
+        return {"id": contact_id}
+
+    return app
+
+
+def test_sheds_requests_over_the_limit():
+    async def scenario():
+        transport = httpx.ASGITransport(app=make_app(limiter))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*[client.get(f"/api/contacts/{i}") for i in range(5)])
+
+    limiter = AdaptiveLimiter("reads", limit=2, latency_target=1, queue_size=1, queue_timeout=0.01)
+    responses = asyncio.run(scenario())
+    statuses = sorted(response.status_code for response in responses)
+    assert statuses == [200, 200, 503, 503, 503]
+    rejected = next(response for response in responses if response.status_code == 503)
+    assert rejected.headers["Retry-After"] == "2"
+    assert limiter.in_flight == 0
+
+
+def test_slow_heavy_reads_do_not_cut_the_reads_limit():
+    reads = AdaptiveLimiter("reads", limit=8, latency_target=0.01)
+    heavy = AdaptiveLimiter("heavy", limit=2, latency_target=1)
+    app = FastAPI()
+    app.add_middleware(LoadSheddingMiddleware, limiters={"reads": reads, "heavy": heavy})
+
+    @app.get("/api/contacts/duplicates")
+    async def duplicates():
+        await asyncio.sleep(0.05)
+        return []
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/api/contacts/duplicates")
+
+    assert asyncio.run(scenario()).status_code == 200
+    assert reads.limit == 8
+    assert heavy.limit >= 2  # in time for the heavy target
@@ -0,0 +1,44 @@
+from pathlib import Path
+
+pytest_plugins = ["pytester"]
+
+TESTS = """
+import asyncio
+import time
+
+import pytest
+
+
+@pytest.fixture()
+def client():
+    return None
+
+
+async def handler():
+    time.sleep(0.2)
+
+
+def test_blocking_handler(client):
+    asyncio.run(handler())
+
+
+def test_awaiting_handler(client):
+    asyncio.run(asyncio.sleep(0.2))
+
+
+@pytest.mark.allow_loop_block
+def test_allowed_to_block(client):
+    asyncio.run(handler())
+
+
+def test_without_client():
+    asyncio.run(handler())
+"""
+
+
+def test_blocking_route_tests_fail(pytester, monkeypatch):
+    monkeypatch.setenv("PYTHONPATH", str(Path(__file__).parent.parent))
+    pytester.makepyfile(TESTS)
+    result = pytester.runpytest_subprocess("-p", "src.testing.loop_blocking", "--loop-block-ms", "50")
+    result.assert_outcomes(passed=3, failed=1)
+    result.stdout.fnmatch_lines(["*test_blocking_handler*", "*blocked for * ms at:*", "*time.sleep(0.2)*"])
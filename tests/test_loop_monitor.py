@@ -0,0 +1,73 @@
+import asyncio
+import logging
+import time
+
+from fastapi.testclient import TestClient
+
+from main import app
+from src.services.loop_monitor import LoopMonitor, blocked_total, lag_gauge
+from src.services.metrics import Registry
+from src.testing.loop_blocking import BlockDetector
+
+
+def block_the_loop(seconds: float) -> None:
+    time.sleep(seconds)
+
+
+async def run_blocking(monitor: LoopMonitor, seconds: float) -> None:
+    monitor.start()
+    await asyncio.sleep(0.05)
+    block_the_loop(seconds)
+    await asyncio.sleep(0.05)
+    await monitor.stop()
+
+
+def test_monitor_measures_lag():
+    blocked = blocked_total.value()
+    asyncio.run(run_blocking(LoopMonitor(interval=0.01, threshold=0.05), 0.2))
+    assert blocked_total.value() == blocked + 1
+    assert lag_gauge.value() < 0.05
+
+
+def test_monitor_logs_blocking_stack_in_debug(caplog):
+    with caplog.at_level(logging.WARNING, logger="src.services.loop_monitor"):
+        asyncio.run(run_blocking(LoopMonitor(interval=0.01, threshold=0.05, debug=True), 0.3))
+    [record] = caplog.records
+    assert "Event loop blocked" in record.message
+    assert "block_the_loop" in record.message
+
+
+def test_registry_renders_prometheus_text():
+    registry = Registry()
+    registry.counter("requests_total", "Requests.", labels=["route"]).inc(route="/contacts")
+    histogram = registry.histogram("latency_seconds", "Latency.", [0.1, 1.0])
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    lines = registry.render().splitlines()
+    assert "# TYPE requests_total counter" in lines
+    assert 'requests_total{route="/contacts"} 1' in lines
+    assert 'latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 2' in lines
+    assert "latency_seconds_count 2" in lines
+
+
+def test_metrics_endpoint():
+    response = TestClient(app).get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE event_loop_lag_seconds gauge" in response.text
+
+
+def test_block_detector_records_blocking_stack():
+    async def handler():
+        block_the_loop(0.2)
+
+    detector = BlockDetector(threshold=0.05)
+    detector.install()
+    try:
+        asyncio.run(handler())
+    finally:
+        detector.uninstall()
+    [(duration, stack)] = detector.blocks
+    assert duration >= 0.2
+    assert "block_the_loop" in stack
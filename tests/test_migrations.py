@@ -0,0 +1,53 @@
+from pathlib import Path
+
+import pytest
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, inspect
+
+from src.database import db
+from src.database.models import Base
+
+ROOT = Path(__file__).parent.parent
+# the revision before the per-user contacts indexes of 5f3a9c1e7b20
+BEFORE_PER_USER_INDEXES = "22e080f764fc"
+PER_USER_INDEXES = {"ix_contacts_user_id_id", "ix_contacts_user_id_last_name_first_name", "ix_contacts_user_id_email",
+                    "ix_contacts_user_id_phone", "ix_contacts_user_id_birthday"}
+SINGLE_COLUMN_INDEXES = {"ix_contacts_birthday", "ix_contacts_email", "ix_contacts_first_name", "ix_contacts_id",
+                         "ix_contacts_last_name", "ix_contacts_phone"}
+
+
+@pytest.fixture()
+def alembic_config(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'migrations.db'}"
+    # migrations/env.py takes the URL from src.database.db
+    monkeypatch.setattr(db, "SQLALCHEMY_DATABASE_URL", url)
+    # no ini file, so that env.py leaves the logging configuration alone
+    config = Config()
+    config.set_main_option("script_location", str(ROOT / "migrations"))
+    engine = create_engine(url)
+    # the early revisions alter constraints, which SQLite can not: start from the models at head
+    Base.metadata.create_all(engine)
+    command.stamp(config, "head")
+    yield config, engine
+    engine.dispose()
+
+
+def contacts_indexes(engine):
+    return {index["name"]: index for index in inspect(engine).get_indexes("contacts")}
+
+
+def test_per_user_indexes_downgrade_and_upgrade(alembic_config):
+    config, engine = alembic_config
+    command.downgrade(config, BEFORE_PER_USER_INDEXES)
+    indexes = contacts_indexes(engine)
+    assert SINGLE_COLUMN_INDEXES <= set(indexes)
+    assert not PER_USER_INDEXES & set(indexes)
+
+    command.upgrade(config, "head")
+    indexes = contacts_indexes(engine)
+    assert PER_USER_INDEXES <= set(indexes)
+    assert not SINGLE_COLUMN_INDEXES & set(indexes)
+    assert indexes["ix_contacts_user_id_email"]["column_names"] == ["user_id", "email"]
+    assert indexes["ix_contacts_user_id_email"]["unique"]
+    assert indexes["ix_contacts_user_id_phone"]["unique"]
@@ -0,0 +1,41 @@
+from passlib.context import CryptContext
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from src.cli import password_cost
+from src.cli.password_cost import calibrate, rounds_distribution
+from src.database.models import Base, User
+from src.services.auth import hash_rounds
+
+
+def test_hash_rounds():
+    assert hash_rounds(CryptContext(schemes=["bcrypt"], bcrypt__rounds=5).hash("secret")) == 5
+    assert hash_rounds("$2b$12$") == 12
+    assert hash_rounds("plain text") is None
+
+
+def test_calibrate_stops_at_the_first_cost_over_the_target(monkeypatch):
+    # every round doubles the time: 2 ** 13 / 100 = 82 ms, 2 ** 14 / 100 = 164 ms
+    monkeypatch.setattr(password_cost, "time_hash", lambda rounds, samples: 2 ** rounds / 100)
+    rounds, timings = calibrate(target_ms=100, samples=1)
+    assert rounds == 13
+    assert [cost for cost, _ in timings] == list(range(4, 15))
+
+
+def test_calibrate_times_real_hashes():
+    rounds, timings = calibrate(target_ms=0.0, samples=1)
+    assert rounds == 4
+    assert len(timings) == 1 and timings[0][1] > 0
+
+
+def test_rounds_distribution(tmp_path):
+    url = f"sqlite:///{tmp_path / 'users.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    hashes = [CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds).hash("secret") for rounds in (4, 4, 5)]
+    with Session(engine) as db:
+        db.add_all([User(username=f"user{i}", email=f"user{i}@example.com", password=password)
+                    for i, password in enumerate(hashes + ["not a hash"])])
+        db.commit()
+    engine.dispose()
+    assert rounds_distribution(url) == {4: 2, 5: 1, None: 1}
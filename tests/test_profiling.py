@@ -0,0 +1,52 @@
+import json
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.middleware.profiling import ProfilingMiddleware
+
+
+def busy_work(seconds: float) -> int:
+    deadline, count = time.perf_counter() + seconds, 0
+    while time.perf_counter() < deadline:
+        count += 1
+    return count
+
+
+@pytest.fixture()
+def client(tmp_path):
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware, directory=str(tmp_path), token="let-me-profile")
+
+    @app.get("/contacts/{contact_id}")
+    async def contact(contact_id: int):
+        return {"id": contact_id, "count": busy_work(0.05)}
+
+    client = TestClient(app)
+    client.directory = tmp_path
+    return client
+
+
+def test_profiles_request_with_token(client):
+    response = client.get("/contacts/1", headers={"X-Profile": "let-me-profile"})
+    assert response.status_code == 200
+    profile_id = response.headers["X-Profile-Id"]
+    [path] = client.directory.iterdir()
+    assert path.name.startswith(f"{profile_id}-GET-contacts_contact_id-")
+    assert path.name.endswith("ms.speedscope.json")
+    document = json.loads(path.read_text())
+    profile = document["profiles"][0]
+    assert profile["type"] == "sampled" and profile["samples"]
+    assert len(profile["samples"]) == len(profile["weights"])
+    names = {document["shared"]["frames"][index]["name"] for sample in profile["samples"] for index in sample}
+    assert "busy_work" in names
+
+
+@pytest.mark.parametrize("headers", [{}, {"X-Profile": "wrong"}])
+def test_does_not_profile_without_token(client, headers):
+    response = client.get("/contacts/1", headers=headers)
+    assert response.status_code == 200
+    assert "X-Profile-Id" not in response.headers
+    assert list(client.directory.iterdir()) == []
@@ -0,0 +1,243 @@
+"""
+Query plan regression tests for the repository functions.
+
+Every statement a repository function sends is captured and explained. A test fails when
+a plan scans the contacts or users table, or when it differs from the approved baseline in
+tests/query_plans/sqlite.json. After an intended change, approve the new plans with
+
+    UPDATE_QUERY_PLANS=1 pytest tests/test_query_plans.py
+
+Set TEST_POSTGRES_URL to also check the plans on Postgres (needs an empty, migrated
+database); there sequential scans are disabled, so a remaining Seq Scan means no index
+can serve the query.
+"""
+import asyncio
+import itertools
+import json
+import os
+import re
+from datetime import date, timedelta
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+
+from src.cli.seed import seed_users
+from src.database.models import Base, User
+from src.repository import birthdays as repository_birthdays
+from src.repository import contact_rows as repository_contact_rows
+from src.repository import contacts as repository_contacts
+from src.repository import stats as repository_stats
+from src.repository import users as repository_users
+from src.schemas import ContactFilter, ContactModel, UserModel
+from src.services.contact_filters import UnsupportedQuery, plan_query
+
+BASELINE = Path(__file__).parent / "query_plans" / "sqlite.json"
+SCAN = re.compile(r"^SCAN (TABLE )?(contacts|users)\b")
+SORT = "USE TEMP B-TREE FOR ORDER BY"
+PG_SEQ_SCAN = re.compile(r"Seq Scan on (contacts|users)\b")
+# several indexes lead with user_id and are equally good for a plain user_id range;
+# SQLite picks one depending on their creation order, which is not stable
+USER_RANGE = re.compile(r"USING (COVERING )?INDEX ix_contacts_user_id_\w+ \(user_id=\?\)$")
+USERS, CONTACTS_PER_USER = 200, 50
+
+
+class PlanRecorder:
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+        event.listen(engine, "before_cursor_execute", self._record)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "WITH")):
+            self.statements.append((statement, parameters[0] if executemany else parameters))
+
+    def plans(self, normalize=True):
+        plans = []
+        with self.engine.connect() as connection:
+            raw = connection.connection.driver_connection
+            for statement, parameters in self.statements:
+                if self.engine.dialect.name == "sqlite":
+                    rows = raw.execute(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+                    plans.append([USER_RANGE.sub(r"USING \1INDEX ix_contacts_user_id_* (user_id=?)", row[3])
+                                  if normalize else row[3] for row in rows])
+                else:
+                    with raw.cursor() as cursor:
+                        cursor.execute("SET enable_seqscan = off")
+                        cursor.execute(f"EXPLAIN {statement}", parameters)
+                        plans.append([row[0].strip() for row in cursor.fetchall()])
+        self.statements = []
+        return plans
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def contact_body(suffix: str, birthday: date) -> ContactModel:
+    return ContactModel(first_name="Plan", last_name="Check", email=f"plan{suffix}@example.com",
+                        phone=f"0671234{suffix:0>3}", birthday=birthday)
+
+
+def scenarios():
+    """
+    Calls of every repository function, keyed by a stable name.
+    """
+    tomorrow = date.today() + timedelta(days=1)
+    created = {}
+
+    async def create(user, db):
+        created["contact"] = await repository_contacts.create_contact(contact_body("1", tomorrow), user, db)
+
+    async def update(user, db):
+        await repository_contacts.update_contact(created["contact"].id, contact_body("2", tomorrow), user, db)
+
+    async def remove(user, db):
+        await repository_contacts.remove_contact(created["contact"].id, user, db)
+
+    async def create_user(user, db):
+        await repository_users.create_user(UserModel(username="planner", email="planner@example.com",
+                                                     password="secret1"), db)
+
+    def filtered(**criteria):
+        plan = plan_query(ContactFilter(**criteria), "sqlite")
+        return lambda user, db: repository_contact_rows.filter_contacts(plan, 0, 20, user, db)
+
+    return {
+        "contacts.get_contacts": lambda user, db: repository_contacts.get_contacts(10, 20, user, db),
+        "contacts.get_contacts.fields": lambda user, db: repository_contacts.get_contacts(
+            0, 20, user, db, ["id", "first_name"]),
+        "contacts.get_contact": lambda user, db: repository_contacts.get_contact(5, user, db),
+        "contacts.get_contacts_by_ids": lambda user, db: repository_contacts.get_contacts_by_ids(
+            [7, 3, 5, 9999], user, db),
+        "contacts.query_search.first_name": lambda user, db: repository_contacts.query_search(
+            "first_name", "Olena", user, db),
+        "contacts.query_search.last_name": lambda user, db: repository_contacts.query_search(
+            "last_name", "Koval", user, db),
+        "contacts.query_search.email": lambda user, db: repository_contacts.query_search(
+            "email", "olena.koval.0@example.com", user, db),
+        "contacts.birthdays": lambda user, db: repository_contacts.birthdays(user, db),
+        "contacts.get_changes": lambda user, db: repository_contacts.get_changes(10, 100, user, db),
+        "contacts.get_duplicate_candidates": lambda user, db: repository_contacts.get_duplicate_candidates(user, db),
+        "contacts.lookup_by_phone": lambda user, db: repository_contacts.lookup_by_phone(
+            "+380500000001", user, db),
+        "contacts.lookup_by_phone.suffix": lambda user, db: repository_contacts.lookup_by_phone(
+            "0001", user, db, suffix=True),
+        "contact_rows.get_contacts": lambda user, db: repository_contact_rows.get_contacts(10, 20, user, db),
+        "contact_rows.get_contact": lambda user, db: repository_contact_rows.get_contact(5, user, db),
+        "contact_rows.query_search": lambda user, db: repository_contact_rows.query_search(
+            "last_name", "Koval", user, db),
+        "contact_rows.birthdays": lambda user, db: repository_contact_rows.birthdays(user, db),
+        "contact_rows.filter_contacts": filtered(),
+        "contact_rows.filter_contacts.prefixes": filtered(last_name_prefix="Ko", first_name_prefix="O"),
+        "contact_rows.filter_contacts.birth_months": filtered(birth_month_from=3, birth_month_to=5,
+                                                              has_phone=True, sort="birthday"),
+        "contact_rows.filter_contacts.contains": filtered(name_contains="ova", email_prefix="o"),
+        "contacts.create_contact": create,
+        "contacts.update_contact": update,
+        "contacts.remove_contact": remove,
+        "stats.get_stats": lambda user, db: repository_stats.get_stats(user, db),
+        "birthdays.get_upcoming": lambda user, db: repository_birthdays.get_upcoming(user, db),
+        "users.get_user_by_email": lambda user, db: repository_users.get_user_by_email(user.email, db),
+        "users.create_user": create_user,
+        "users.update_token": lambda user, db: repository_users.update_token(user, "token", db),
+        "users.confirmed_email": lambda user, db: repository_users.confirmed_email(user.email, db),
+        "users.update_avatar": lambda user, db: repository_users.update_avatar(user.email, "avatar.png", db),
+    }
+
+
+def collect_plans(engine):
+    recorder = PlanRecorder(engine)
+    Session = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    results = {}
+    with Session() as db:
+        repository_birthdays.rebuild_snapshot(db)
+        user = db.get(User, 1)
+        recorder.statements = []
+        for name, call in scenarios().items():
+            run(call(user, db))
+            db.commit()
+            results[name] = recorder.plans()
+    event.remove(engine, "before_cursor_execute", recorder._record)
+    return results
+
+
+@pytest.fixture(scope="module")
+def sqlite_engine(tmp_path_factory):
+    url = f"sqlite:///{tmp_path_factory.mktemp('plans') / 'plans.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    seed_users(url, 1, USERS, CONTACTS_PER_USER, "hash", 5000, seed=1)
+    with engine.begin() as connection:
+        connection.execute(text("ANALYZE"))
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture(scope="module")
+def sqlite_plans(sqlite_engine):
+    return collect_plans(sqlite_engine)
+
+
+def test_no_full_scans(sqlite_plans):
+    scans = {name: line for name, plans in sqlite_plans.items()
+             for plan in plans for line in plan if SCAN.match(line)}
+    assert not scans, f"full scans of contacts/users: {scans}"
+
+
+def filter_combinations():
+    filters = [{"first_name_prefix": "O"}, {"last_name_prefix": "Ko"}, {"email_prefix": "o"},
+               {"birth_month_from": 3, "birth_month_to": 5}, {"name_contains": "ova"}, {"has_phone": True}]
+    for sort in (None, "last_name", "first_name", "birthday"):
+        for size in range(3):
+            for chosen in itertools.combinations(filters, size):
+                yield {key: value for criteria in chosen for key, value in criteria.items()} | {"sort": sort}
+
+
+def test_every_accepted_filter_is_served_by_its_index(sqlite_engine):
+    """
+    Accepted filter combinations read the planned index in its order, without sorting.
+    """
+    Session = sessionmaker(bind=sqlite_engine)
+    failures = {}
+    with Session() as db:
+        user = db.get(User, 1)
+        recorder = PlanRecorder(sqlite_engine)
+        for criteria in filter_combinations():
+            try:
+                plan = plan_query(ContactFilter(**criteria), "sqlite")
+            except UnsupportedQuery:
+                continue
+            run(repository_contact_rows.filter_contacts(plan, 0, 20, user, db))
+            lines = [line for statement in recorder.plans(normalize=False) for line in statement]
+            if any(SCAN.match(line) or line == SORT for line in lines) or \
+                    not any(f"INDEX {plan.index} " in line for line in lines):
+                failures[json.dumps(criteria)] = (plan.index, lines)
+        event.remove(sqlite_engine, "before_cursor_execute", recorder._record)
+    assert not failures, f"filters not served by their index: {failures}"
+
+
+def test_plans_match_baseline(sqlite_plans):
+    if os.environ.get("UPDATE_QUERY_PLANS"):
+        BASELINE.parent.mkdir(exist_ok=True)
+        BASELINE.write_text(json.dumps(sqlite_plans, indent=2, sort_keys=True) + "\n")
+    baseline = json.loads(BASELINE.read_text())
+    changed = sorted(name for name in set(baseline) | set(sqlite_plans)
+                     if baseline.get(name) != sqlite_plans.get(name))
+    assert not changed, f"query plans changed for {changed}; review and approve with UPDATE_QUERY_PLANS=1"
+
+
+@pytest.mark.skipif(not os.environ.get("TEST_POSTGRES_URL"), reason="TEST_POSTGRES_URL is not set")
+def test_postgres_plans_use_indexes():
+    url = os.environ["TEST_POSTGRES_URL"]
+    engine = create_engine(url)
+    seed_users(url, 1, USERS, CONTACTS_PER_USER, "hash", 5000, seed=1)
+    with engine.begin() as connection:
+        connection.execute(text("ANALYZE"))
+    plans = collect_plans(engine)
+    engine.dispose()
+    scans = {name: line for name, statements in plans.items()
+             for plan in statements for line in plan if PG_SEQ_SCAN.search(line)}
+    assert not scans, f"sequential scans of contacts/users: {scans}"
@@ -0,0 +1,138 @@
+import asyncio
+from datetime import date
+
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.requests import Request
+
+from src.database.db import ReadRouter, RedisWriteMarks, _client_key
+from src.database.models import Base, Contact, User
+from src.services.auth import auth_service
+from src.services.resilience import CircuitBreaker
+from src.testing.faults import FaultyCall
+
+
+@pytest.fixture()
+def router(tmp_path):
+    factories = []
+    for name in ("primary", "replica"):
+        engine = create_engine(f"sqlite:///{tmp_path / name}.db", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=engine)
+        factories.append(sessionmaker(autocommit=False, autoflush=False, bind=engine))
+    primary, replica = factories
+    return ReadRouter(primary, [replica], window=60)
+
+
+class DictRedis:
+    """
+    The part of the blocking Redis client the marks use, shared like one Redis server.
+    """
+
+    def __init__(self):
+        self.keys = {}
+
+    def set(self, key, value, px=None):
+        self.keys[key] = value
+
+    def exists(self, key):
+        return int(key in self.keys)
+
+
+def _write_contact(router):
+    db = router.primary()
+    user = User(username="replica", email="replica@example.com", password="secret")
+    db.add(user)
+    db.flush()
+    db.add(Contact(first_name="Kate", last_name="Duka", email="kate@example.com", phone="0939090900",
+                   birthday=date(2000, 6, 7), user_id=user.id))
+    db.commit()
+    db.close()
+
+
+def test_reads_go_to_replica(router):
+    _write_contact(router)
+    db = router.session_for("replica@example.com")
+    try:
+        assert db.query(Contact).count() == 0
+    finally:
+        db.close()
+
+
+def test_read_your_writes_falls_back_to_primary(router):
+    _write_contact(router)
+    router.mark_write("replica@example.com")
+    db = router.session_for("replica@example.com")
+    try:
+        assert db.query(Contact).count() == 1
+    finally:
+        db.close()
+    other = router.session_for("other@example.com")
+    try:
+        assert other.query(Contact).count() == 0
+    finally:
+        other.close()
+
+
+def test_without_replicas_reads_use_primary(router):
+    router = ReadRouter(router.primary, [], window=60)
+    _write_contact(router)
+    db = router.session_for(None)
+    try:
+        assert db.query(Contact).count() == 1
+    finally:
+        db.close()
+
+
+def _count(router, key):
+    db = router.session_for(key)
+    try:
+        return db.query(Contact).count()
+    finally:
+        db.close()
+
+
+def test_redis_marks_are_seen_by_every_worker(router):
+    redis = DictRedis()
+    worker_a = ReadRouter(router.primary, router.replicas, window=60, marks=RedisWriteMarks(redis))
+    worker_b = ReadRouter(router.primary, router.replicas, window=60, marks=RedisWriteMarks(redis))
+    _write_contact(worker_a)
+    worker_a.mark_write("replica@example.com")
+    assert _count(worker_b, "replica@example.com") == 1
+    assert _count(worker_b, "other@example.com") == 0
+
+
+def test_reads_go_to_primary_while_redis_is_unavailable(router):
+    redis = DictRedis()
+    redis.exists = FaultyCall(RedisConnectionError("connection refused")).sync
+    marks = RedisWriteMarks(redis, CircuitBreaker("redis", failure_threshold=5))
+    worker = ReadRouter(router.primary, router.replicas, window=60, marks=marks)
+    _write_contact(worker)
+    assert _count(worker, "other@example.com") == 1
+
+
+def test_open_circuit_skips_redis(router):
+    redis = DictRedis()
+    exists = FaultyCall(RedisConnectionError("connection refused"))
+    redis.exists = exists.sync
+    marks = RedisWriteMarks(redis, CircuitBreaker("redis", failure_threshold=1, reset_timeout=60))
+    worker = ReadRouter(router.primary, router.replicas, window=60, marks=marks)
+    _write_contact(worker)
+    assert _count(worker, "other@example.com") == 1
+    assert marks.breaker.state == "open"
+    # straight to the primary, without waiting for Redis again
+    assert _count(worker, "other@example.com") == 1
+    assert exists.calls == 1
+
+
+def test_client_key_is_the_user_not_the_token():
+    def request(token):
+        return Request({"type": "http", "headers": [(b"authorization", f"Bearer {token}".encode())]})
+
+    first, second = (asyncio.run(auth_service.create_access_token(data={"sub": "replica@example.com"},
+                                                                  expires_delta=expires))
+                     for expires in (60, 120))
+    assert first != second
+    assert _client_key(request(first)) == _client_key(request(second)) == "replica@example.com"
+    assert _client_key(request("not-a-jwt")) is None
@@ -0,0 +1,134 @@
+import asyncio
+import io
+import time
+
+import cloudinary.uploader
+import pytest
+from cloudinary.exceptions import BadRequest, GeneralError
+from fastapi import HTTPException, UploadFile
+from fastapi_limiter import FastAPILimiter
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from src.conf.config import settings
+from src.database.models import User
+from src.routes import users as users_routes
+from src.services import resilience
+from src.services.resilience import (CircuitOpenError, Dependency, DependencyUnavailable, LocalRateLimits,
+                                     ResilientRateLimiter, calls_total)
+from src.testing.faults import FaultyCall
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def make_dependency(**kwargs):
+    options = {"timeout": 0.05, "retries": 2, "retry_on": (GeneralError,), "backoff": 0.001,
+               "failure_threshold": 3, "reset_timeout": 0.05}
+    options.update(kwargs)
+    return Dependency("test", **options)
+
+
+def test_retries_failures_and_timeouts():
+    dependency = make_dependency()
+    call = FaultyCall(GeneralError("502"), 1.0, result="ok")
+    assert run(dependency.call(call)) == "ok"
+    assert call.calls == 3
+    assert dependency.breaker.state == "closed"
+
+
+def test_gives_up_after_the_last_attempt():
+    dependency = make_dependency(failure_threshold=10)
+    call = FaultyCall(GeneralError("502"), GeneralError("502"), GeneralError("502"))
+    with pytest.raises(DependencyUnavailable) as err:
+        run(dependency.call(call))
+    assert isinstance(err.value.__cause__, GeneralError)
+    assert call.calls == 3
+
+
+def test_other_errors_are_not_retried():
+    dependency = make_dependency()
+    call = FaultyCall(BadRequest("invalid image"))
+    with pytest.raises(BadRequest):
+        run(dependency.call(call))
+    assert call.calls == 1
+    assert dependency.breaker.failures == 0
+
+
+def test_circuit_opens_and_recovers():
+    dependency = make_dependency(retries=0)
+    for _ in range(3):
+        with pytest.raises(DependencyUnavailable):
+            run(dependency.call(FaultyCall(GeneralError("502"))))
+    assert dependency.breaker.state == "open"
+    call = FaultyCall(result="ok")
+    with pytest.raises(CircuitOpenError):
+        run(dependency.call(call))
+    assert call.calls == 0
+    assert calls_total.value(dependency="test", outcome="rejected") >= 1
+
+    time.sleep(0.06)
+    with pytest.raises(DependencyUnavailable):
+        run(dependency.call(FaultyCall(GeneralError("502"))))
+    assert dependency.breaker.state == "open"  # the trial call failed
+
+    time.sleep(0.06)
+    assert run(dependency.call(call)) == "ok"
+    assert dependency.breaker.state == "closed"
+
+
+def test_call_sync_does_not_wait_for_a_hanging_call():
+    async def scenario():
+        started = time.perf_counter()
+        with pytest.raises(DependencyUnavailable):
+            await make_dependency(retries=0).call_sync(FaultyCall(0.5).sync)
+        return time.perf_counter() - started
+
+    # asyncio.run itself waits for the abandoned thread on exit
+    assert run(scenario()) < 0.3
+
+
+def test_local_rate_limits():
+    limits = LocalRateLimits()
+    assert [limits.check("key", 2, 50) for _ in range(2)] == [0, 0]
+    assert 0 < limits.check("key", 2, 50) <= 50
+    time.sleep(0.06)
+    assert limits.check("key", 2, 50) == 0
+
+
+class FailingRedis:
+    evalsha = FaultyCall(*[RedisConnectionError("connection refused")] * 10)
+
+
+def test_rate_limiter_falls_back_to_local_limits(monkeypatch):
+    monkeypatch.setattr(resilience, "redis_dependency", make_dependency(retries=0, retry_on=(RedisConnectionError,)))
+    monkeypatch.setattr(resilience, "local_rate_limits", LocalRateLimits())
+    monkeypatch.setattr(FastAPILimiter, "redis", FailingRedis())
+    monkeypatch.setattr(FastAPILimiter, "lua_sha", "sha")
+    limiter = ResilientRateLimiter(times=2, seconds=60)
+    assert [run(limiter._check("fastapi-limiter:127.0.0.1:0")) for _ in range(2)] == [0, 0]
+    assert run(limiter._check("fastapi-limiter:127.0.0.1:0")) > 0
+
+
+def test_avatar_upload_fails_fast_when_cloudinary_hangs(monkeypatch):
+    monkeypatch.setattr(users_routes, "cloudinary_dependency", make_dependency(retries=1))
+    upload = FaultyCall(0.5, 0.5)
+    attempts = []
+
+    def record(file, **kwargs):
+        attempts.append((file, file.read(), kwargs["timeout"]))
+        return upload.sync(file, **kwargs)
+
+    monkeypatch.setattr(cloudinary.uploader, "upload", record)
+    file = UploadFile(filename="avatar.png", file=io.BytesIO(b"png"))
+    user = User(id=1, username="deadpool", email="deadpool@example.com")
+    with pytest.raises(HTTPException) as err:
+        run(users_routes.update_avatar_user(file=file, current_user=user, db=None))
+    assert err.value.status_code == 503
+    assert err.value.headers["Retry-After"]
+    assert upload.calls == 2
+    # each attempt uploads its own copy of the whole file, and gives up before the request does
+    (first, first_data, timeout), (second, second_data, _) = attempts
+    assert first is not second
+    assert first_data == second_data == b"png"
+    assert timeout == settings.cloudinary_upload_timeout < settings.cloudinary_timeout
@@ -1,11 +1,11 @@
-from unittest.mock import MagicMock
+from passlib.context import CryptContext
 
+from src.conf.config import settings
 from src.database.models import User
+from src.services.auth import auth_service, hash_rounds, rehash_total
 
 
-def test_create_user(client, user, monkeypatch):
-    mock_send_email = MagicMock()
-    monkeypatch.setattr("src.routes.auth.send_email", mock_send_email)
+def test_create_user(client, session, user, mailer):
     response = client.post(
         "/api/auth/signup",
         json=user,
@@ -14,9 +14,13 @@ def test_create_user(client, user, monkeypatch):
     data = response.json()
     assert data["user"]["email"] == user.get("email")
     assert "id" in data["user"]
+    assert session.query(User).filter(User.email == user.get("email")).one().confirmed is False
+    [(message, template)] = mailer.outbox
+    assert message.recipients == [user.get("email")]
+    assert template == "email_template.html"
 
 
-def test_repeat_create_user(client, user):
+def test_repeat_create_user(client, confirmed_user, user):
     response = client.post(
         "/api/auth/signup",
         json=user,
@@ -26,7 +30,9 @@ def test_repeat_create_user(client, user):
     assert data["detail"] == "Account already exists"
 
 
-def test_login_user_not_confirmed(client, user):
+def test_login_user_not_confirmed(client, session, confirmed_user, user):
+    confirmed_user.confirmed = False
+    session.commit()
     response = client.post(
         "/api/auth/login",
         data={"username": user.get('email'), "password": user.get('password')},
@@ -36,10 +42,7 @@ def test_login_user_not_confirmed(client, user):
     assert data["detail"] == "Email not confirmed"
 
 
-def test_login_user(client, session, user):
-    current_user: User = session.query(User).filter(User.email == user.get('email')).first()
-    current_user.confirmed = True
-    session.commit()
+def test_login_user(client, confirmed_user, user):
     response = client.post(
         "/api/auth/login",
         data={"username": user.get('email'), "password": user.get('password')},
@@ -49,7 +52,7 @@ def test_login_user(client, session, user):
     assert data["token_type"] == "bearer"
 
 
-def test_login_wrong_password(client, user):
+def test_login_wrong_password(client, confirmed_user, user):
     response = client.post(
         "/api/auth/login",
         data={"username": user.get('email'), "password": 'password'},
@@ -59,11 +62,26 @@ def test_login_wrong_password(client, user):
     assert data["detail"] == "Invalid password"
 
 
-def test_login_wrong_email(client, user):
+def test_login_wrong_email(client, confirmed_user, user):
     response = client.post(
         "/api/auth/login",
         data={"username": 'email', "password": user.get('password')},
     )
     assert response.status_code == 401, response.text
     data = response.json()
-    assert data["detail"] == "Invalid email"
\ No newline at end of file
+    assert data["detail"] == "Invalid email"
+
+
+def test_login_rehashes_password_with_the_configured_cost(client, session, confirmed_user, user):
+    confirmed_user.password = CryptContext(schemes=["bcrypt"], bcrypt__rounds=5).hash(user.get('password'))
+    session.commit()
+    rehashed = rehash_total.value()
+    response = client.post(
+        "/api/auth/login",
+        data={"username": user.get('email'), "password": user.get('password')},
+    )
+    assert response.status_code == 200, response.text
+    session.refresh(confirmed_user)
+    assert hash_rounds(confirmed_user.password) == settings.bcrypt_rounds
+    assert auth_service.verify_password(user.get('password'), confirmed_user.password)
+    assert rehash_total.value() == rehashed + 1
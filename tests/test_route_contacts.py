@@ -0,0 +1,117 @@
+from datetime import date
+
+import pytest
+
+from src.database.models import Contact
+
+
+@pytest.fixture()
+def contacts(session, confirmed_user):
+    rows = [Contact(first_name=first_name, last_name=last_name, email=f"{first_name.lower()}@example.com",
+                    phone=phone, birthday=birthday, birth_month=birthday.month, birth_day=birthday.day,
+                    user_id=confirmed_user.id)
+            for first_name, last_name, phone, birthday in [("Olena", "Koval", "0670000001", date(1990, 4, 2)),
+                                                           ("Taras", "Kovalenko", None, date(1988, 3, 15)),
+                                                           ("Oleh", "Bondar", "0670000003", date(1995, 11, 30))]]
+    session.add_all(rows)
+    session.commit()
+    return rows
+
+
+def test_list_is_rate_limited(client, auth_headers, contacts, redis):
+    for _ in range(10):
+        response = client.get("/api/contacts/contacts/", headers=auth_headers)
+        assert response.status_code == 200, response.text
+    assert len(response.json()) == 3
+    response = client.get("/api/contacts/contacts/", headers=auth_headers)
+    assert response.status_code == 429, response.text
+
+
+@pytest.mark.parametrize("path", ["/api/contacts/contacts/", "/api/contacts/last_name/Koval", "contact"])
+def test_fields_select_the_returned_keys(client, auth_headers, contacts, path):
+    path = f"/api/contacts/{contacts[0].id}" if path == "contact" else path
+    response = client.get(path, headers=auth_headers, params={"fields": "email, first_name,email"})
+    assert response.status_code == 200, response.text
+    body = response.json()
+    body = body if isinstance(body, list) else [body]
+    assert all(list(contact) == ["id", "email", "first_name"] for contact in body)
+    assert {"id": contacts[0].id, "email": "olena@example.com", "first_name": "Olena"} in body
+
+
+def test_unknown_field_is_rejected(client, auth_headers, contacts):
+    response = client.get("/api/contacts/contacts/", headers=auth_headers, params={"fields": "first_name,password"})
+    assert response.status_code == 422, response.text
+    assert "password" in response.json()["detail"]
+
+
+@pytest.mark.parametrize("fields", ["", " , "])
+def test_empty_fields_return_every_field(client, auth_headers, contacts, fields):
+    response = client.get(f"/api/contacts/{contacts[0].id}", headers=auth_headers, params={"fields": fields})
+    assert response.status_code == 200, response.text
+    assert set(response.json()) == {"id", "first_name", "last_name", "email", "phone", "birthday"}
+
+
+def test_filter_reports_its_index(client, auth_headers, contacts):
+    response = client.get("/api/contacts/filter/", headers=auth_headers,
+                          params={"last_name_prefix": "Kov", "sort": "last_name", "has_phone": "true"})
+    assert response.status_code == 200, response.text
+    assert [contact["first_name"] for contact in response.json()] == ["Olena"]
+    assert response.headers["X-Query-Index"] == "ix_contacts_user_id_last_name_first_name"
+    assert "X-Query-Scan" not in response.headers
+
+    response = client.get("/api/contacts/filter/", headers=auth_headers, params={"sort": "birthday"})
+    assert [contact["first_name"] for contact in response.json()] == ["Taras", "Olena", "Oleh"]
+    assert response.headers["X-Query-Scan"] == "user"
+
+
+@pytest.mark.parametrize("params, status_code", [({"sort": "last_name", "first_name_prefix": "O"}, 400),
+                                                 ({"birth_month_from": 11, "birth_month_to": 2}, 422)])
+def test_filter_rejects_unindexed_combinations(client, auth_headers, params, status_code):
+    response = client.get("/api/contacts/filter/", headers=auth_headers, params=params)
+    assert response.status_code == status_code, response.text
+
+
+def test_duplicates_are_rate_limited(client, session, auth_headers, contacts):
+    duplicate = Contact(first_name="Olena", last_name="Koval", email="olena+old@example.com",
+                        user_id=contacts[0].user_id)
+    session.add(duplicate)
+    session.commit()
+    for _ in range(2):
+        response = client.get("/api/contacts/duplicates", headers=auth_headers)
+        assert response.status_code == 200, response.text
+    assert [cluster["contact_ids"] for cluster in response.json()] == [[contacts[0].id, duplicate.id]]
+    response = client.get("/api/contacts/duplicates", headers=auth_headers)
+    assert response.status_code == 429, response.text
+
+
+def test_lookup_by_phone(client, auth_headers, contacts):
+    response = client.post("/api/contacts/create/", headers=auth_headers,
+                           json={"first_name": "Iryna", "last_name": "Shevchenko", "email": "iryna@example.com",
+                                 "phone": "+380 (93) 909-09-00", "birthday": "1991-02-03"})
+    assert response.status_code == 201, response.text
+    created = response.json()["id"]
+    for params in ({"number": "093 909 09 00"}, {"number": "0900", "suffix": "true"}):
+        response = client.get("/api/contacts/lookup/phone", headers=auth_headers, params=params)
+        assert response.status_code == 200, response.text
+        assert [contact["id"] for contact in response.json()] == [created]
+    response = client.get("/api/contacts/lookup/phone", headers=auth_headers, params={"number": "0001"})
+    assert response.json() == []
+
+
+def test_phone_longer_than_e164_is_rejected(client, auth_headers, contacts):
+    body = {"first_name": "Iryna", "last_name": "Shevchenko", "email": "iryna@example.com", "phone": "9" * 30,
+            "birthday": "1991-02-03"}
+    response = client.post("/api/contacts/create/", headers=auth_headers, json=body)
+    assert response.status_code == 422, response.text
+    response = client.put(f"/api/contacts/{contacts[0].id}", headers=auth_headers, json=body)
+    assert response.status_code == 422, response.text
+    response = client.get("/api/contacts/lookup/phone", headers=auth_headers, params={"number": "9" * 30})
+    assert response.json() == []
+
+
+def test_update_avatar(client, auth_headers, cloudinary_upload):
+    response = client.patch("/api/users/avatar", headers=auth_headers,
+                            files={"file": ("avatar.png", b"png", "image/png")})
+    assert response.status_code == 200, response.text
+    assert "deadpool" in response.json()["avatar"]
+    assert cloudinary_upload.calls == 1
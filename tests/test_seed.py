@@ -0,0 +1,48 @@
+import asyncio
+import sys
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import Session
+
+from src.cli import seed
+from src.database.models import Contact, User
+from src.repository.stats import contact_counts, get_stats
+from src.services.auth import auth_service
+from src.services.phones import normalize_phone
+
+
+def run_seed(monkeypatch, *args):
+    monkeypatch.setattr(sys, "argv", ["seed", *args])
+    seed.main()
+
+
+def test_seed_small_database(tmp_path, monkeypatch, capsys):
+    url = f"sqlite:///{tmp_path / 'seed.db'}"
+    # a batch size below the contacts of two users, so that the users are loaded in several batches
+    options = ["--url", url, "--contacts-per-user", "5", "--batch-size", "7", "--password", "secret1"]
+    run_seed(monkeypatch, *options, "--users", "3", "--create-schema")
+    run_seed(monkeypatch, *options, "--users", "2")
+    assert "seeded 2 users and 10 contacts with 1 worker(s)" in capsys.readouterr().out
+
+    engine = create_engine(url)
+    with Session(engine) as db:
+        users = db.scalars(select(User).order_by(User.id)).all()
+        assert [user.id for user in users] == [1, 2, 3, 4, 5]
+        assert auth_service.verify_password("secret1", users[0].password)
+        contacts = db.scalars(select(Contact)).all()
+        assert len(contacts) == 25
+        assert db.scalar(select(func.count(func.distinct(Contact.email)))) == 25
+        for contact in contacts:
+            assert (contact.birth_month, contact.birth_day) == (contact.birthday.month, contact.birthday.day)
+            assert contact.phone_normalized == normalize_phone(contact.phone, "380")
+        for user in users:
+            expected = {}
+            for contact in contacts:
+                if contact.user_id == user.id:
+                    for name, value in contact_counts(contact).items():
+                        expected[name] = expected.get(name, 0) + value
+            stats = asyncio.run(get_stats(user, db, initialize=False))
+            assert {name: value for name, value in stats.items() if value} == \
+                   {name: value for name, value in expected.items() if value}
+            assert user.contacts_version == max(contact.version for contact in contacts if contact.user_id == user.id)
+    engine.dispose()
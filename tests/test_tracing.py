@@ -0,0 +1,88 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+from src.services.tracing import (BatchProcessor, Tracer, TracingMiddleware, instrument_engine,
+                                  parse_traceparent, tracer as global_tracer)
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+instrument_engine(engine)
+
+
+def exported_spans(documents):
+    global_tracer.shutdown()
+    return [span for document in documents for span in document["resourceSpans"][0]["scopeSpans"][0]["spans"]]
+
+
+@pytest.fixture()
+def client():
+    documents = []
+    global_tracer.sample_rate, global_tracer.processor = 0.0, BatchProcessor(documents.append, "test", interval=60)
+    app = FastAPI()
+    app.add_middleware(TracingMiddleware, tracer=global_tracer)
+
+    @app.get("/items/{item_id}")
+    def item(item_id: int):
+        with global_tracer.span("work"):
+            with engine.connect() as connection:
+                return {"value": connection.execute(text("SELECT :v"), {"v": item_id}).scalar()}
+
+    client = TestClient(app)
+    client.documents = documents
+    yield client
+    global_tracer.shutdown()
+
+
+def test_parse_traceparent():
+    assert parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-01") == (int(TRACE_ID, 16), int(PARENT_ID, 16), True)
+    assert parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-00")[2] is False
+    assert parse_traceparent(f"00-{'0' * 32}-{PARENT_ID}-01") is None
+    assert parse_traceparent("garbage") is None
+    assert parse_traceparent(None) is None
+
+
+def test_sampled_request_records_span_tree(client):
+    response = client.get("/items/7", headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"})
+    assert response.json() == {"value": 7}
+    assert response.headers["traceparent"].startswith(f"00-{TRACE_ID}-")
+    spans = exported_spans(client.documents)
+    by_name = {span["name"]: span for span in spans}
+    root, work, query = by_name["GET /items/{item_id}"], by_name["work"], by_name["db.query"]
+    assert {span["traceId"] for span in spans} == {TRACE_ID}
+    assert root["parentSpanId"] == PARENT_ID
+    assert work["parentSpanId"] == root["spanId"]
+    assert query["parentSpanId"] == work["spanId"]
+    assert {"key": "db.statement", "value": {"stringValue": "SELECT ?"}} in query["attributes"]
+
+
+def test_unsampled_request_records_nothing(client):
+    response = client.get("/items/1", headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-00"})
+    assert response.status_code == 200
+    assert "traceparent" not in response.headers
+    response = client.get("/items/2")
+    assert "traceparent" not in response.headers
+    assert exported_spans(client.documents) == []
+
+
+def test_spans_outside_a_trace_are_noops():
+    tracer = Tracer(sample_rate=1.0)
+    with tracer.span("orphan") as span:
+        assert span.sampled is False
+    assert tracer.start_trace("GET /").sampled is False
+
+
+def test_export_failures_are_logged(caplog):
+    def unreachable(document):
+        raise OSError("connection refused")
+
+    processor = BatchProcessor(unreachable, "test", interval=60)
+    try:
+        processor._export([])
+    finally:
+        processor.shutdown()
+    assert "span export failed: connection refused" in caplog.text
@@ -0,0 +1,86 @@
+import json
+import unittest
+from datetime import date, datetime, timedelta
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.database.models import Base, Contact, User
+from src.repository import contact_rows
+from src.repository import contacts as repository_contacts
+from src.schemas import ContactResponse
+
+
+class TestContactRows(unittest.IsolatedAsyncioTestCase):
+    """
+    The ORM-free functions must return exactly what the ORM ones return.
+    """
+
+    def setUp(self):
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+        self.user = User(id=1, username="rows", email="rows@example.com", password="secret")
+        other = User(id=2, username="other", email="other@example.com", password="secret")
+        soon = (date.today() + timedelta(days=3)).replace(year=2000)
+        later = (date.today() + timedelta(days=30)).replace(year=2000)
+        self.session.add_all([self.user, other] + [
+            Contact(first_name=f"Name{i}", last_name="Koval" if i % 2 else "Bondar", email=f"c{i}@example.com",
+                    phone=f"06700000{i:02d}", birthday=soon if i % 3 == 0 else later, user_id=1)
+            for i in range(10)] + [Contact(first_name="Name0", last_name="Koval", email="x@example.com",
+                                           phone="0670000099", birthday=soon, user_id=2)])
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+
+    def orm_json(self, contacts, fields=None):
+        content = jsonable_encoder([ContactResponse.from_orm(contact) for contact in contacts])
+        if fields:
+            content = [{field: contact[field] for field in fields} for contact in content]
+        return content
+
+    async def test_get_contacts(self):
+        rows = await contact_rows.get_contacts(2, 5, self.user, self.session)
+        contacts = await repository_contacts.get_contacts(2, 5, self.user, self.session)
+        self.assertEqual(json.loads(contact_rows.contacts_json(rows)), self.orm_json(contacts))
+
+    async def test_get_contacts_fields(self):
+        rows = await contact_rows.get_contacts(0, 100, self.user, self.session, ["id", "birthday"])
+        contacts = await repository_contacts.get_contacts(0, 100, self.user, self.session)
+        # without ORDER BY the rows come in the order of whichever index serves the query
+        by_id = lambda contact: contact["id"]
+        self.assertEqual(sorted(json.loads(contact_rows.contacts_json(rows, ["id", "birthday"])), key=by_id),
+                         sorted(self.orm_json(contacts, ["id", "birthday"]), key=by_id))
+
+    async def test_get_contact(self):
+        contact = await repository_contacts.get_contact(3, self.user, self.session)
+        row = await contact_rows.get_contact(3, self.user, self.session)
+        self.assertEqual(json.loads(contact_rows.contacts_json(row)), self.orm_json([contact])[0])
+        self.assertIsNone(await contact_rows.get_contact(11, self.user, self.session))
+
+    async def test_query_search(self):
+        rows = await contact_rows.query_search("last_name", "Koval", self.user, self.session)
+        contacts = await repository_contacts.query_search("last_name", "Koval", self.user, self.session)
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(json.loads(contact_rows.contacts_json(rows)), self.orm_json(contacts))
+        with self.assertRaises(HTTPException):
+            await contact_rows.query_search("phone", "0670000001", self.user, self.session)
+
+    async def test_birthdays(self):
+        rows = await contact_rows.birthdays(self.user, self.session, ["id", "first_name"])
+        contacts = await repository_contacts.birthdays(self.user, self.session)
+        self.assertEqual([row.id for row in rows], [1, 4, 7, 10])
+        self.assertEqual(json.loads(contact_rows.contacts_json(rows, ["id", "first_name"])),
+                         self.orm_json(contacts, ["id", "first_name"]))
+
+    def test_is_upcoming_leap_day(self):
+        self.assertTrue(contact_rows.is_upcoming(date(2000, 2, 29), datetime(2026, 2, 25)))
+        self.assertFalse(contact_rows.is_upcoming(date(2000, 2, 29), datetime(2026, 6, 1)))
+        self.assertTrue(contact_rows.is_upcoming(date(2000, 2, 29), datetime(2028, 2, 25)))
+        # past 29 February of a leap year the next birthday is 1 March of the next year
+        self.assertFalse(contact_rows.is_upcoming(date(2000, 2, 29), datetime(2028, 3, 5)))
+        self.assertTrue(contact_rows.is_upcoming(date(2000, 2, 29), datetime(2029, 2, 25)))
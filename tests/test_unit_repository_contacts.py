@@ -1,10 +1,11 @@
 import unittest
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from unittest.mock import MagicMock
 
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
 
-from src.database.models import Contact, User
+from src.database.models import Contact, ContactTombstone, User
 from src.schemas import ContactModel
 from src.repository.contacts import (
     get_contacts,
@@ -14,6 +15,9 @@ from src.repository.contacts import (
     update_contact,
     query_search,
     birthdays,
+    get_changes,
+    get_contacts_by_ids,
+    lookup_by_phone,
 )
 
 
@@ -40,6 +44,16 @@ class TestContact(unittest.IsolatedAsyncioTestCase):
         result = await get_contact(contact_id=1, user=self.user, db=self.session)
         self.assertIsNone(result)
 
+    async def test_get_contacts_by_ids(self):
+        contacts = [Contact(id=1), Contact(id=3)]
+        self.session.query().filter().all.return_value = contacts
+        result = await get_contacts_by_ids(contact_ids=[3, 2, 1, 3], user=self.user, db=self.session)
+        self.assertEqual(result, [contacts[1], contacts[0]])
+
+    async def test_get_contacts_by_ids_empty(self):
+        result = await get_contacts_by_ids(contact_ids=[], user=self.user, db=self.session)
+        self.assertEqual(result, [])
+
     async def test_create_contact(self):
         body = ContactModel(first_name="Kate", last_name="Duka", email="test@test.com", phone="0939090900",
                             birthday="2000-06-07")
@@ -51,6 +65,22 @@ class TestContact(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(result.birthday, body.birthday)
         self.assertTrue(hasattr(result, "id"))
 
+    async def test_create_contact_rejects_a_too_long_phone(self):
+        with self.assertRaises(ValidationError):
+            ContactModel(first_name="Kate", last_name="Duka", email="test@test.com", phone="9" * 30,
+                         birthday="2000-06-07")
+
+    async def test_lookup_by_phone(self):
+        contacts = [Contact(id=1, phone="+380 93 909 09 00")]
+        self.session.query().filter().filter().limit().all.return_value = contacts
+        result = await lookup_by_phone("093-909-09-00", user=self.user, db=self.session)
+        self.assertEqual(result, contacts)
+
+    async def test_lookup_by_phone_with_too_many_digits(self):
+        result = await lookup_by_phone("9" * 30, user=self.user, db=self.session)
+        self.assertEqual(result, [])
+        self.session.query().filter().filter().limit().all.assert_not_called()
+
     async def test_remove_contact_found(self):
         contact = Contact()
         self.session.query().filter().first.return_value = contact
@@ -92,9 +122,8 @@ class TestContact(unittest.IsolatedAsyncioTestCase):
             Contact(first_name='Viktor', last_name="Petrov", email="viktor@example.com", phone="9999888877",
                     birthday=date(1988, 6, 5)),
         ]
-        self.session.query().filter_by().filter().all.return_value = [contacts[0], contacts[2], contacts[4]]
-        result = await query_search(current_user=self.user, field_name='last_name', field_value='Petrov',
-                                    db=self.session)
+        self.session.query().filter().all.return_value = [contacts[0], contacts[2], contacts[4]]
+        result = await query_search(query_field='last_name', query_value='Petrov', user=self.user, db=self.session)
         expected_result = [contacts[0], contacts[2], contacts[4]]
         self.assertEqual(result, expected_result)
 
@@ -102,10 +131,11 @@ class TestContact(unittest.IsolatedAsyncioTestCase):
     async def test_birthdays(self):
         today = datetime.now()
         contacts = [
-            Contact(id=1, first_name='Maryna', birthday=today.replace(month=today.month, day=today.day + 1), user_id=self.user.id),
-            Contact(id=2, first_name='Karyna', birthday=today.replace(month=today.month, day=today.day + 4), user_id=self.user.id),
-            Contact(id=3, first_name='David', birthday=today.replace(month=today.month, day=today.day + 6), user_id=self.user.id),
-            Contact(id=4, first_name='Marat', birthday=today.replace(month=today.month, day=today.day + 15), user_id=self.user.id)   
+            # timedelta, so that the dates stay valid at the end of a month
+            Contact(id=1, first_name='Maryna', birthday=today + timedelta(days=1), user_id=self.user.id),
+            Contact(id=2, first_name='Karyna', birthday=today + timedelta(days=4), user_id=self.user.id),
+            Contact(id=3, first_name='David', birthday=today + timedelta(days=6), user_id=self.user.id),
+            Contact(id=4, first_name='Marat', birthday=today + timedelta(days=15), user_id=self.user.id)
         ]
         self.session.query().filter().all.return_value = contacts
         result = await birthdays(self.user, self.session)
@@ -116,6 +146,21 @@ class TestContact(unittest.IsolatedAsyncioTestCase):
         self.assertIn(contacts[2], result)
         self.assertNotIn(contacts[3], result)
 
+    async def test_get_changes(self):
+        contacts = [Contact(id=1, version=3), Contact(id=2, version=5)]
+        tombstones = [ContactTombstone(contact_id=3, version=4), ContactTombstone(contact_id=4, version=6)]
+        self.session.query().filter().order_by().limit().all.side_effect = [contacts, tombstones]
+        result = await get_changes(since=2, limit=3, user=self.user, db=self.session)
+        self.assertEqual(result["changed"], contacts)
+        self.assertEqual(result["deleted"], [3])
+        self.assertEqual(result["version"], 5)
+        self.assertTrue(result["has_more"])
+
+    async def test_get_changes_empty(self):
+        self.session.query().filter().order_by().limit().all.side_effect = [[], []]
+        result = await get_changes(since=7, limit=10, user=self.user, db=self.session)
+        self.assertEqual(result, {"changed": [], "deleted": [], "version": 7, "has_more": False})
+
 
 if __name__ == '__main__':
     unittest.main()
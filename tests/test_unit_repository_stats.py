@@ -0,0 +1,45 @@
+import unittest
+from datetime import date
+from unittest.mock import MagicMock
+
+from sqlalchemy.orm import Session
+
+from src.database.models import Contact, User
+from src.repository.stats import apply_counters, contact_counts, get_stats
+
+
+class TestStats(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.session = MagicMock(spec=Session)
+        self.user = User(id=1)
+
+    def test_contact_counts(self):
+        contact = Contact(phone="0939090900", birthday=date(2000, 6, 7))
+        self.assertEqual(contact_counts(contact),
+                         {"total": 1, "with_phone": 1, "with_birthday": 1, "birth_month_6": 1})
+        self.assertEqual(contact_counts(Contact(phone="")), {"total": 1})
+        self.assertEqual(contact_counts(None), {})
+
+    def test_apply_counters_skips_unchanged(self):
+        counts = {"total": 1, "with_phone": 1}
+        apply_counters(self.user, counts, dict(counts), self.session)
+        self.session.execute.assert_not_called()
+
+    def test_apply_counters_updates_changed(self):
+        apply_counters(self.user, {"total": 1, "with_phone": 1}, {"total": 1}, self.session)
+        self.session.execute.assert_called_once()
+
+    async def test_get_stats_found(self):
+        self.session.query().filter().all.return_value = [("total", 3), ("with_phone", 2)]
+        result = await get_stats(self.user, self.session)
+        self.assertEqual(result, {"total": 3, "with_phone": 2})
+
+    async def test_get_stats_not_initialized(self):
+        self.session.query().filter().all.return_value = []
+        result = await get_stats(self.user, self.session, initialize=False)
+        self.assertIsNone(result)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import unittest
+from datetime import date
+
+from pydantic import ValidationError
+from sqlalchemy import and_, create_engine
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.database.models import Base, Contact, User
+from src.repository import contact_rows
+from src.schemas import ContactFilter
+from src.services.contact_filters import UnsupportedQuery, plan_query
+
+
+class TestPlanQuery(unittest.TestCase):
+
+    def plan(self, dialect="sqlite", **criteria):
+        return plan_query(ContactFilter(**criteria), dialect)
+
+    def test_range_filter_drives(self):
+        self.assertEqual(self.plan(last_name_prefix="Ko").index, "ix_contacts_user_id_last_name_first_name")
+        self.assertEqual(self.plan(birth_month_from=3, first_name_prefix="O").index,
+                         "ix_contacts_user_id_first_name_last_name")
+        self.assertEqual(self.plan(email_prefix="o", last_name_prefix="Ko", has_phone=True).index,
+                         "ix_contacts_user_id_email")
+        self.assertFalse(self.plan(birth_month_to=2).user_scan)
+
+    def test_sort_needs_its_own_range(self):
+        plan = self.plan(sort="birthday", birth_month_from=5, birth_month_to=6, last_name_prefix="Ko")
+        self.assertEqual(plan.index, "ix_contacts_user_id_birth_month_birth_day")
+        self.assertFalse(plan.user_scan)
+        self.assertTrue(self.plan(sort="first_name", has_phone=False).user_scan)
+        with self.assertRaises(UnsupportedQuery):
+            self.plan(sort="last_name", first_name_prefix="O")
+        with self.assertRaises(UnsupportedQuery):
+            self.plan(sort="first_name", first_name_prefix="O", name_contains="val")
+
+    def test_contains_uses_trigrams_on_postgres_only(self):
+        self.assertEqual(self.plan("postgresql", name_contains="val").index,
+                         "ix_contacts_user_id_first_name_trgm,ix_contacts_user_id_last_name_trgm")
+        plan = self.plan(email_contains="example")
+        self.assertEqual((plan.index, plan.user_scan), ("ix_contacts_user_id_id", True))
+
+    def test_prefixes_compare_bytes_on_postgres(self):
+        plan = self.plan("postgresql", sort="last_name", last_name_prefix="o-k", email_prefix="o.k@")
+        self.assertEqual(plan.index, "ix_contacts_user_id_last_name_first_name_c")
+        sql = str(and_(*plan.where).compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+        self.assertIn("(contacts.last_name COLLATE \"C\") >= 'o-k' AND (contacts.last_name COLLATE \"C\") < 'o-l'", sql)
+        self.assertIn("substr(contacts.email, 1, 4) = 'o.k@'", sql)
+        order_by = [str(column.compile(dialect=postgresql.dialect())) for column in plan.order_by]
+        self.assertEqual(order_by, ['contacts.last_name COLLATE "C"', 'contacts.first_name COLLATE "C"', "contacts.id"])
+
+    def test_invalid_criteria(self):
+        for criteria in ({"birth_month_from": 10, "birth_month_to": 2}, {"birth_month_to": 13},
+                         {"name_contains": "ab"}, {"sort": "email"}):
+            with self.assertRaises(ValidationError):
+                ContactFilter(**criteria)
+
+
+class TestFilterContacts(unittest.IsolatedAsyncioTestCase):
+    """
+    Every plan returns the contacts a plain Python filter picks, in the order of its sort.
+    """
+
+    def setUp(self):
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+        self.user = User(id=1, username="filter", email="filter@example.com", password="secret")
+        names = [("Olena", "Koval"), ("Taras", "Kovalenko"), ("Oleh", "Bondar"), ("Iryna", "koval"),
+                 ("Petro", "Ko_val"), ("Olga", "Melnyk"), ("O.k", "Ko-val"), ("Ok", "Ko.val")]
+        self.contacts = []
+        for i, (first_name, last_name) in enumerate(names):
+            birthday = date(1990, i * 2 % 12 + 1, 28 - i) if i != 5 else None
+            contact = Contact(first_name=first_name, last_name=last_name, email=f"{first_name.lower()}@example.com",
+                              phone=f"06700000{i:02d}" if i % 2 else None, birthday=birthday,
+                              birth_month=birthday and birthday.month, birth_day=birthday and birthday.day,
+                              user_id=1)
+            self.contacts.append(contact)
+        other = Contact(first_name="Olena", last_name="Koval", email="olena@example.com", user_id=2)
+        self.session.add_all([self.user, User(id=2, username="other", email="other@example.com", password="secret"),
+                              *self.contacts, other])
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+
+    async def ids(self, **criteria):
+        plan = plan_query(ContactFilter(**criteria), "sqlite")
+        rows = await contact_rows.filter_contacts(plan, 0, 100, self.user, self.session, ["id"])
+        return [row[0] for row in rows]
+
+    def expected(self, predicate, key=lambda contact: contact.id):
+        return [contact.id for contact in sorted(self.contacts, key=key) if predicate(contact)]
+
+    async def test_prefix_is_case_sensitive_and_literal(self):
+        self.assertEqual(await self.ids(last_name_prefix="Koval", sort="last_name"),
+                         self.expected(lambda c: c.last_name.startswith("Koval"), lambda c: c.last_name))
+        self.assertEqual(await self.ids(last_name_prefix="Ko_"), [self.contacts[4].id])
+
+    async def test_prefix_with_punctuation(self):
+        for criteria in ({"last_name_prefix": "Ko-"}, {"last_name_prefix": "Ko."}, {"first_name_prefix": "O."},
+                         {"email_prefix": "o.k@"}, {"first_name_prefix": "O", "sort": "first_name"}):
+            (key, prefix), = [(key, value) for key, value in criteria.items() if key.endswith("_prefix")]
+            column = key[:-len("_prefix")]
+            self.assertEqual(await self.ids(**criteria),
+                             self.expected(lambda c: getattr(c, column).startswith(prefix),
+                                           lambda c: (getattr(c, column), c.id) if "sort" in criteria else c.id))
+
+    async def test_contains_ignores_case(self):
+        self.assertEqual(await self.ids(name_contains="OVA"),
+                         self.expected(lambda c: "ova" in c.first_name.lower() + " " + c.last_name.lower()))
+
+    async def test_combined_filters(self):
+        self.assertEqual(await self.ids(first_name_prefix="Ol", birth_month_from=1, birth_month_to=6, has_phone=False),
+                         self.expected(lambda c: c.first_name.startswith("Ol") and c.birthday is not None
+                                       and c.birthday.month <= 6 and c.phone is None, lambda c: c.first_name))
+
+    async def test_sort_by_birthday_in_calendar_order(self):
+        self.assertEqual(await self.ids(sort="birthday", birth_month_from=3),
+                         self.expected(lambda c: c.birthday is not None and c.birthday.month >= 3,
+                                       lambda c: (c.birthday.month, c.birthday.day) if c.birthday else (0, 0)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+from datetime import date
+
+from src.services.duplicates import (ContactRecord, find_duplicates, name_grams, normalize_email, phone_key, similarity,
+                                     soundex)
+
+
+class TestDuplicates(unittest.TestCase):
+
+    def test_normalize_email(self):
+        self.assertEqual(normalize_email(" Kate.Duka+work@Example.com "), "kate.duka@example.com")
+        self.assertEqual(normalize_email(None), "")
+
+    def test_phone_key(self):
+        self.assertEqual(phone_key("+380 (93) 909-09-00"), phone_key("0939090900"))
+        self.assertEqual(phone_key("123"), "")
+
+    def test_soundex(self):
+        self.assertEqual(soundex("Robert"), "R163")
+        self.assertEqual(soundex("Rupert"), "R163")
+        self.assertEqual(soundex("Ashcraft"), "A261")
+
+    def test_name_grams_ignore_word_order(self):
+        self.assertEqual(name_grams("Kate", None), {" ka", "kat", "ate", "te "})
+        self.assertEqual(name_grams("Kate", "Duka"), name_grams("duka", "KATE"))
+
+    def test_similarity(self):
+        kate = ContactRecord(1, "Kate", "Duka", "kate@example.com", None, None)
+        self.assertEqual(similarity(kate, kate._replace(id=2, first_name="Duka", last_name="Kate")), 1.0)
+        # 6 of 4 + 5 + 4 + 4 trigrams are shared by "kate duka" and "katya duka"
+        self.assertAlmostEqual(similarity(kate, kate._replace(id=2, first_name="Katya")), (0.3 + 0.4 * 12 / 17) / 0.7)
+        self.assertLess(similarity(kate, ContactRecord(2, "Ivan", "Petrov", "ivan@example.com", None, None)), 0.1)
+
+    def test_find_duplicates(self):
+        contacts = [
+            ContactRecord(1, "Kate", "Duka", "kate@example.com", "0939090900", date(2000, 6, 7)),
+            ContactRecord(2, "Katya", "Duka", "KATE@example.com", "+380939090900", date(2000, 6, 7)),
+            ContactRecord(3, "Duka", "Kate", "kate+old@example.com", "+38 093 909 09 00", None),
+            ContactRecord(4, "Ivan", "Petrov", "ivan@example.com", "0501112233", date(1990, 5, 20)),
+            ContactRecord(5, "Ivan", "Petrenko", "petrenko@example.com", "0672223344", date(1985, 1, 1)),
+        ]
+        clusters = find_duplicates(contacts)
+        self.assertEqual(len(clusters), 1)
+        self.assertEqual(clusters[0]["contact_ids"], [1, 2, 3])
+        self.assertGreaterEqual(clusters[0]["score"], 0.75)
+
+    def test_large_blocks_are_split(self):
+        # all share the "Petrenko" + "o" name block, which is larger than max_block_size
+        names = ["Olena", "Oleh", "Olga", "Oksana", "Orest", "Ostap", "Olena"]
+        contacts = [ContactRecord(i, first_name, "Petrenko", "", None, date(1990, 1, 1) if first_name == "Olena" else None)
+                    for i, first_name in enumerate(names, start=1)]
+        self.assertEqual([c["contact_ids"] for c in find_duplicates(contacts, max_block_size=3)], [[1, 7]])
+
+    def test_same_names_are_compared_with_their_neighbours(self):
+        contacts = [ContactRecord(i, "Ivan", "Petrenko", "", None, date(1990, 1, min(i, 10)))
+                    for i in range(1, 12)]
+        self.assertEqual([c["contact_ids"] for c in find_duplicates(contacts, max_block_size=3)], [[10, 11]])
+
+
+if __name__ == '__main__':
+    unittest.main()
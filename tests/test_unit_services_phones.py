@@ -0,0 +1,33 @@
+import unittest
+
+from src.services.phones import normalize_phone, reversed_digits
+
+
+class TestPhones(unittest.TestCase):
+
+    def test_normalize_national(self):
+        self.assertEqual(normalize_phone("093 909-09-00", "380"), "+380939090900")
+        self.assertEqual(normalize_phone("939090900", "380"), "+380939090900")
+
+    def test_normalize_international(self):
+        self.assertEqual(normalize_phone("+380 (93) 909 09 00", "380"), "+380939090900")
+        self.assertEqual(normalize_phone("380939090900", "380"), "+380939090900")
+        self.assertEqual(normalize_phone("0044 20 7946 0958", "380"), "+442079460958")
+
+    def test_normalize_too_long(self):
+        self.assertEqual(normalize_phone("+" + "1" * 15, "380"), "+" + "1" * 15)
+        self.assertIsNone(normalize_phone("9" * 30, "380"))
+        # the country code makes a 14 digit national number too long
+        self.assertIsNone(normalize_phone("0" + "9" * 13, "380"))
+
+    def test_normalize_empty(self):
+        self.assertIsNone(normalize_phone(None))
+        self.assertIsNone(normalize_phone("n/a"))
+
+    def test_reversed_digits(self):
+        self.assertEqual(reversed_digits("+380939090900"), "009090939083")
+        self.assertIsNone(reversed_digits(None))
+
+
+if __name__ == '__main__':
+    unittest.main()